@@ -1,194 +1,672 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
-from .rag_engine import RAGEngine
-from .pdf_generator import PDFGenerator
-from .code_analyzer import CodeAnalyzer
+from . import registry
+from .code_analyzer import ClassInfo, language_for_path
+from pydantic import ValidationError
+from .json_utils import StreamingJSONParser
+from .schemas import (ModuleDocumentationOutput, OverviewOutput, SymbolBatchOutput, SymbolDocumentation,
+                      invoke_structured, ainvoke_structured, stream_structured_text, to_data)
+from .prompt_builder import PromptBuilder, compact_symbols, DEFAULT_DOC_PROMPT_TOKENS
 import json
+import asyncio
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from langfuse.langchain import CallbackHandler
 from langfuse import observe
 
 load_dotenv()
 
-# Inicializar componentes
-pdf_gen = PDFGenerator()
-analyzer = CodeAnalyzer()
+DEFAULT_BEST_PRACTICES = """- Usa docstrings en formato PEP 257
+- Incluye type hints
+- Documenta parámetros y retornos"""
+
+MODULE_INSTRUCTIONS = """INSTRUCCIONES:
+1. Crea un título descriptivo y una introducción con el propósito general del módulo
+2. Para cada símbolo de la lista IDENTIFICADORES, en ese orden, crea sus secciones:
+   - Heading de nivel 2 con el nombre
+   - Párrafo explicando su propósito
+   - Si tiene docstring, inclúyela
+   En "name" usa exactamente su identificador.
+3. Resume las mejores prácticas aplicadas
+
+FORMATO DE SALIDA (JSON):
+Devuelve SOLO un JSON válido con esta estructura exacta:
+{
+  "title": "Documentación de [nombre del código]",
+  "introduction": "Descripción general del módulo...",
+  "symbols": [
+    {"name": "identificador_simbolo", "sections": [
+      {"type": "heading", "level": 2, "content": "Función: nombre_simbolo"},
+      {"type": "paragraph", "content": "Descripción..."}
+    ]}
+  ],
+  "best_practices": "Lista de mejores prácticas aplicadas..."
+}
+
+IMPORTANTE: Devuelve SOLO el JSON, sin texto adicional antes o después. Asegúrate de cerrar todas las llaves y comillas."""
+
+OVERVIEW_FORMAT = """Devuelve SOLO un JSON válido con esta estructura exacta:
+{
+  "title": "Documentación de [nombre del código]",
+  "introduction": "Descripción general del módulo...",
+  "best_practices": "Lista de mejores prácticas aplicadas..."
+}"""
+
+BATCH_INSTRUCTIONS = """INSTRUCCIONES:
+Para cada símbolo crea sus secciones: un heading de nivel 2 con el nombre, un párrafo
+explicando su propósito y, si tiene docstring, inclúyela.
 
-# Intentar inicializar RAG, pero hacerlo opcional
-rag_available = False
-try:
-    rag = RAGEngine()
-    rag_available = True
-except Exception as e:
-    print(f"⚠️ RAG no disponible: {e}")
-    rag = None
+En "name" usa exactamente el identificador del símbolo de la lista IDENTIFICADORES.
+
+Devuelve SOLO un JSON válido con esta estructura exacta:
+{
+  "symbols": [
+    {"name": "identificador_simbolo", "sections": [
+      {"type": "heading", "level": 2, "content": "Función: nombre_simbolo"},
+      {"type": "paragraph", "content": "Descripción..."}
+    ]}
+  ]
+}"""
+
+# Número de símbolos por llamada al LLM y llamadas simultáneas en modo map-reduce
+DEFAULT_BATCH_SIZE = int(os.environ.get("DOC_BATCH_SIZE", "8"))
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get("DOC_MAX_CONCURRENCY", "4"))
+
+def _report(progress, stage, detail=None):
+    """Notifica una etapa del pipeline ("analysis", "retrieval", "generation", "render") si hay callback."""
+    if progress:
+        progress(stage, detail)
 
 
 class DocumentationAgent:
-    def __init__(self):
-        # Inicializar Langfuse Callback Handler
-        self.langfuse_handler = CallbackHandler()
-        
-        # Aumentar max_output_tokens para evitar cortes en JSON largos
-        self.llm = ChatGoogleGenerativeAI(
-            model="models/gemini-2.5-flash", 
-            temperature=0.3,
-            max_output_tokens=8192,
-            callbacks=[self.langfuse_handler]
-        )
-    
+    """
+    Agente de documentación. Los componentes pesados (LLM, RAG, PDF, analizador)
+    se obtienen del registro compartido la primera vez que se usan.
+
+    La documentación se genera por partes (introducción y secciones de cada
+    símbolo) que se cachean por separado: al volver a documentar un módulo
+    editado solo se piden al LLM los símbolos nuevos o modificados. Un módulo
+    nuevo pequeño se documenta en una sola llamada; con más de `batch_size`
+    símbolos pendientes se pasa a modo map-reduce: los símbolos se reparten en
+    lotes que se documentan con llamadas concurrentes y las secciones se fusionan
+    en el orden del código fuente. Las llamadas síncronas de todo el agente
+    (también las de los módulos de `run_package`) comparten un semáforo: nunca
+    hay más de `max_concurrency` a la vez.
+
+    Cada prompt se ajusta a `prompt_tokens`: los símbolos se envían como un esquema
+    compacto de firmas y docstrings que pierde detalle si no cabe.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 prompt_tokens=DEFAULT_DOC_PROMPT_TOKENS):
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self._llm_slots = threading.BoundedSemaphore(max_concurrency)
+        # Presupuesto de tokens de entrada por llamada al LLM
+        self.prompt_tokens = prompt_tokens
+
+    @property
+    def langfuse_handler(self):
+        return registry.get_langfuse_handler()
+
+    @property
+    def llm(self):
+        return registry.get_llm()
+
+    def _analyze(self, code, language="python"):
+        """Paso 1: Analizar estructura del código."""
+        print("\n📊 Paso 1: Analizando estructura del código...")
+        structure = registry.get_code_analyzer().analyze(code, language=language)
+        print(f"   ✓ Encontradas {len(structure.functions)} funciones y {len(structure.classes)} clases")
+        return structure
+
+    def _get_best_practices(self):
+        """Paso 2: Consultar mejores prácticas (con fallback)."""
+        print("\n📚 Paso 2: Consultando mejores prácticas...")
+        rag = registry.get_rag_engine()
+        if not rag:
+            print("   ✓ Usando mejores prácticas predefinidas")
+            return DEFAULT_BEST_PRACTICES
+        try:
+            # Consulta constante: se resuelve desde la caché de resultados del RAG
+            # mientras el índice no cambie
+            docs = rag.query("python documentation best practices", k=2)
+            print("   ✓ Mejores prácticas obtenidas desde RAG")
+            return "\n".join([d.page_content for d in docs[:2]])  # Top 2
+        except Exception as e:
+            print(f"   ⚠ RAG falló, usando fallback: {e}")
+            return DEFAULT_BEST_PRACTICES
+
+    def _module_prompt(self, structure, batch, best_practices):
+        """Introducción y símbolos de `batch` (como en `_batch_prompt`) en un único prompt."""
+        symbols = [symbol for _, symbol in batch]
+        return (PromptBuilder(self.prompt_tokens)
+                .add("Eres un experto técnico. Genera documentación profesional para este código.")
+                .add(", ".join(symbol.name for symbol in structure.symbols()), "SÍMBOLOS DEL MÓDULO", priority=3)
+                .add(", ".join(symbol_id for symbol_id, _ in batch), "IDENTIFICADORES", priority=3)
+                .add(", ".join(structure.imports), "IMPORTS", priority=2)
+                .add(lambda tokens: compact_symbols(symbols, tokens), "CÓDIGO ANALIZADO", priority=2)
+                .add(best_practices, "MEJORES PRÁCTICAS A SEGUIR", priority=1)
+                .add(MODULE_INSTRUCTIONS)
+                .build())
+
+    def _overview_prompt(self, structure, best_practices):
+        names = [symbol.name for symbol in structure.symbols()]
+        return (PromptBuilder(self.prompt_tokens)
+                .add("Eres un experto técnico. Vas a escribir la introducción de la documentación de un módulo.")
+                .add(", ".join(names), "SÍMBOLOS DEL MÓDULO", priority=3)
+                .add(", ".join(structure.imports), "IMPORTS", priority=2)
+                .add(best_practices, "MEJORES PRÁCTICAS A SEGUIR", priority=1)
+                .add(OVERVIEW_FORMAT)
+                .build())
+
+    def _batch_prompt(self, batch, best_practices):
+        """`batch`: lista de (identificador, símbolo)."""
+        symbols = [symbol for _, symbol in batch]
+        return (PromptBuilder(self.prompt_tokens)
+                .add("Eres un experto técnico. Genera documentación profesional para estos símbolos de un módulo.")
+                .add(", ".join(symbol_id for symbol_id, _ in batch), "IDENTIFICADORES", priority=3)
+                .add(lambda tokens: compact_symbols(symbols, tokens), "SÍMBOLOS A DOCUMENTAR", priority=2)
+                .add(best_practices, "MEJORES PRÁCTICAS A SEGUIR", priority=1)
+                .add(BATCH_INSTRUCTIONS)
+                .build())
+
+    @staticmethod
+    def _symbol_ids(symbols):
+        """
+        Identificador único de cada símbolo de primer nivel: su qualname, con un
+        sufijo `#n` si se repite (sobrecargas de TypeScript, nombres duplicados).
+
+        Returns:
+            list: (identificador, símbolo) en el orden de `symbols`.
+        """
+        seen = {}
+        ids = []
+        for symbol in symbols:
+            seen[symbol.qualname] = seen.get(symbol.qualname, 0) + 1
+            count = seen[symbol.qualname]
+            ids.append((symbol.qualname if count == 1 else f"{symbol.qualname}#{count}", symbol))
+        return ids
+
+    def _plan_parts(self, structure, best_practices):
+        """
+        Decide qué partes de la documentación hay que pedir al LLM. Las secciones de
+        cada símbolo se cachean por su hash de código y la introducción por los
+        nombres de los símbolos e imports, así que tras una edición solo los
+        símbolos nuevos o modificados generan llamadas; el resto se reutiliza.
+
+        Si falta la introducción y los símbolos pendientes caben en un lote, todo
+        se pide en una sola llamada (`ModuleDocumentationOutput`).
+        """
+        doc_cache = registry.get_documentation_cache()
+        symbols = self._symbol_ids(structure.symbols())
+        reused, pending = {}, []
+        for symbol_id, symbol in symbols:
+            sections = doc_cache.get_part(doc_cache.symbol_key(symbol, best_practices))
+            if sections is None:
+                pending.append((symbol_id, symbol))
+            else:
+                reused[symbol_id] = sections
+
+        overview_key = doc_cache.overview_key(structure, best_practices)
+        overview = doc_cache.get_part(overview_key)
+        batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        # Cada petición es (schema de la respuesta, prompt)
+        if overview is None and len(batches) == 1:
+            prompts = [(ModuleDocumentationOutput, self._module_prompt(structure, batches[0], best_practices))]
+        else:
+            prompts = [] if overview else [(OverviewOutput, self._overview_prompt(structure, best_practices))]
+            prompts += [(SymbolBatchOutput, self._batch_prompt(batch, best_practices)) for batch in batches]
+
+        mode = "map-reduce, " if len(batches) > 1 else ""
+        print(f"   ✓ {len(pending)} símbolos a generar en {len(prompts)} llamadas ({mode}hasta "
+              f"{self.max_concurrency} simultáneas), {len(reused)} reutilizados")
+        return {
+            "symbols": symbols,
+            "pending": pending,
+            "reused": reused,
+            "overview": overview,
+            "overview_key": overview_key,
+            "best_practices": best_practices,
+            "prompts": prompts
+        }
+
+    @staticmethod
+    def _fresh_single_call(plan):
+        """True si el documento entero sale de una única llamada, sin partes cacheadas."""
+        return len(plan["prompts"]) == 1 and plan["overview"] is None and not plan["reused"]
+
+    @staticmethod
+    def _fallback_sections(symbol):
+        """Secciones mínimas a partir del análisis si un lote no devolvió JSON válido."""
+        label = "Clase" if isinstance(symbol, ClassInfo) else "Función"
+        return [
+            {"type": "heading", "level": 2, "content": f"{label}: {symbol.name}"},
+            {"type": "paragraph", "content": symbol.docstring or "No docstring"}
+        ]
+
+    @staticmethod
+    def _parse_failure(e):
+        # Una parte ilegible no invalida el resto: se sustituye por secciones de respaldo
+        print(f"   ⚠ Respuesta parcial no válida, usando docstrings: {type(e).__name__}")
+        return None
+
+    def _invoke(self, schema, prompt):
+        """`invoke_structured` dentro del límite de llamadas simultáneas del agente."""
+        with self._llm_slots:
+            return invoke_structured(schema, prompt)
+
+    def _invoke_part(self, request):
+        try:
+            return self._invoke(*request)
+        except (json.JSONDecodeError, ValidationError) as e:
+            return self._parse_failure(e)
+
+    async def _ainvoke_part(self, request):
+        try:
+            return await ainvoke_structured(*request)
+        except (json.JSONDecodeError, ValidationError) as e:
+            return self._parse_failure(e)
+
+    @staticmethod
+    def _pending_id(pending, name):
+        """Identificador del símbolo pendiente al que corresponde `name` en una respuesta, o None."""
+        for symbol_id, _ in pending:
+            if symbol_id == name:
+                return symbol_id
+        # El nombre corto solo sirve si no se repite
+        for symbol_id, symbol in pending:
+            if symbol_id == symbol.qualname and symbol.name == name:
+                return symbol_id
+        return None
+
+    @staticmethod
+    def _introduction_sections(overview):
+        return [
+            {"type": "heading", "level": 1, "content": "Introducción"},
+            {"type": "paragraph", "content": overview.get("introduction", "Documentación generada automáticamente.")}
+        ]
+
+    @staticmethod
+    def _best_practices_sections(overview):
+        if not overview.get("best_practices"):
+            return []
+        return [
+            {"type": "heading", "level": 1, "content": "Mejores Prácticas Aplicadas"},
+            {"type": "paragraph", "content": overview["best_practices"]}
+        ]
+
+    def _store_parts(self, plan, overview, generated):
+        """Guarda en la caché la introducción y las secciones de los símbolos recién generados."""
+        doc_cache = registry.get_documentation_cache()
+        if plan["overview"] is None and overview.get("introduction"):
+            doc_cache.set_part(plan["overview_key"], overview)
+        for symbol_id, symbol in plan["pending"]:
+            if symbol_id in generated:
+                doc_cache.set_part(doc_cache.symbol_key(symbol, plan["best_practices"]), generated[symbol_id])
+
+    def _merge_parts(self, plan, results):
+        """
+        Fusiona las respuestas parciales (modelos validados, o None si una parte
+        falló) y las cacheadas en un único payload para el PDFGenerator.
+        """
+        overview = plan["overview"]
+        if overview is None:
+            # La introducción llega sola (OverviewOutput) o junto a los símbolos
+            first = to_data(results[0]) if results and results[0] is not None else {}
+            overview = {key: value for key, value in first.items() if key != "symbols"}
+
+        generated = {}
+        for result in results:
+            for item in getattr(result, "symbols", None) or []:
+                symbol_id = self._pending_id(plan["pending"], item.name)
+                if symbol_id is not None:
+                    generated.setdefault(symbol_id, [to_data(section) for section in item.sections])
+        self._store_parts(plan, overview, generated)
+
+        sections = self._introduction_sections(overview)
+        for symbol_id, symbol in plan["symbols"]:
+            sections.extend(
+                plan["reused"].get(symbol_id) or generated.get(symbol_id) or self._fallback_sections(symbol)
+            )
+        sections.extend(self._best_practices_sections(overview))
+        return {"title": overview.get("title", "Documentación del código"), "sections": sections}
+
+    @staticmethod
+    def _language(language, doc_id):
+        return language or (doc_id and language_for_path(doc_id)) or "python"
+
+    def _render(self, data, persist=True):
+        """Paso 4: Generar PDF (en `data/` o, con `persist=False`, en memoria)."""
+        print("\n📄 Paso 4: Generando PDF...")
+        return registry.get_pdf_generator().generate(data, persist=persist)
+
+    @staticmethod
+    def _success(pdf):
+        """`pdf` es la ruta del archivo o el `BytesIO` de un PDF que no se guardó en disco."""
+        in_memory = not isinstance(pdf, str)
+        where = "memoria" if in_memory else pdf
+        print("\n" + "="*60)
+        print(f"✅ ÉXITO: Documentación generada en {where}")
+        print("="*60 + "\n")
+        return {
+            "output": f"Documentación generada exitosamente en: {where}",
+            "pdf_path": None if in_memory else pdf,
+            "pdf_bytes": pdf.getvalue() if in_memory else None
+        }
+
+    @staticmethod
+    def _failure(e):
+        if isinstance(e, json.JSONDecodeError):
+            error_msg = f"Error al parsear JSON del LLM: {str(e)}\nContenido recibido (inicio): {e.doc[:500]}..."
+        elif isinstance(e, ValidationError):
+            error_msg = f"La respuesta del LLM no cumple el esquema de documentación: {e.error_count()} errores\n{str(e)[:500]}"
+        else:
+            error_msg = f"Error durante la generación: {type(e).__name__}: {str(e)}"
+        print(f"\n❌ {error_msg}\n")
+        return {"output": error_msg, "pdf_path": None, "pdf_bytes": None}
+
+    def _generate(self, structure, best_practices, plan=None):
+        """
+        Paso 3: Generar contenido con LLM. Solo se piden las partes que no están en
+        la caché: tras editar un módulo, el coste depende de lo que cambió y no
+        del tamaño del módulo.
+        """
+        print("\n✍️ Paso 3: Generando contenido de documentación con IA...")
+        plan = plan or self._plan_parts(structure, best_practices)
+        if self._fresh_single_call(plan):
+            # Sin nada que reutilizar, un error de la única llamada se propaga
+            results = [self._invoke(*plan["prompts"][0])]
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                results = list(executor.map(self._invoke_part, plan["prompts"]))
+        data = self._merge_parts(plan, results)
+        print(f"   ✓ Contenido generado ({len(data['sections'])} secciones)")
+        return data
+
+    async def _agenerate(self, structure, best_practices):
+        print("\n✍️ Paso 3: Generando contenido de documentación con IA...")
+        # Planificar y fusionar consultan la caché de documentación (SQLite): en hilos
+        plan = await asyncio.to_thread(self._plan_parts, structure, best_practices)
+        if self._fresh_single_call(plan):
+            results = [await ainvoke_structured(*plan["prompts"][0])]
+        else:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+
+            async def invoke(request):
+                async with semaphore:
+                    return await self._ainvoke_part(request)
+
+            results = await asyncio.gather(*[invoke(request) for request in plan["prompts"]])
+        data = await asyncio.to_thread(self._merge_parts, plan, list(results))
+        print(f"   ✓ Contenido generado ({len(data['sections'])} secciones)")
+        return data
+
+    @staticmethod
+    def _lookup_documentation(structure, best_practices, persist=True):
+        """
+        Busca documentación ya generada para la misma estructura y mejores prácticas.
+        Con `persist=False` no se devuelve la ruta del PDF: quien pide el PDF en
+        memoria lo recibe re-renderizado desde el JSON, nunca como archivo en disco.
+
+        Returns:
+            tuple: (clave, entrada cacheada o None)
+        """
+        doc_cache = registry.get_documentation_cache()
+        key = doc_cache.key(structure, best_practices)
+        cached = doc_cache.get(key)
+        if cached and not persist:
+            cached = dict(cached, pdf_path=None)
+        if cached:
+            reused = "JSON y PDF" if cached["pdf_path"] else "JSON"
+            print(f"   ♻️ Código sin cambios: reutilizando {reused} de una generación anterior")
+        return key, cached
+
     @observe(as_type="generation")
-    def run(self, code):
-        """Ejecuta el flujo de generación de documentación de forma secuencial."""
+    def run(self, code, doc_id=None, language=None, persist=True, progress=None):
+        """
+        Ejecuta el flujo de generación de documentación de forma secuencial.
+
+        Args:
+            code (str): Código fuente a documentar.
+            doc_id (str, opcional): Ruta o nombre del archivo, para deducir el lenguaje.
+            language (str, opcional): Lenguaje del código ("python", "javascript",
+                "typescript", "go", "java"...). Si se omite se deduce de la extensión
+                de `doc_id` y, en último caso, se asume Python.
+            persist (bool): Si es False el PDF se genera en memoria y se devuelve en
+                `pdf_bytes` (con `pdf_path` None), sin escribir en disco.
+            progress (callable, opcional): `progress(etapa, detalle)` al empezar cada
+                etapa, p. ej. `Job.report` cuando se ejecuta en la cola de trabajos.
+        """
         try:
             print("\n" + "="*60)
             print("🚀 Iniciando generación de documentación")
             print("="*60)
-            
-            # Paso 1: Analizar estructura del código
-            print("\n📊 Paso 1: Analizando estructura del código...")
-            # with langfuse_context.observe(name="Code Analysis", as_type="observation"):
-            structure = analyzer.analyze(code, language="python")
-            print(f"   ✓ Encontradas {len(structure.get('functions', []))} funciones y {len(structure.get('classes', []))} clases")
-            
-            # Paso 2: Consultar mejores prácticas (con fallback)
-            print("\n📚 Paso 2: Consultando mejores prácticas...")
-            if rag_available and rag:
-                try:
-                    # with langfuse_context.observe(name="RAG Retrieval", as_type="observation"):
-                    docs = rag.query("python documentation best practices")
-                    best_practices = "\n".join([d.page_content for d in docs[:2]])  # Top 2
-                    print("   ✓ Mejores prácticas obtenidas desde RAG")
-                except Exception as e:
-                    print(f"   ⚠ RAG falló, usando fallback: {e}")
-                    best_practices = """- Usa docstrings en formato PEP 257
-- Incluye type hints
-- Documenta parámetros y retornos"""
-            else:
-                best_practices = """- Usa docstrings en formato PEP 257
-- Incluye type hints
-- Documenta parámetros y retornos"""
-                print("   ✓ Usando mejores prácticas predefinidas")
-            
-            # Paso 3: Generar contenido con LLM
-            print("\n✍️ Paso 3: Generando contenido de documentación con IA...")
-            prompt = f"""Eres un experto técnico. Genera documentación profesional para este código.
 
-CÓDIGO ANALIZADO:
-{json.dumps(structure, indent=2)}
+            _report(progress, "analysis")
+            structure = self._analyze(code, self._language(language, doc_id))
+            _report(progress, "retrieval")
+            best_practices = self._get_best_practices()
 
-MEJORES PRÁCTICAS A SEGUIR:
-{best_practices}
+            key, cached = self._lookup_documentation(structure, best_practices, persist)
+            if cached and cached["pdf_path"]:
+                return self._success(cached["pdf_path"])
+            _report(progress, "generation")
+            data = cached["data"] if cached else self._generate(structure, best_practices)
 
-INSTRUCCIONES:
-1. Crea un título descriptivo
-2. Para cada función/clase, crea una sección con:
-   - Heading con el nombre
-   - Párrafo explicando su propósito
-   - Si tiene docstring, inclúyela
-3. Incluye una sección de mejores prácticas aplicadas
+            _report(progress, "render")
+            pdf = self._render(data, persist)
+            if persist or not cached:
+                # Un render en memoria no borra la ruta de un PDF ya guardado
+                registry.get_documentation_cache().set(key, data, pdf if persist else None)
+            return self._success(pdf)
+        except Exception as e:
+            return self._failure(e)
 
-FORMATO DE SALIDA (JSON):
-Devuelve SOLO un JSON válido con esta estructura exacta:
-{{
-  "title": "Documentación de [nombre del código]",
-  "sections": [
-    {{"type": "heading", "level": 1, "content": "Introducción"}},
-    {{"type": "paragraph", "content": "Descripción general..."}},
-    {{"type": "heading", "level": 2, "content": "Función: nombre_funcion"}},
-    {{"type": "paragraph", "content": "Descripción de la función..."}},
-    {{"type": "heading", "level": 1, "content": "Mejores Prácticas Aplicadas"}},
-    {{"type": "paragraph", "content": "Lista de mejores prácticas..."}}
-  ]
-}}
+    @observe(as_type="generation")
+    async def arun(self, code, doc_id=None, language=None, persist=True, progress=None):
+        """
+        Versión asíncrona de `run`. Las llamadas al LLM usan `ainvoke` y el
+        análisis, la consulta al RAG, los accesos a la caché de documentación
+        (SQLite y hash del PDF) y el render se ejecutan en hilos, de modo que el
+        event loop puede atender muchos trabajos a la vez.
+        """
+        try:
+            print("\n🚀 Iniciando generación de documentación (async)")
 
-IMPORTANTE: Devuelve SOLO el JSON, sin texto adicional antes o después. Asegúrate de cerrar todas las llaves y comillas."""
+            _report(progress, "analysis")
+            structure = await asyncio.to_thread(self._analyze, code, self._language(language, doc_id))
+            _report(progress, "retrieval")
+            best_practices = await asyncio.to_thread(self._get_best_practices)
+
+            key, cached = await asyncio.to_thread(self._lookup_documentation, structure, best_practices, persist)
+            if cached and cached["pdf_path"]:
+                return self._success(cached["pdf_path"])
+            _report(progress, "generation")
+            data = cached["data"] if cached else await self._agenerate(structure, best_practices)
+
+            _report(progress, "render")
+            pdf = await asyncio.to_thread(self._render, data, persist)
+            if persist or not cached:
+                await asyncio.to_thread(registry.get_documentation_cache().set, key, data, pdf if persist else None)
+            return self._success(pdf)
+        except Exception as e:
+            return self._failure(e)
+
+    def _stream_generate(self, plan, document):
+        """
+        Paso 3 en streaming para un documento nuevo de una sola llamada: la
+        introducción y cada símbolo pasan al documento PDF en cuanto el parser
+        incremental cierra su llave, mientras el LLM sigue generando. Al terminar
+        se cachean como partes, igual que en `_generate`.
+
+        Yields:
+            dict: Eventos "title" y "section".
+        """
+        print("\n✍️ Paso 3: Generando contenido de documentación con IA (streaming)...")
+        parser = StreamingJSONParser("symbols")
+        schema, prompt = plan["prompts"][0]
+        overview, generated = {}, {}
+
+        def events():
+            for chunk in stream_structured_text(schema, prompt):
+                yield from parser.feed(chunk)
+            yield from parser.close()
 
-            response = self.llm.invoke(prompt)
-            content = response.content.strip()
-            
-            # Extracción robusta de JSON buscando el primer objeto JSON bien balanceado
-            def extract_json(text: str) -> str:
-                start = text.find('{')
-                if start == -1:
-                    return ''
-                depth = 0
-                in_string = False
-                escape = False
-                for i in range(start, len(text)):
-                    ch = text[i]
-                    if ch == '"' and not escape:
-                        in_string = not in_string
-                    if ch == '\\' and not escape:
-                        escape = True
-                        continue
-                    else:
-                        escape = False
-
-                    if not in_string:
-                        if ch == '{':
-                            depth += 1
-                        elif ch == '}':
-                            depth -= 1
-                            if depth == 0:
-                                return text[start:i+1]
-                return ''
-
-            extracted = extract_json(content)
-            if extracted:
-                content = extracted
+        def add(sections):
+            for section in sections:
+                document.add_section(section)
+                yield {"type": "section", "section": section}
+
+        for key, value in events():
+            if key in ("title", "introduction", "best_practices") and isinstance(value, str):
+                overview[key] = value
+                if key == "title":
+                    document.title = value
+                    yield {"type": "title", "title": value}
+                elif key == "introduction":
+                    yield from add(self._introduction_sections(overview))
+            elif key == "symbols":
+                try:
+                    item = SymbolDocumentation.model_validate(value)
+                except ValidationError:
+                    continue  # Último símbolo a medias en una respuesta cortada
+                symbol_id = self._pending_id(plan["pending"], item.name)
+                if symbol_id is None or symbol_id in generated:
+                    continue
+                generated[symbol_id] = [to_data(section) for section in item.sections]
+                yield from add(generated[symbol_id])
+
+        if not overview.get("introduction") and not generated:
+            raise json.JSONDecodeError("La respuesta no contiene secciones", parser.text, 0)
+        # Los símbolos que el LLM omitió se documentan con su docstring
+        for symbol_id, symbol in plan["pending"]:
+            if symbol_id not in generated:
+                yield from add(self._fallback_sections(symbol))
+        yield from add(self._best_practices_sections(overview))
+        self._store_parts(plan, overview, generated)
+        print(f"   ✓ Contenido generado ({len(document.sections)} secciones)")
+
+    @observe(as_type="generation")
+    def stream_run(self, code, doc_id=None, language=None, persist=True, progress=None):
+        """
+        Variante de `run` que emite la documentación a medida que se genera, para
+        previsualizarla en la interfaz. Las secciones se van convirtiendo en
+        flowables del PDF durante la generación, así que al terminar el stream
+        solo queda maquetar y escribir el archivo.
+
+        Yields:
+            dict: {"type": "title", "title"}, {"type": "section", "section"} y, al
+            final, {"type": "done", "output", "pdf_path", "pdf_bytes"} (ambos None si falló).
+            `persist` y `progress` funcionan como en `run`.
+        """
+        try:
+            print("\n" + "="*60)
+            print("🚀 Iniciando generación de documentación (streaming)")
+            print("="*60)
+
+            _report(progress, "analysis")
+            structure = self._analyze(code, self._language(language, doc_id))
+            _report(progress, "retrieval")
+            best_practices = self._get_best_practices()
+
+            key, cached = self._lookup_documentation(structure, best_practices, persist)
+            document = registry.get_pdf_generator().begin(persist=persist)
+            _report(progress, "generation")
+            plan = None if cached else self._plan_parts(structure, best_practices)
+            if cached or not self._fresh_single_call(plan):
+                # Sin stream del LLM: las secciones llegan ya completas (caché o varias llamadas)
+                data = cached["data"] if cached else self._generate(structure, best_practices, plan)
+                document.title = data.get("title")
+                yield {"type": "title", "title": document.title}
+                for section in data.get("sections", []):
+                    document.add_section(section)
+                    yield {"type": "section", "section": section}
+                if cached and cached["pdf_path"]:
+                    yield {"type": "done", **self._success(cached["pdf_path"])}
+                    return
             else:
-                # Fallback a regex (menos robusta) si no se encontró por balanceo
-                import re
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    content = json_match.group(0)
-            
-            print(f"   ✓ Contenido generado ({len(content)} caracteres)")
-            
-            # Paso 4: Generar PDF
+                yield from self._stream_generate(plan, document)
+
+            _report(progress, "render")
             print("\n📄 Paso 4: Generando PDF...")
-            # Intentar parsear el JSON extraído
-            try:
-                data = json.loads(content)
-            except json.JSONDecodeError as e:
-                # Intentar pedir al LLM que corrija el JSON mal formado
-                try:
-                    repair_prompt = (
-                        "El siguiente texto pretende ser un objeto JSON pero tiene errores de formato. "
-                        "Devuelve SOLO el JSON válido y corregido, sin ningún comentario adicional.\n\n"
-                        "TEXTO: \n" + content
-                    )
-                    repair_resp = self.llm.invoke(repair_prompt)
-                    repaired = repair_resp.content.strip()
-                    # Extraer de nuevo con el mismo método
-                    extracted2 = extract_json(repaired)
-                    if extracted2:
-                        repaired = extracted2
-                    data = json.loads(repaired)
-                except Exception as e2:
-                    raise json.JSONDecodeError(f"JSON repair failed: {e2}", doc=content, pos=0)
-            
-            # with langfuse_context.observe(name="PDF Generation", as_type="observation"):
-            pdf_path = pdf_gen.generate(data)
-            
+            pdf = document.finish()
+            if persist or not cached:
+                registry.get_documentation_cache().set(key, document.data(), pdf if persist else None)
+            yield {"type": "done", **self._success(pdf)}
+        except Exception as e:
+            yield {"type": "done", **self._failure(e)}
+
+    def _document_module(self, structure, best_practices):
+        """JSON de documentación de un módulo del paquete, reutilizando la caché."""
+        key, cached = self._lookup_documentation(structure, best_practices)
+        if cached:
+            return cached["data"]
+        try:
+            data = self._generate(structure, best_practices)
+        except Exception as e:
+            # Un módulo problemático no debe tumbar la documentación de todo el paquete
+            print(f"   ⚠ Falló la generación de un módulo, usando docstrings: {e}")
+            sections = [sec for symbol in structure.symbols() for sec in self._fallback_sections(symbol)]
+            return {"sections": sections}
+        registry.get_documentation_cache().set(key, data, None)
+        return data
+
+    @staticmethod
+    def _merge_package(package, documents):
+        """Une la documentación de cada módulo en un único payload para el PDFGenerator."""
+        overview = []
+        for name, module in package.modules.items():
+            if module.error:
+                overview.append(f"• {name}: {module.error}")
+            else:
+                line = f"• {name} ({len(module.functions)} funciones, {len(module.classes)} clases)"
+                # Sin entrada en el grafo las dependencias del módulo no se conocen
+                if name in package.import_graph:
+                    line += f" - importa: {', '.join(package.import_graph[name]) or 'ninguno'}"
+                overview.append(line)
+
+        sections = [
+            {"type": "heading", "level": 1, "content": "Estructura del Paquete"},
+            {"type": "paragraph", "content": "\n".join(overview)}
+        ]
+        for name, data in documents:
+            sections.append({"type": "heading", "level": 1, "content": f"Módulo: {name}"})
+            for section in data.get("sections", []):
+                if isinstance(section, dict) and section.get("type") == "heading":
+                    # Las secciones del módulo quedan un nivel por debajo de su heading
+                    section = dict(section, level=min(int(section.get("level", 1)) + 1, 3))
+                sections.append(section)
+        title = f"Documentación del paquete {os.path.basename(os.path.abspath(package.root))}"
+        return {"title": title, "sections": sections}
+
+    @observe(as_type="generation")
+    def run_package(self, root, max_workers=None, persist=True):
+        """
+        Genera un único PDF para todos los módulos bajo `root` (Python, JavaScript/TypeScript, Go y Java).
+        El análisis se hace en paralelo con un pool de procesos y los módulos se
+        documentan a la vez, con hasta `max_concurrency` llamadas al LLM en total.
+        """
+        try:
             print("\n" + "="*60)
-            print(f"✅ ÉXITO: Documentación generada en {pdf_path}")
-            print("="*60 + "\n")
-            
-            return {
-                "output": f"Documentación generada exitosamente en: {pdf_path}",
-                "pdf_path": pdf_path
-            }
-            
-        except json.JSONDecodeError as e:
-            error_msg = f"Error al parsear JSON del LLM: {str(e)}\nContenido recibido (inicio): {content[:500]}..."
-            print(f"\n❌ {error_msg}\n")
-            return {"output": error_msg, "pdf_path": None}
+            print(f"🚀 Iniciando documentación del paquete {root}")
+            print("="*60)
+
+            print("\n📊 Paso 1: Analizando módulos en paralelo...")
+            package = registry.get_code_analyzer().analyze_package(root, max_workers=max_workers)
+            print(f"   ✓ {len(package.modules)} módulos analizados")
+
+            best_practices = self._get_best_practices()
+
+            print("\n✍️ Paso 3: Generando contenido de documentación con IA...")
+            modules = [(name, module) for name, module in package.modules.items()
+                       if not module.error and (module.functions or module.classes)]
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                documents = list(executor.map(lambda item: self._document_module(item[1], best_practices), modules))
+
+            data = self._merge_package(package, list(zip([name for name, _ in modules], documents)))
+            return self._success(self._render(data, persist))
         except Exception as e:
-            error_msg = f"Error durante la generación: {type(e).__name__}: {str(e)}"
-            print(f"\n❌ {error_msg}\n")
-            return {"output": error_msg, "pdf_path": None}
+            return self._failure(e)
 
 if __name__ == "__main__":
     # Test
@@ -1,30 +1,101 @@
 import gradio as gr
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import FileResponse, StreamingResponse
+from . import registry
 from .agent import DocumentationAgent
+from .cache import LRUCache
 from .conversation_pdf_tool import ConversationPDFGenerator
+from .job_queue import STAGES
+from .prompt_builder import PromptBuilder, rank_context, DEFAULT_CHAT_PROMPT_TOKENS
+import asyncio
 import os
-from .rag_engine import RAGEngine
+import uuid
 
-# Inicializar agente y herramienta de PDF
+# Los componentes pesados (LLM, RAG) se construyen bajo demanda en el registro
 agent = DocumentationAgent()
 pdf_conversation_gen = ConversationPDFGenerator()
+# Los PDFs se generan en segundo plano: los handlers de Gradio solo encolan y consultan
+job_queue = registry.get_job_queue()
 
-# Inicializar RAG (opcional)
-try:
-    rag = RAGEngine()
-except Exception as e:
-    print(f"⚠️ No se pudo inicializar RAG en la interfaz: {e}")
-    rag = None
+STAGE_LABELS = dict(zip(STAGES, ["analizando", "consultando buenas prácticas",
+                                 "generando contenido", "generando el PDF"]))
 
+# Los PDFs se generan en memoria y se sirven desde /pdf/<token> durante
+# PDF_DOWNLOAD_TTL segundos; con PDF_PERSIST=1 se guardan además en data/
+PDF_PERSIST = os.environ.get("PDF_PERSIST", "0") == "1"
+PDF_DOWNLOAD_TTL = int(os.environ.get("PDF_DOWNLOAD_TTL", "3600"))
+_CHUNK_SIZE = 64 * 1024
 
-def process_chat(user_message, chat_history):
+# token -> (nombre del archivo descargado, bytes del PDF o ruta en disco)
+_downloads = LRUCache(maxsize=128, ttl=PDF_DOWNLOAD_TTL)
+
+
+
+async def _warm_up_when_listening(app):
     """
-    Procesa mensajes del chat. Detecta si el usuario pide un PDF de la conversación
-    y lo genera, o responde normalmente usando RAG para buenas prácticas.
-    
-    Returns:
-        tuple: (messages, messages, pdf_path) donde pdf_path es None si no se generó PDF
+    Lanza `registry.warm_up` cuando el servidor ya escucha. uvicorn ejecuta el
+    lifespan antes de abrir el puerto, así que se espera a `server.started`
+    (si se arrancó desde `__main__`, que deja el servidor en `app.state`).
     """
-    # Normalizar el estado de chat a una lista de mensajes dict {'role','content'}
+    server = getattr(app.state, "server", None)
+    while server is not None and not server.started:
+        await asyncio.sleep(0.05)
+    # LLM e índice se construyen en un hilo en segundo plano
+    registry.warm_up()
+
+
+@asynccontextmanager
+async def _lifespan(app):
+    warm_up = asyncio.create_task(_warm_up_when_listening(app))
+    yield
+    warm_up.cancel()
+
+
+api = FastAPI(lifespan=_lifespan)
+
+
+@api.get("/pdf/{token}")
+def download_pdf(token: str):
+    """Sirve un PDF generado por la interfaz, en trozos si está en memoria."""
+    entry = _downloads.get(token)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="PDF no disponible o caducado")
+    filename, pdf = entry
+    if isinstance(pdf, str):
+        return FileResponse(pdf, media_type="application/pdf", filename=filename)
+    chunks = (pdf[i:i + _CHUNK_SIZE] for i in range(0, len(pdf), _CHUNK_SIZE))
+    return StreamingResponse(chunks, media_type="application/pdf",
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+@api.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    """Estado y progreso de un trabajo en segundo plano (sin el PDF, que se descarga aparte)."""
+    status = job_queue.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado o caducado")
+    status.pop("result")
+    return status
+
+
+@api.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    return {"cancelled": job_queue.cancel(job_id)}
+
+
+def _publish_pdf(result, filename):
+    """Registra el PDF de un resultado para su descarga y devuelve el enlace en Markdown (o None)."""
+    pdf = result.get("pdf_bytes") or result.get("pdf_path")
+    if not pdf:
+        return None
+    token = uuid.uuid4().hex
+    _downloads.set(token, (filename, pdf))
+    return f"[📄 Descargar PDF](/pdf/{token})"
+
+
+def _normalize_history(chat_history):
+    """Normaliza el estado de chat a una lista de mensajes dict {'role','content'}."""
     messages = []
     if chat_history:
         for item in chat_history:
@@ -39,9 +110,60 @@ def process_chat(user_message, chat_history):
             else:
                 # Convertir cualquier otro formato a assistant message
                 messages.append({'role': 'assistant', 'content': str(item)})
+    return messages
+
+
+def _job_placeholder(job):
+    """Mensaje provisional del chat mientras el PDF se genera (lleva el ID para encontrarlo luego)."""
+    return f"⏳ Generando el PDF de la conversación ({STAGE_LABELS.get(job.stage, 'en cola')})... `[{job.id}]`"
+
+
+def _conversation_pdf_answer(job):
+    """Respuesta final del chat para un trabajo de PDF terminado. Devuelve (texto, enlace o None)."""
+    if job.status == "cancelled":
+        return "🛑 Generación del PDF cancelada.", None
+    result = job.result or {"success": False, "message": job.error}
+    if not result["success"]:
+        return f"❌ Hubo un error al generar el PDF: {result['message']}", None
+    pdf_link = _publish_pdf(result, "conversacion_resumen.pdf")
+    # Crear respuesta más concisa con link de descarga
+    answer = f"""✅ ¡PDF generado exitosamente!
+
+📄 **Tu resumen está listo para descargar:** {pdf_link}
+
+El PDF incluye:
+• Resumen de la conversación
+• Temas discutidos y código compartido
+• Mejoras y buenas prácticas sugeridas
+• Conclusiones"""
+    return answer, pdf_link
+
+
+def process_chat(user_message, chat_history, chat_jobs=None, request: gr.Request = None):
+    """
+    Procesa mensajes del chat. Detecta si el usuario pide un PDF de la conversación
+    y lo encola, o responde normalmente usando RAG para buenas prácticas.
+
+    Es un generador: la respuesta del LLM se emite token a token en el chatbot
+    a medida que llega, y el último valor contiene el historial definitivo.
+    Un PDF pedido se genera en la cola de trabajos: el chat responde al momento
+    con un mensaje provisional que `poll_chat_jobs` sustituye al terminar.
+
+    El resumen de la conversación se mantiene por sesión (`request.session_hash`)
+    y se actualiza en segundo plano cada pocos turnos, así que el PDF solo tiene
+    que resumir los últimos mensajes.
+
+    Yields:
+        tuple: (messages, messages, pdf_link, chat_jobs) donde pdf_link es el enlace
+        de descarga en Markdown (o None) y chat_jobs los IDs de trabajos pendientes
+    """
+    session_id = request.session_hash if request else None
+    messages = _normalize_history(chat_history)
+    chat_jobs = list(chat_jobs or [])
 
     if not user_message or not user_message.strip():
-        return messages, messages, None
+        yield messages, messages, None, chat_jobs
+        return
 
     # Detectar si el usuario pide un PDF de la conversación
     pdf_keywords = [
@@ -68,39 +190,25 @@ def process_chat(user_message, chat_history):
         
         if not messages:
             answer = "⚠️ Aún no tenemos conversación para exportar. ¡Hablemos un poco primero! Pregúntame sobre documentación de código, comparte código para analizar, o hazme cualquier consulta. Luego podrás pedirme que genere un PDF con el resumen de todo lo que hayamos discutido."
-            pdf_path = None
         else:
-            result = pdf_conversation_gen.generate_from_conversation(messages)
-            
-            if result["success"]:
-                pdf_path = result["pdf_path"]
-                # Crear respuesta más concisa con link de descarga
-                answer = f"""✅ ¡PDF generado exitosamente!
-
-📄 **Tu resumen está listo para descargar** (haz click en el botón de abajo)
-
-El PDF incluye:
-• Resumen de la conversación
-• Temas discutidos y código compartido
-• Mejoras y buenas prácticas sugeridas
-• Conclusiones
-
-También lo puedes encontrar en: `{pdf_path}`"""
-            else:
-                answer = f"❌ Hubo un error al generar el PDF: {result['message']}"
-                pdf_path = None
+            job = job_queue.submit(pdf_conversation_gen.generate_from_conversation, list(messages),
+                                   persist=PDF_PERSIST, session_id=session_id, kind="conversation_pdf")
+            chat_jobs.append(job.id)
+            answer = _job_placeholder(job)
         
         # Añadir mensajes al historial
         messages.append({'role': 'user', 'content': user_message})
         messages.append({'role': 'assistant', 'content': answer})
-        return messages, messages, pdf_path
+        yield messages, messages, None, chat_jobs
+        return
     
     # Si no pide PDF, responder normalmente con RAG
-    context = ""
+    context_texts = []
+    rag = registry.get_rag_engine()
     try:
         if rag:
             docs = rag.query(user_message)
-            context = "\n\n".join([d.page_content for d in docs[:3]])
+            context_texts = [d.page_content for d in docs]
     except Exception as e:
         print(f"⚠️ Error consultando RAG: {e}")
         # Fallback: búsqueda simple por archivos en `knowledge_base/`
@@ -119,9 +227,7 @@ También lo puedes encontrar en: `{pdf_path}`"""
                 except Exception:
                     continue
             scored.sort(reverse=True, key=lambda x: x[0])
-            context = "\n\n".join([t for s, t in scored[:3] if s > 0])
-            if not context and scored:
-                context = scored[0][1][:1000]
+            context_texts = [t for s, t in scored[:3] if s > 0] or [t for s, t in scored[:1]]
         except Exception as e2:
             print(f"⚠️ Fallback de búsqueda simple falló: {e2}")
 
@@ -135,25 +241,145 @@ También lo puedes encontrar en: `{pdf_path}`"""
         "'Genera un PDF con el resumen de esta conversación' o 'Exporta esta conversación a PDF'."
     )
 
-    prompt = f"{instructions}\n\nCONTEXTO DE LA BASE DE CONOCIMIENTO:\n{context}\n\nPREGUNTA DEL USUARIO:\n{user_message}\n\nRESPUESTA:" 
+    # El contexto se ordena por relevancia y se recorta al presupuesto que dejan
+    # las instrucciones y la pregunta
+    prompt = (PromptBuilder(DEFAULT_CHAT_PROMPT_TOKENS)
+              .add(instructions)
+              .add(lambda tokens: "\n\n".join(rank_context(context_texts, user_message, tokens)),
+                   "CONTEXTO DE LA BASE DE CONOCIMIENTO", priority=1)
+              .add(user_message, "PREGUNTA DEL USUARIO")
+              .add("RESPUESTA:")
+              .build())
 
+    # Añadir el mensaje del usuario y un mensaje vacío del asistente que se
+    # irá completando con los tokens según lleguen
+    messages.append({'role': 'user', 'content': user_message})
+    messages.append({'role': 'assistant', 'content': ''})
+    answer = ""
     try:
-        resp = agent.llm.invoke(prompt)
-        answer = resp.content.strip()
+        # Las preguntas repetidas se sirven desde la caché de respuestas del LLM
+        llm_cache = registry.get_llm_cache()
+        stream = llm_cache.stream(agent.llm, prompt) if llm_cache else agent.llm.stream(prompt)
+        for chunk in stream:
+            if not chunk.content:
+                continue
+            answer += chunk.content
+            messages[-1]['content'] = answer
+            yield messages, messages, None, chat_jobs
     except Exception as e:
         print(f"⚠️ Error invocando LLM para chat: {e}")
-        # Fallback simple
-        answer = (
-            "Soy un asistente de documentación de código. Puedo ayudarte con buenas prácticas, "
-            "analizar código que compartas, y generar PDFs con resúmenes de nuestras conversaciones. "
-            "¿En qué puedo ayudarte?"
-        )
-
-    # Añadir ambos mensajes al historial
-    messages.append({'role': 'user', 'content': user_message})
-    messages.append({'role': 'assistant', 'content': answer})
+        if not answer:
+            # Fallback simple
+            answer = (
+                "Soy un asistente de documentación de código. Puedo ayudarte con buenas prácticas, "
+                "analizar código que compartas, y generar PDFs con resúmenes de nuestras conversaciones. "
+                "¿En qué puedo ayudarte?"
+            )
+
+    # Confirmar la respuesta final en el historial
+    messages[-1]['content'] = answer.strip()
+    yield messages, messages, None, chat_jobs
+    pdf_conversation_gen.observe_turn(session_id, messages)
+
+
+def poll_chat_jobs(chat_history, chat_jobs):
+    """
+    Tick del temporizador del chat: actualiza el mensaje provisional de cada PDF
+    en curso con su etapa y lo sustituye por la respuesta final al terminar. El
+    temporizador se desactiva cuando no quedan trabajos pendientes.
+
+    Returns:
+        tuple: (messages, pdf_link, chat_jobs, timer)
+    """
+    if not chat_jobs:
+        return gr.skip(), gr.skip(), [], gr.Timer(active=False)
+    messages = _normalize_history(chat_history)
+    pending, pdf_link = [], gr.skip()
+    for job_id in chat_jobs:
+        job = job_queue.get(job_id)
+        marker = f"`[{job_id}]`"
+        index = next((i for i, m in enumerate(messages) if marker in str(m["content"])), None)
+        if job is None or index is None:
+            continue  # Trabajo caducado o chat limpiado
+        if job.done:
+            messages[index]["content"], link = _conversation_pdf_answer(job)
+            if link:
+                pdf_link = link
+        else:
+            messages[index]["content"] = _job_placeholder(job)
+            pending.append(job_id)
+    return messages, pdf_link, pending, gr.Timer(active=bool(pending))
+
+
+def cancel_jobs(job_ids):
+    """Cancela los trabajos indicados (un ID o una lista); el temporizador refleja el resultado."""
+    for job_id in ([job_ids] if isinstance(job_ids, str) else job_ids or []):
+        job_queue.cancel(job_id)
+
+
+def _section_markdown(section):
+    """Traduce una sección del documento a Markdown para la vista previa."""
+    content = section.get("content", "")
+    if section.get("type") == "heading":
+        return "#" * (min(section.get("level") or 1, 2) + 1) + " " + content
+    if section.get("type") == "code":
+        return f"```\n{content}\n```"
+    return content
+
+
+def _document_job(code, language, progress):
+    """Trabajo de la cola: documenta el código publicando cada sección como progreso."""
+    for event in agent.stream_run(code, language=language, persist=PDF_PERSIST, progress=progress):
+        if event["type"] == "done":
+            return event
+        progress("generation", event)
+
+
+def document_code(code, language):
+    """
+    Encola la documentación de un fragmento de código y responde al momento; la
+    vista previa la va rellenando `poll_document_job` con las secciones que el
+    LLM ya completó, sin esperar a la respuesta entera ni al PDF.
+
+    Returns:
+        tuple: (vista previa, enlace de descarga, ID del trabajo, timer)
+    """
+    if not code or not code.strip():
+        return "⚠️ Pega primero el código a documentar.", None, None, gr.Timer(active=False)
+    job = job_queue.submit(_document_job, code, language, kind="documentation")
+    return "⏳ En cola...", None, job.id, gr.Timer(active=True)
+
+
+def poll_document_job(job_id):
+    """
+    Tick del temporizador de la pestaña de documentación.
+
+    Returns:
+        tuple: (vista previa, enlace de descarga, ID si sigue en curso, timer)
+    """
+    job = job_queue.get(job_id) if job_id else None
+    if job is None:
+        return gr.skip(), gr.skip(), None, gr.Timer(active=False)
+
+    title, parts = "", []
+    for _, _, event in list(job.events):
+        if isinstance(event, dict) and event["type"] == "title":
+            title = f"# {event['title']}"
+        elif isinstance(event, dict) and event["type"] == "section":
+            parts.append(_section_markdown(event["section"]))
 
-    return messages, messages, None
+    if not job.done:
+        status = f"⏳ {STAGE_LABELS.get(job.stage, 'en cola').capitalize()}..."
+        return "\n\n".join([title, *parts, status]), None, job_id, gr.Timer(active=True)
+    pdf_link = None
+    if job.status == "cancelled":
+        status = "🛑 Generación cancelada"
+    elif job.status == "failed":
+        status = f"❌ {job.error}"
+    else:
+        pdf_link = _publish_pdf(job.result, "documentacion_tecnica.pdf")
+        status = "✅ PDF listo para descargar" if pdf_link else f"❌ {job.result['output']}"
+    return "\n\n".join([title, *parts, f"---\n{status}"]), pdf_link, None, gr.Timer(active=False)
 
 
 # Diseño de la interfaz simplificada
@@ -174,54 +400,76 @@ with gr.Blocks(title="Asistente de Documentación de Código") as demo:
                 elem_classes="subtitle"
             )
     
-    with gr.Row():
-        with gr.Column(scale=1):
-            chat_bot = gr.Chatbot(
-                label="Conversación",
-                height=500,
-                show_label=True
-            )
-            message = gr.Textbox(
-                label="Escribe tu mensaje aquí",
-                placeholder="Ej: ¿Cómo documento una función en Python? o Genera un PDF con el resumen de esta conversación",
-                lines=3,
-                show_label=True
-            )
+    with gr.Tabs():
+        with gr.Tab("💬 Chat"):
             with gr.Row():
-                send_btn = gr.Button("Enviar", variant="primary", scale=2)
-                clear_btn = gr.Button("Limpiar chat", scale=1)
+                with gr.Column(scale=1):
+                    chat_bot = gr.Chatbot(
+                        label="Conversación",
+                        height=500,
+                        show_label=True
+                    )
+                    message = gr.Textbox(
+                        label="Escribe tu mensaje aquí",
+                        placeholder="Ej: ¿Cómo documento una función en Python? o Genera un PDF con el resumen de esta conversación",
+                        lines=3,
+                        show_label=True
+                    )
+                    with gr.Row():
+                        send_btn = gr.Button("Enviar", variant="primary", scale=2)
+                        clear_btn = gr.Button("Limpiar chat", scale=1)
+                        cancel_chat_btn = gr.Button("Cancelar PDF", scale=1)
             
-            # Componente para descargar PDF generado
-            pdf_output = gr.File(
-                label="📄 Descargar PDF generado",
-                visible=True,
-                interactive=False
-            )
+                    # Enlace para descargar el PDF generado
+                    pdf_output = gr.Markdown()
+                    # PDFs en curso y temporizador que consulta su estado
+                    chat_jobs = gr.State([])
+                    chat_timer = gr.Timer(1.0, active=False)
             
-            gr.Markdown("""
-            ### 💡 ¿Qué puedo hacer?
+                    gr.Markdown("""
+                    ### 💡 ¿Qué puedo hacer?
             
-            - **Consultar buenas prácticas**: Pregúntame sobre documentación de código
-            - **Analizar código**: Comparte código y te daré sugerencias
-            - **Generar PDFs**: Pide "Genera un PDF con el resumen de esta conversación"
+                    - **Consultar buenas prácticas**: Pregúntame sobre documentación de código
+                    - **Analizar código**: Comparte código y te daré sugerencias
+                    - **Generar PDFs**: Pide "Genera un PDF con el resumen de esta conversación"
             
-            ### 📚 Ejemplos de preguntas:
+                    ### 📚 Ejemplos de preguntas:
             
-            - ¿Cómo documento una función en Python?
-            - Dame ejemplos de docstrings con estilo Google
-            - Analiza este código: `def suma(a, b): return a + b`
-            - ¿Cómo funcionas?
-            - Genera un PDF con nuestra conversación
-            """)
-    
+                    - ¿Cómo documento una función en Python?
+                    - Dame ejemplos de docstrings con estilo Google
+                    - Analiza este código: `def suma(a, b): return a + b`
+                    - ¿Cómo funcionas?
+                    - Genera un PDF con nuestra conversación
+                    """)
+
+        with gr.Tab("📝 Documentar código"):
+            with gr.Row():
+                with gr.Column(scale=1):
+                    code_input = gr.Code(label="Código", lines=20)
+                    language_input = gr.Dropdown(
+                        ["python", "javascript", "typescript", "go", "java"],
+                        value="python",
+                        label="Lenguaje"
+                    )
+                    with gr.Row():
+                        document_btn = gr.Button("Generar documentación", variant="primary", scale=2)
+                        cancel_doc_btn = gr.Button("Cancelar", scale=1)
+                with gr.Column(scale=1):
+                    # Las secciones aparecen aquí según las va generando el LLM
+                    doc_preview = gr.Markdown()
+                    doc_pdf = gr.Markdown()
+                    doc_job = gr.State(None)
+                    doc_timer = gr.Timer(1.0, active=False)
+
     # Event handlers
     send_btn.click(
         fn=process_chat,
-        inputs=[message, chat_bot],
-        outputs=[chat_bot, chat_bot, pdf_output]
+        inputs=[message, chat_bot, chat_jobs],
+        outputs=[chat_bot, chat_bot, pdf_output, chat_jobs]
     ).then(
-        lambda: "",  # Limpiar el textbox después de enviar
-        outputs=[message]
+        lambda jobs: ("", gr.Timer(active=bool(jobs))),  # Limpiar el textbox después de enviar
+        inputs=[chat_jobs],
+        outputs=[message, chat_timer]
     )
     
     clear_btn.click(
@@ -231,14 +479,44 @@ with gr.Blocks(title="Asistente de Documentación de Código") as demo:
     
     message.submit(
         fn=process_chat,
-        inputs=[message, chat_bot],
-        outputs=[chat_bot, chat_bot, pdf_output]
+        inputs=[message, chat_bot, chat_jobs],
+        outputs=[chat_bot, chat_bot, pdf_output, chat_jobs]
     ).then(
-        lambda: "",
-        outputs=[message]
+        lambda jobs: ("", gr.Timer(active=bool(jobs))),
+        inputs=[chat_jobs],
+        outputs=[message, chat_timer]
+    )
+
+    cancel_chat_btn.click(fn=cancel_jobs, inputs=[chat_jobs])
+
+    chat_timer.tick(
+        fn=poll_chat_jobs,
+        inputs=[chat_bot, chat_jobs],
+        outputs=[chat_bot, pdf_output, chat_jobs, chat_timer]
     )
 
+    document_btn.click(
+        fn=document_code,
+        inputs=[code_input, language_input],
+        outputs=[doc_preview, doc_pdf, doc_job, doc_timer]
+    )
+
+    cancel_doc_btn.click(fn=cancel_jobs, inputs=[doc_job])
+
+    doc_timer.tick(
+        fn=poll_document_job,
+        inputs=[doc_job],
+        outputs=[doc_preview, doc_pdf, doc_job, doc_timer]
+    )
+
+# La interfaz se monta sobre la app de FastAPI que sirve las descargas
+app = gr.mount_gradio_app(api, demo, path="/")
+
 if __name__ == "__main__":
+    import uvicorn
     # Permite sobrescribir el puerto por variable de entorno `GRADIO_SERVER_PORT`
     port = int(os.environ.get("GRADIO_SERVER_PORT", "7860"))
-    demo.launch(server_name="127.0.0.1", server_port=port)
+    # El calentamiento lo lanza el lifespan de `api` una vez abierto el puerto
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port))
+    app.state.server = server
+    server.run()
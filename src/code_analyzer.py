@@ -1,56 +1,543 @@
+import os
 import ast
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from langfuse import observe
+from .cache import LRUCache, make_key
+
+
+def normalize_source(code):
+    """
+    Normaliza solo los finales de línea para que el hash sea estable entre
+    sistemas. No quita líneas ni espacios: la estructura guarda números de
+    línea absolutos y no pueden cambiar bajo la misma clave.
+    """
+    return code.replace("\r\n", "\n").replace("\r", "\n")
+
+
+# Registros compactos de la estructura del código. Usan __slots__ para que un
+# módulo grande no cree un dict por símbolo; solo se convierten a dict/JSON al
+# construir el prompt (`to_dict`). Se tratan como inmutables porque se comparten
+# desde la caché del analizador.
+
+class ArgInfo:
+    __slots__ = ("name", "kind", "annotation", "default")
+
+    # kind: "posonly", "positional", "vararg", "kwonly" o "varkw"
+    def __init__(self, name, kind="positional", annotation=None, default=None):
+        self.name = name
+        self.kind = kind
+        self.annotation = annotation
+        self.default = default
+
+    def render(self):
+        prefix = {"vararg": "*", "varkw": "**"}.get(self.kind, "")
+        text = prefix + self.name
+        if self.annotation:
+            text += f": {self.annotation}"
+        if self.default is not None:
+            text += f" = {self.default}" if self.annotation else f"={self.default}"
+        return text
+
+
+class FunctionInfo:
+    __slots__ = ("name", "qualname", "lineno", "end_lineno", "is_async", "is_method",
+                 "decorators", "args", "returns", "docstring", "nested", "source_hash", "declaration")
+
+    def __init__(self, name, qualname, lineno, end_lineno, is_async=False, is_method=False,
+                 decorators=(), args=(), returns=None, docstring=None, source_hash=None, declaration=None):
+        self.name = name
+        self.qualname = qualname
+        self.lineno = lineno
+        self.end_lineno = end_lineno
+        self.is_async = is_async
+        self.is_method = is_method
+        self.decorators = list(decorators)
+        self.args = list(args)
+        self.returns = returns
+        self.docstring = docstring
+        # Hash del código fuente del símbolo (decoradores incluidos)
+        self.source_hash = source_hash
+        # Declaración tal cual aparece en el código (lenguajes distintos de Python)
+        self.declaration = declaration
+        # Funciones y clases definidas dentro de esta función
+        self.nested = []
+
+    def signature(self):
+        if self.declaration:
+            return self.declaration
+        parts = []
+        seen_vararg = False
+        for i, arg in enumerate(self.args):
+            # Separadores de argumentos solo-nombrados (*) y solo-posicionales (/)
+            if arg.kind == "vararg":
+                seen_vararg = True
+            elif arg.kind == "kwonly" and not seen_vararg:
+                parts.append("*")
+                seen_vararg = True
+            parts.append(arg.render())
+            if arg.kind == "posonly" and (i + 1 == len(self.args) or self.args[i + 1].kind != "posonly"):
+                parts.append("/")
+        text = f"{'async ' if self.is_async else ''}def {self.name}({', '.join(parts)})"
+        if self.returns:
+            text += f" -> {self.returns}"
+        return text
+
+    def to_dict(self):
+        data = {
+            "name": self.name,
+            "lineno": self.lineno,
+            "end_lineno": self.end_lineno,
+            "signature": self.signature(),
+            "docstring": self.docstring or "No docstring",
+            "args": [arg.name for arg in self.args]
+        }
+        if self.decorators:
+            data["decorators"] = self.decorators
+        if self.nested:
+            data["nested"] = [symbol.to_dict() for symbol in self.nested]
+        return data
+
+
+class ClassInfo:
+    __slots__ = ("name", "qualname", "lineno", "end_lineno", "bases", "decorators",
+                 "docstring", "methods", "classes", "source_hash")
+
+    def __init__(self, name, qualname, lineno, end_lineno, bases=(), decorators=(), docstring=None,
+                 source_hash=None):
+        self.name = name
+        self.qualname = qualname
+        self.lineno = lineno
+        self.end_lineno = end_lineno
+        self.bases = list(bases)
+        self.decorators = list(decorators)
+        self.docstring = docstring
+        self.source_hash = source_hash
+        self.methods = []
+        self.classes = []
+
+    def to_dict(self):
+        data = {
+            "name": self.name,
+            "lineno": self.lineno,
+            "end_lineno": self.end_lineno,
+            "docstring": self.docstring or "No docstring",
+            "methods": [method.to_dict() for method in self.methods]
+        }
+        if self.bases:
+            data["bases"] = self.bases
+        if self.decorators:
+            data["decorators"] = self.decorators
+        if self.classes:
+            data["classes"] = [cls.to_dict() for cls in self.classes]
+        return data
+
+
+class ModuleInfo:
+    __slots__ = ("functions", "classes", "imports", "docstring", "error", "info")
+
+    def __init__(self, docstring=None, error=None, info=None):
+        self.functions = []
+        self.classes = []
+        self.imports = []
+        self.docstring = docstring
+        self.error = error
+        self.info = info
+
+    def symbols(self):
+        """Funciones y clases de primer nivel en el orden del código fuente."""
+        return sorted(self.functions + self.classes, key=lambda symbol: symbol.lineno)
+
+    def to_dict(self):
+        if self.error:
+            return {"error": self.error}
+        if self.info:
+            return {"info": self.info}
+        data = {
+            "classes": [cls.to_dict() for cls in self.classes],
+            "functions": [func.to_dict() for func in self.functions],
+            "imports": list(self.imports)
+        }
+        if self.docstring:
+            data["docstring"] = self.docstring
+        return data
+
+
+def _unparse(node):
+    return ast.unparse(node) if node is not None else None
+
+
+class _SymbolVisitor(ast.NodeVisitor):
+    """
+    Recorre el AST en una sola pasada construyendo el árbol de símbolos.
+    Solo desciende por bloques de sentencias (cuerpos de if/try/with/...),
+    no por expresiones, para que el coste dependa del número de sentencias.
+    """
+
+    def __init__(self, module, lines):
+        self.module = module
+        # Líneas del código fuente, para calcular el hash de cada símbolo
+        self.lines = lines
+        # Pila de registros contenedores para resolver qualnames y anidamiento
+        self.stack = []
+
+    def _qualname(self, name):
+        if not self.stack:
+            return name
+        parent = self.stack[-1]
+        separator = ".<locals>." if isinstance(parent, FunctionInfo) else "."
+        return parent.qualname + separator + name
+
+    def _attach(self, record):
+        if not self.stack:
+            target = self.module.functions if isinstance(record, FunctionInfo) else self.module.classes
+        else:
+            parent = self.stack[-1]
+            if isinstance(parent, ClassInfo):
+                target = parent.methods if isinstance(record, FunctionInfo) else parent.classes
+            else:
+                target = parent.nested
+        target.append(record)
+
+    def generic_visit(self, node):
+        for field in ("body", "orelse", "finalbody", "handlers", "cases"):
+            for child in getattr(node, field, ()):
+                if isinstance(child, ast.AST):
+                    self.visit(child)
+
+    def _source_hash(self, node):
+        start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+        segment = "\n".join(line.rstrip() for line in self.lines[start - 1:node.end_lineno])
+        return make_key(segment)[:16]
+
+    @staticmethod
+    def _arguments(args):
+        positional = args.posonlyargs + args.args
+        # Los defaults se alinean con los últimos argumentos posicionales
+        defaults = [None] * (len(positional) - len(args.defaults)) + list(args.defaults)
+        result = []
+        for i, (arg, default) in enumerate(zip(positional, defaults)):
+            kind = "posonly" if i < len(args.posonlyargs) else "positional"
+            result.append(ArgInfo(arg.arg, kind, _unparse(arg.annotation), _unparse(default)))
+        if args.vararg:
+            result.append(ArgInfo(args.vararg.arg, "vararg", _unparse(args.vararg.annotation)))
+        for arg, default in zip(args.kwonlyargs, args.kw_defaults):
+            result.append(ArgInfo(arg.arg, "kwonly", _unparse(arg.annotation), _unparse(default)))
+        if args.kwarg:
+            result.append(ArgInfo(args.kwarg.arg, "varkw", _unparse(args.kwarg.annotation)))
+        return result
+
+    def _visit_function(self, node):
+        record = FunctionInfo(
+            name=node.name,
+            qualname=self._qualname(node.name),
+            lineno=node.lineno,
+            end_lineno=node.end_lineno,
+            is_async=isinstance(node, ast.AsyncFunctionDef),
+            is_method=bool(self.stack) and isinstance(self.stack[-1], ClassInfo),
+            decorators=[ast.unparse(d) for d in node.decorator_list],
+            args=self._arguments(node.args),
+            returns=_unparse(node.returns),
+            docstring=ast.get_docstring(node),
+            source_hash=self._source_hash(node)
+        )
+        self._attach(record)
+        self.stack.append(record)
+        self.generic_visit(node)
+        self.stack.pop()
+
+    visit_FunctionDef = _visit_function
+    visit_AsyncFunctionDef = _visit_function
+
+    def visit_ClassDef(self, node):
+        record = ClassInfo(
+            name=node.name,
+            qualname=self._qualname(node.name),
+            lineno=node.lineno,
+            end_lineno=node.end_lineno,
+            bases=[ast.unparse(b) for b in node.bases] + [ast.unparse(k) for k in node.keywords],
+            decorators=[ast.unparse(d) for d in node.decorator_list],
+            docstring=ast.get_docstring(node),
+            source_hash=self._source_hash(node)
+        )
+        self._attach(record)
+        self.stack.append(record)
+        self.generic_visit(node)
+        self.stack.pop()
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.module.imports.append(alias.name)
+
+    def visit_ImportFrom(self, node):
+        # Los imports relativos conservan sus puntos (p. ej. ".rag_engine");
+        # en `from . import x` lo importado es el propio submódulo `.x`
+        prefix = "." * node.level
+        if node.module:
+            self.module.imports.append(prefix + node.module)
+        else:
+            self.module.imports.extend(prefix + alias.name for alias in node.names)
+
+
+def diff_symbols(previous, current):
+    """
+    Compara dos versiones de un módulo a nivel de símbolo de primer nivel usando
+    el hash del código de cada símbolo.
+
+    Returns:
+        dict: Qualnames "added", "removed", "changed" y "unchanged".
+    """
+    old = {symbol.qualname: symbol for symbol in previous.symbols()}
+    new = {symbol.qualname: symbol for symbol in current.symbols()}
+    return {
+        "added": [name for name in new if name not in old],
+        "removed": [name for name in old if name not in new],
+        "changed": [name for name in new if name in old and new[name].source_hash != old[name].source_hash],
+        "unchanged": [name for name in new if name in old and new[name].source_hash == old[name].source_hash]
+    }
+
+
+class PackageInfo:
+    """Estructura de un paquete: un ModuleInfo por módulo y el grafo de imports internos."""
+    __slots__ = ("root", "modules", "import_graph")
+
+    def __init__(self, root, modules, import_graph):
+        self.root = root
+        # {nombre del módulo (p. ej. "src.agent"): ModuleInfo}, ordenado por nombre
+        self.modules = modules
+        # {módulo: [módulos internos que importa]}
+        self.import_graph = import_graph
+
+    def to_dict(self):
+        return {
+            "modules": {name: module.to_dict() for name, module in self.modules.items()},
+            "import_graph": self.import_graph
+        }
+
+
+def parse_python(code):
+    """Construye el ModuleInfo de un código Python (sin caché ni trazas)."""
+    try:
+        tree = ast.parse(code)
+        module = ModuleInfo(docstring=ast.get_docstring(tree))
+        _SymbolVisitor(module, code.splitlines()).visit(tree)
+        return module
+    except SyntaxError as e:
+        return ModuleInfo(error=f"Error de sintaxis: {str(e)[:100]}")
+    except Exception as e:
+        return ModuleInfo(error=f"Error al analizar: {str(e)[:100]}")
+
+
+# Analizadores por lenguaje: cualquier callable `parser(code) -> ModuleInfo`.
+# Los de JavaScript/TypeScript, Go y Java están en `language_parsers`.
+_PARSERS = {}
+_EXTENSIONS = {}
+_RESOLVERS = {}
+
+
+def register_parser(parser, languages, extensions=(), resolver=None):
+    """
+    Registra un analizador para uno o varios lenguajes.
+
+    Args:
+        parser (callable): Recibe el código fuente y devuelve un ModuleInfo.
+        languages (str | list): Nombre del lenguaje y sus alias (p. ej. ["typescript", "ts"]).
+        extensions (tuple): Extensiones de archivo que se analizan con este parser.
+        resolver (callable, opcional): `resolver(ruta, import, rutas)` que devuelve los
+            módulos internos a los que apunta un import del lenguaje; `ruta` es la del
+            archivo que importa y `rutas` es {ruta relativa con "/": nombre del módulo}.
+    """
+    languages = [languages] if isinstance(languages, str) else list(languages)
+    for language in languages:
+        _PARSERS[language.lower()] = parser
+    for extension in extensions:
+        _EXTENSIONS[extension.lower()] = languages[0].lower()
+    if resolver is not None:
+        _RESOLVERS[languages[0].lower()] = resolver
+
+
+def get_parser(language):
+    return _PARSERS.get(language.lower())
+
+
+def language_for_path(path):
+    """Lenguaje registrado para la extensión del archivo, o None."""
+    return _EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+register_parser(parse_python, ["python", "py"], extensions=(".py",))
+
+
+# Directorios que nunca forman parte del paquete a documentar
+IGNORED_DIRS = {"__pycache__", "venv", ".venv", "node_modules", "build", "dist", "site-packages"}
+
+
+def _analyze_file(path):
+    """Tarea del pool de procesos: lee y analiza un archivo."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return get_parser(language_for_path(path) or "python")(f.read())
+    except (OSError, UnicodeDecodeError) as e:
+        return ModuleInfo(error=f"Error al leer el archivo: {str(e)[:100]}")
+
+
+def module_name(root, path):
+    """
+    Nombre de módulo con puntos a partir de la ruta (`pkg/sub/__init__.py` -> `pkg.sub`).
+    Si `root` es un paquete su nombre forma parte del módulo; si no, es la raíz de imports.
+    Los archivos que no son Python conservan la extensión (`pkg/api.ts` -> `pkg.api.ts`)
+    para que `api.py`, `api.js` y `api.ts` de un mismo directorio no compartan nombre.
+    """
+    root = os.path.abspath(root)
+    base = os.path.dirname(root) if os.path.exists(os.path.join(root, "__init__.py")) else root
+    rel_path = os.path.relpath(os.path.abspath(path), base)
+    stem, ext = os.path.splitext(rel_path)
+    parts = stem.split(os.sep)
+    if ext != ".py":
+        parts[-1] += ext
+    elif parts[-1] == "__init__":
+        parts = parts[:-1]
+    return ".".join(parts)
+
+
+def iter_source_files(root, extensions=None):
+    """Archivos fuente bajo `root` (por defecto, los de cualquier lenguaje registrado)."""
+    extensions = tuple(extensions or _EXTENSIONS)
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in IGNORED_DIRS and not d.startswith("."))
+        for filename in sorted(filenames):
+            if filename.endswith(extensions):
+                yield os.path.join(dirpath, filename)
+
+
+def resolve_import(importer, imported, known_modules, is_package=False):
+    """
+    Resuelve un import (absoluto o relativo) al módulo interno más específico
+    que lo contiene, o None si es externo.
+    """
+    if imported.startswith("."):
+        level = len(imported) - len(imported.lstrip("."))
+        package = importer.split(".") if is_package else importer.split(".")[:-1]
+        if level > 1:
+            package = package[:-(level - 1)]
+        rest = imported[level:]
+        imported = ".".join(package + ([rest] if rest else []))
+    parts = imported.split(".")
+    for end in range(len(parts), 0, -1):
+        candidate = ".".join(parts[:end])
+        if candidate in known_modules:
+            return candidate
+    return None
+
+
+def build_import_graph(modules, packages=(), paths=None):
+    """
+    Grafo de dependencias entre los módulos analizados a partir de sus `imports`.
+
+    Los imports de Python se resuelven por nombre de módulo (`resolve_import`) y
+    los de otros lenguajes con el `resolver` registrado para el lenguaje. Los
+    módulos de un lenguaje sin resolver no aparecen en el grafo: sus dependencias
+    son desconocidas, no vacías.
+
+    Args:
+        modules (dict): {nombre del módulo: ModuleInfo}
+        packages (iterable): Nombres de módulos que son paquetes (`__init__.py`).
+        paths (dict, opcional): {nombre del módulo: ruta relativa a la raíz, con "/"}.
+            Sin rutas todos los módulos se tratan como Python.
+    """
+    packages = set(packages)
+    paths = paths or {}
+    by_path = {path: name for name, path in paths.items()}
+    graph = {}
+    for name, module in modules.items():
+        language = language_for_path(paths[name]) if name in paths else "python"
+        if language != "python" and language not in _RESOLVERS:
+            continue
+        targets = set()
+        for imported in module.imports:
+            if language == "python":
+                found = [resolve_import(name, imported, modules, is_package=name in packages)]
+            else:
+                found = _RESOLVERS[language](paths[name], imported, by_path)
+            targets.update(target for target in found if target and target != name)
+        graph[name] = sorted(targets)
+    return graph
+
 
 class CodeAnalyzer:
-    def __init__(self):
-        pass
+    def __init__(self, cache_size=256):
+        # Resultados de análisis por hash del código normalizado
+        self._cache = LRUCache(maxsize=cache_size)
 
     @observe(as_type="span")
     def analyze_python(self, code):
-        """Analiza código Python usando AST para extraer estructura."""
-        try:
-            tree = ast.parse(code)
-            structure = {
-                "classes": [],
-                "functions": [],
-                "imports": []
-            }
-
-            # Iteración controlada para top-level
-            for node in tree.body:
-                if isinstance(node, ast.FunctionDef):
-                    structure["functions"].append({
-                        "name": node.name,
-                        "docstring": ast.get_docstring(node) or "No docstring",
-                        "args": [arg.arg for arg in node.args.args]
-                    })
-                elif isinstance(node, ast.ClassDef):
-                    methods = [n.name for n in node.body if isinstance(n, ast.FunctionDef)]
-                    structure["classes"].append({
-                        "name": node.name,
-                        "docstring": ast.get_docstring(node) or "No docstring",
-                        "methods": methods
-                    })
-                elif isinstance(node, ast.Import):
-                    for alias in node.names:
-                        structure["imports"].append(alias.name)
-                elif isinstance(node, ast.ImportFrom):
-                    module = node.module or ""
-                    structure["imports"].append(module)
-
-            return structure
-        except SyntaxError as e:
-            return {"error": f"Error de sintaxis: {str(e)[:100]}"}
-        except Exception as e:
-            return {"error": f"Error al analizar: {str(e)[:100]}"}
+        """
+        Analiza código Python usando AST para extraer el árbol completo de símbolos:
+        funciones (también async), clases anidadas, métodos con firma, decoradores,
+        anotaciones, valores por defecto, rangos de líneas y docstrings.
+
+        Returns:
+            ModuleInfo: Estructura del módulo (con `error` si no se pudo analizar).
+        """
+        return parse_python(code)
 
     @observe(as_type="span")
     def analyze(self, code, language="python"):
-        if language.lower() == "python":
-            return self.analyze_python(code)
-        else:
-            # Fallback básico para otros lenguajes (podría mejorarse con regex)
-            return {"info": "Análisis detallado solo disponible para Python por ahora."}
+        key = make_key(language.lower(), normalize_source(code))
+        cached = self._cache.get(key)
+        if cached is None:
+            parser = get_parser(language)
+            if parser is parse_python:
+                cached = self.analyze_python(code)
+            elif parser is not None:
+                cached = parser(code)
+            else:
+                cached = ModuleInfo(info=f"Análisis detallado no disponible para {language}.")
+            self._cache.set(key, cached)
+        # Los registros se comparten con la caché: quien los use no debe modificarlos
+        return cached
+
+    def iter_package(self, root, max_workers=None):
+        """
+        Analiza en paralelo (pool de procesos) todos los archivos fuente bajo `root`
+        y va devolviendo cada resultado en cuanto está listo.
+
+        Yields:
+            tuple: (nombre del módulo, ruta, ModuleInfo)
+        """
+        paths = list(iter_source_files(root))
+        if not paths:
+            return
+        # `spawn`: un fork desde el servidor (con hilos de la cola de trabajos,
+        # resúmenes y Langfuse) heredaría locks que ningún hilo del hijo liberaría
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+            futures = {executor.submit(_analyze_file, path): path for path in paths}
+            for future in as_completed(futures):
+                path = futures[future]
+                yield module_name(root, path), path, future.result()
+
+    @observe(as_type="span")
+    def analyze_package(self, root, max_workers=None):
+        """
+        Analiza un directorio completo y construye el grafo de imports entre módulos.
+
+        Returns:
+            PackageInfo: Módulos ordenados por nombre y grafo de imports internos.
+        """
+        modules, packages, paths = {}, set(), {}
+        for name, path, module in self.iter_package(root, max_workers=max_workers):
+            modules[name] = module
+            paths[name] = os.path.relpath(path, root).replace(os.sep, "/")
+            if os.path.basename(path) == "__init__.py":
+                packages.add(name)
+        modules = dict(sorted(modules.items()))
+        return PackageInfo(root, modules, build_import_graph(modules, packages, paths))
+
+
+# Analizadores incluidos para otros lenguajes: se registran al importarse
+from . import language_parsers  # noqa: E402,F401
+
 
 if __name__ == "__main__":
     code = """
@@ -66,4 +553,4 @@ def mi_funcion(a, b):
     return a + b
 """
     analyzer = CodeAnalyzer()
-    print(analyzer.analyze(code))
+    print(analyzer.analyze(code).to_dict())
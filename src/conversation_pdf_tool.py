@@ -1,5 +1,10 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
+from . import registry
+from .conversation_summary import ConversationSummaries, merge_analyses, split_windows
 from .pdf_generator import PDFGenerator
+from .prompt_builder import count_tokens, truncate_to_tokens
+from .schemas import ConversationAnalysis, SummaryCombination, invoke_structured
+from concurrent.futures import ThreadPoolExecutor
+from pydantic import ValidationError
 import json
 from datetime import datetime
 import os
@@ -7,6 +12,45 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Tokens de conversación por llamada al LLM: los historiales más largos se
+# resumen por ventanas en paralelo (map) y luego se unen (reduce)
+DEFAULT_WINDOW_TOKENS = int(os.environ.get("SUMMARY_WINDOW_TOKENS", "6000"))
+DEFAULT_SUMMARY_CONCURRENCY = int(os.environ.get("SUMMARY_MAX_CONCURRENCY", "4"))
+
+# Campos del resumen y formato de salida, compartidos por el análisis completo y el incremental
+ANALYSIS_FIELDS = """1. "resumen_general": Un párrafo conciso (2-3 frases) sobre el tema principal de la conversación
+2. "temas_discutidos": Lista de los temas principales discutidos (máximo 5)
+3. "codigo_compartido": Lista de fragmentos de código mencionados o discutidos (si los hay). Cada elemento debe tener "descripcion" y "codigo"
+4. "mejoras_sugeridas": Lista de mejoras o recomendaciones que se mencionaron
+5. "buenas_practicas": Lista de buenas prácticas de programación discutidas o aplicables
+6. "conclusiones": Conclusión final de la conversación (1-2 frases)
+
+FORMATO DE SALIDA (JSON):
+Devuelve SOLO un JSON válido con esta estructura exacta:
+{
+  "resumen_general": "Texto del resumen...",
+  "temas_discutidos": ["Tema 1", "Tema 2", ...],
+  "codigo_compartido": [
+    {"descripcion": "Función de ejemplo", "codigo": "def ejemplo():\\n    pass"},
+    ...
+  ],
+  "mejoras_sugeridas": ["Mejora 1", "Mejora 2", ...],
+  "buenas_practicas": ["Práctica 1", "Práctica 2", ...],
+  "conclusiones": "Texto de conclusión..."
+}
+
+IMPORTANTE: Si alguna sección no aplica (por ejemplo, no se compartió código), usa una lista vacía [] o string vacío "".
+Devuelve SOLO el JSON, sin texto adicional antes o después."""
+
+FALLBACK_ANALYSIS = {
+    "resumen_general": "Conversación sobre programación y buenas prácticas.",
+    "temas_discutidos": ["Programación", "Buenas prácticas"],
+    "codigo_compartido": [],
+    "mejoras_sugeridas": [],
+    "buenas_practicas": [],
+    "conclusiones": "Conversación técnica completada."
+}
+
 
 class ConversationPDFGenerator:
     """
@@ -18,15 +62,19 @@ class ConversationPDFGenerator:
     - Buenas prácticas aplicables
     """
     
-    def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(
-            model="models/gemini-2.5-flash", 
-            temperature=0.3,
-            max_output_tokens=8192
-        )
+    def __init__(self, window_tokens=DEFAULT_WINDOW_TOKENS, max_concurrency=DEFAULT_SUMMARY_CONCURRENCY):
         self.pdf_gen = PDFGenerator()
+        self.window_tokens = window_tokens
+        self.max_concurrency = max_concurrency
+        # Resumen incremental por sesión (ver `observe_turn`)
+        self.summaries = ConversationSummaries(self._update_analysis)
+
+    @property
+    def llm(self):
+        # Mismo cliente Gemini que el agente, construido de forma perezosa
+        return registry.get_llm()
     
-    def generate_from_conversation(self, chat_history):
+    def generate_from_conversation(self, chat_history, persist=True, progress=None, session_id=None):
         """
         Genera un PDF con el resumen de la conversación.
         
@@ -34,38 +82,52 @@ class ConversationPDFGenerator:
             chat_history (list): Lista de mensajes de la conversación.
                 Puede ser una lista de dicts con 'role' y 'content',
                 o una lista de tuplas (user_msg, assistant_msg).
+            persist (bool): Si es False el PDF se genera en memoria y se devuelve
+                en 'pdf_bytes', sin escribir en disco.
+            progress (callable, opcional): `progress(etapa, detalle)` al empezar cada
+                etapa ("analysis", "generation", "render"), p. ej. `Job.report`.
+            session_id (str, opcional): Sesión del chat. Si se indica, se parte del
+                resumen incremental de la sesión y solo se analizan los mensajes
+                que aún no cubre, en lugar de toda la conversación.
         
         Returns:
-            dict: Diccionario con 'success', 'message' y 'pdf_path'
+            dict: Diccionario con 'success', 'message', 'pdf_path' y 'pdf_bytes'
         """
         try:
-            # Normalizar historial a formato de texto legible
-            conversation_text = self._format_conversation(chat_history)
-            
-            if not conversation_text.strip():
+            if progress:
+                progress("analysis")
+            messages = self._normalize_history(chat_history)
+            if not any(str(m['content']).strip() for m in messages):
                 return {
                     "success": False,
                     "message": "No hay conversación para exportar.",
-                    "pdf_path": None
+                    "pdf_path": None,
+                    "pdf_bytes": None
                 }
             
             # Generar análisis inteligente con el LLM
             print("📊 Analizando conversación con IA...")
-            analysis = self._analyze_conversation(conversation_text)
+            if progress:
+                progress("generation")
+            if session_id:
+                analysis = self._session_analysis(session_id, chat_history)
+            else:
+                analysis = self._analyze_conversation(messages)
             
             # Generar estructura del PDF
             print("📄 Generando estructura del PDF...")
+            if progress:
+                progress("render")
             pdf_data = self._create_pdf_structure(analysis)
             
-            # Generar PDF con nombre único basado en timestamp
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            self.pdf_gen.output_filename = f"conversacion_resumen_{timestamp}.pdf"
-            pdf_path = self.pdf_gen.generate(pdf_data)
+            # PDFGenerator añade fecha e identificador únicos al nombre
+            pdf = self.pdf_gen.generate(pdf_data, filename="conversacion_resumen.pdf", persist=persist)
             
             return {
                 "success": True,
-                "message": f"PDF generado exitosamente: {pdf_path}",
-                "pdf_path": pdf_path
+                "message": f"PDF generado exitosamente: {pdf if persist else 'en memoria'}",
+                "pdf_path": pdf if persist else None,
+                "pdf_bytes": None if persist else pdf.getvalue()
             }
             
         except Exception as e:
@@ -74,36 +136,72 @@ class ConversationPDFGenerator:
             return {
                 "success": False,
                 "message": error_msg,
-                "pdf_path": None
+                "pdf_path": None,
+                "pdf_bytes": None
             }
     
-    def _format_conversation(self, chat_history):
-        """Convierte el historial de chat a texto legible."""
-        formatted = []
-        
-        if not chat_history:
-            return ""
-        
-        for item in chat_history:
+    def observe_turn(self, session_id, chat_history):
+        """
+        Registra el historial tras un turno del chat. Cada pocos turnos el resumen
+        de la sesión se actualiza en segundo plano con los mensajes nuevos.
+        """
+        self.summaries.observe(session_id, self._normalize_history(chat_history))
+
+    @staticmethod
+    def _content_text(content):
+        """
+        Texto plano de un mensaje. El Chatbot de Gradio devuelve el contenido de
+        los mensajes anteriores como lista de bloques {'text', 'type'}, mientras
+        que el último turno llega como string: sin unificarlos el mismo historial
+        tendría dos representaciones distintas.
+        """
+        if isinstance(content, list):
+            return "".join(ConversationPDFGenerator._content_text(block) for block in content)
+        if isinstance(content, dict):
+            return str(content.get("text", ""))
+        return "" if content is None else str(content)
+
+    @staticmethod
+    def _normalize_history(chat_history):
+        """Historial como lista de dicts {'role', 'content'} con el contenido en texto plano ('role' None si el formato es desconocido)."""
+        text = ConversationPDFGenerator._content_text
+        messages = []
+        for item in chat_history or []:
             # Si es un dict con role/content
             if isinstance(item, dict) and 'role' in item and 'content' in item:
-                role = "Usuario" if item['role'] == 'user' else "Asistente"
-                formatted.append(f"{role}: {item['content']}")
+                messages.append({'role': item['role'], 'content': text(item['content'])})
             # Si es una tupla/lista (user, assistant)
             elif isinstance(item, (list, tuple)) and len(item) == 2:
                 user_msg, assistant_msg = item
-                formatted.append(f"Usuario: {user_msg}")
-                formatted.append(f"Asistente: {assistant_msg}")
+                messages.append({'role': 'user', 'content': text(user_msg)})
+                messages.append({'role': 'assistant', 'content': text(assistant_msg)})
             else:
                 # Formato desconocido, convertir a string
-                formatted.append(f"Mensaje: {str(item)}")
-        
+                messages.append({'role': None, 'content': str(item)})
+        return messages
+
+    def _format_conversation(self, chat_history):
+        """Convierte el historial de chat a texto legible."""
+        formatted = []
+        for message in self._normalize_history(chat_history):
+            if message['role'] is None:
+                formatted.append(f"Mensaje: {message['content']}")
+            else:
+                role = "Usuario" if message['role'] == 'user' else "Asistente"
+                formatted.append(f"{role}: {message['content']}")
         return "\n\n".join(formatted)
-    
-    def _analyze_conversation(self, conversation_text):
-        """Usa el LLM para analizar la conversación y extraer información clave."""
-        
-        prompt = f"""Eres un asistente experto en análisis de conversaciones técnicas sobre programación.
+
+    @staticmethod
+    def _request_analysis(prompt):
+        """
+        Raises:
+            json.JSONDecodeError | pydantic.ValidationError
+        """
+        # Salida restringida al schema; el JSON mal formado se repara localmente
+        return invoke_structured(ConversationAnalysis, prompt).model_dump()
+
+    def _analysis_prompt(self, conversation_text):
+        return f"""Eres un asistente experto en análisis de conversaciones técnicas sobre programación.
 
 CONVERSACIÓN A ANALIZAR:
 {conversation_text}
@@ -111,82 +209,128 @@ CONVERSACIÓN A ANALIZAR:
 INSTRUCCIONES:
 Analiza la conversación y genera un resumen estructurado en formato JSON con los siguientes campos:
 
-1. "resumen_general": Un párrafo conciso (2-3 frases) sobre el tema principal de la conversación
-2. "temas_discutidos": Lista de los temas principales discutidos (máximo 5)
-3. "codigo_compartido": Lista de fragmentos de código mencionados o discutidos (si los hay). Cada elemento debe tener "descripcion" y "codigo"
-4. "mejoras_sugeridas": Lista de mejoras o recomendaciones que se mencionaron
-5. "buenas_practicas": Lista de buenas prácticas de programación discutidas o aplicables
-6. "conclusiones": Conclusión final de la conversación (1-2 frases)
+{ANALYSIS_FIELDS}"""
 
-FORMATO DE SALIDA (JSON):
+    def _analyze_conversation(self, messages):
+        """Usa el LLM para analizar la conversación y extraer información clave."""
+        try:
+            return self._analyze_messages(messages)
+        except (json.JSONDecodeError, ValidationError) as e:
+            print(f"⚠️ Error parseando JSON del análisis: {e}")
+            # Fallback: estructura básica
+            return dict(FALLBACK_ANALYSIS)
+
+    def _analyze_messages(self, messages):
+        """
+        Análisis de `messages` en una sola llamada o, si no caben en una ventana
+        de `window_tokens`, resumiendo cada ventana en paralelo y uniendo los
+        resultados. Lanza los errores de parseo si no se pudo resumir nada.
+        """
+        windows = split_windows(messages, self.window_tokens)
+        if len(windows) <= 1:
+            return self._request_analysis(self._analysis_prompt(self._format_conversation(messages)))
+
+        print(f"🧩 Conversación larga: resumiendo {len(windows)} partes en paralelo...")
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            results = list(executor.map(self._analyze_window, windows))
+        partials = [analysis for analysis in results if not isinstance(analysis, Exception)]
+        if not partials:
+            raise results[0]
+        if len(partials) < len(results):
+            print(f"⚠️ {len(results) - len(partials)} de {len(results)} partes no se pudieron resumir")
+        return self._reduce(partials)
+
+    def _analyze_window(self, window):
+        """Análisis de una ventana; el error se devuelve para no perder las demás."""
+        try:
+            return self._request_analysis(self._analysis_prompt(self._format_conversation(window)))
+        except (json.JSONDecodeError, ValidationError) as e:
+            return e
+
+    def _reduce(self, partials):
+        """
+        Une análisis parciales en orden cronológico: las listas se deduplican
+        localmente (ver `merge_analyses`) y el LLM reescribe el resumen general y
+        las conclusiones a partir de los parciales. Si esa llamada falla se
+        conservan los textos concatenados.
+        """
+        merged = merge_analyses(partials)
+        summaries = [f"{p.get('resumen_general', '')} Conclusión: {p.get('conclusiones', '')}" for p in partials]
+        try:
+            merged.update(self._combine_summaries(summaries))
+        except (json.JSONDecodeError, ValidationError) as e:
+            print(f"⚠️ Error combinando los resúmenes parciales: {e}")
+        return merged
+
+    def _combine_summaries(self, summaries):
+        """
+        Resumen general y conclusiones de toda la conversación a partir de los
+        resúmenes parciales. Si no caben en una ventana se combinan por grupos
+        en paralelo y se repite con los resultados.
+        """
+        # Cada ventana admite al menos 4 resúmenes, así cada nivel reduce su número
+        summaries = [truncate_to_tokens(text, self.window_tokens // 4) for text in summaries]
+        groups = split_windows([{"role": None, "content": text} for text in summaries], self.window_tokens)
+        if len(groups) > 1:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                combined = list(executor.map(
+                    lambda group: self._combine_summaries([m["content"] for m in group]), groups))
+            return self._combine_summaries(
+                [f"{c['resumen_general']} Conclusión: {c['conclusiones']}" for c in combined])
+
+        partial_text = "\n".join(f"{i}. {text}" for i, text in enumerate(summaries, 1))
+        prompt = f"""Eres un asistente experto en análisis de conversaciones técnicas sobre programación.
+
+RESÚMENES PARCIALES DE UNA CONVERSACIÓN (en orden cronológico):
+{partial_text}
+
+INSTRUCCIONES:
+Combina los resúmenes parciales en un único resumen de toda la conversación.
 Devuelve SOLO un JSON válido con esta estructura exacta:
 {{
-  "resumen_general": "Texto del resumen...",
-  "temas_discutidos": ["Tema 1", "Tema 2", ...],
-  "codigo_compartido": [
-    {{"descripcion": "Función de ejemplo", "codigo": "def ejemplo():\\n    pass"}},
-    ...
-  ],
-  "mejoras_sugeridas": ["Mejora 1", "Mejora 2", ...],
-  "buenas_practicas": ["Práctica 1", "Práctica 2", ...],
-  "conclusiones": "Texto de conclusión..."
+  "resumen_general": "Un párrafo conciso (2-3 frases) sobre el tema principal de la conversación",
+  "conclusiones": "Conclusión final de la conversación (1-2 frases)"
 }}
-
-IMPORTANTE: Si alguna sección no aplica (por ejemplo, no se compartió código), usa una lista vacía [] o string vacío "".
 Devuelve SOLO el JSON, sin texto adicional antes o después."""
+        # Schema de solo dos campos: ni el LLM genera ni se validan las listas del análisis
+        return invoke_structured(SummaryCombination, prompt).model_dump()
 
-        response = self.llm.invoke(prompt)
-        content = response.content.strip()
-        
-        # Extraer JSON (reusar lógica similar a agent.py)
-        json_content = self._extract_json(content)
-        
+    def _update_analysis(self, previous, messages):
+        """
+        Actualiza el resumen `previous` (o lo crea si es None) con los mensajes
+        nuevos. Lanza los errores de parseo para que no se dé por resumido un
+        tramo que falló.
+        """
+        if previous is None:
+            return self._analyze_messages(messages)
+        conversation_text = self._format_conversation(messages)
+        if count_tokens(conversation_text) > self.window_tokens:
+            # Tramo demasiado largo para un solo prompt: se resume aparte y se une al anterior
+            return self._reduce([previous, self._analyze_messages(messages)])
+        prompt = f"""Eres un asistente experto en análisis de conversaciones técnicas sobre programación.
+
+RESUMEN ACTUAL DE LA CONVERSACIÓN (JSON):
+{json.dumps(previous, ensure_ascii=False)}
+
+NUEVOS MENSAJES:
+{conversation_text}
+
+INSTRUCCIONES:
+Actualiza el resumen incorporando los nuevos mensajes. Conserva lo que siga siendo válido del resumen
+actual, añade los temas, código, mejoras y buenas prácticas nuevos sin repetir los existentes, y reescribe
+"resumen_general" y "conclusiones" para que cubran toda la conversación.
+Devuelve el resumen completo actualizado en formato JSON con los siguientes campos:
+
+{ANALYSIS_FIELDS}"""
+        return self._request_analysis(prompt)
+
+    def _session_analysis(self, session_id, chat_history):
+        """Resumen incremental de la sesión, con el fallback básico si el LLM falla."""
         try:
-            analysis = json.loads(json_content)
-            return analysis
-        except json.JSONDecodeError as e:
+            return self.summaries.summarize(session_id, self._normalize_history(chat_history))
+        except (json.JSONDecodeError, ValidationError) as e:
             print(f"⚠️ Error parseando JSON del análisis: {e}")
-            # Fallback: estructura básica
-            return {
-                "resumen_general": "Conversación sobre programación y buenas prácticas.",
-                "temas_discutidos": ["Programación", "Buenas prácticas"],
-                "codigo_compartido": [],
-                "mejoras_sugeridas": [],
-                "buenas_practicas": [],
-                "conclusiones": "Conversación técnica completada."
-            }
-    
-    def _extract_json(self, text):
-        """Extrae el primer objeto JSON bien balanceado del texto."""
-        start = text.find('{')
-        if start == -1:
-            return '{}'
-        
-        depth = 0
-        in_string = False
-        escape = False
-        
-        for i in range(start, len(text)):
-            ch = text[i]
-            
-            if ch == '"' and not escape:
-                in_string = not in_string
-            
-            if ch == '\\' and not escape:
-                escape = True
-                continue
-            else:
-                escape = False
-            
-            if not in_string:
-                if ch == '{':
-                    depth += 1
-                elif ch == '}':
-                    depth -= 1
-                    if depth == 0:
-                        return text[start:i+1]
-        
-        return text[start:] if depth > 0 else '{}'
+            return dict(FALLBACK_ANALYSIS)
     
     def _create_pdf_structure(self, analysis):
         """Crea la estructura de datos para el PDFGenerator."""
@@ -0,0 +1,208 @@
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from .cache import LRUCache, make_key
+from .prompt_builder import count_tokens
+
+# Turnos (pregunta + respuesta) que se acumulan antes de actualizar el resumen en segundo plano
+DEFAULT_SUMMARY_BATCH_TURNS = int(os.environ.get("SUMMARY_BATCH_TURNS", "3"))
+# Sesiones con resumen en memoria y segundos de inactividad antes de olvidarlas
+DEFAULT_SUMMARY_SESSIONS = int(os.environ.get("SUMMARY_SESSIONS", "256"))
+DEFAULT_SUMMARY_TTL = int(os.environ.get("SUMMARY_TTL", "86400"))
+# Hilos para las actualizaciones en segundo plano: no ocupan la cola de trabajos
+# de los PDFs que pide el usuario
+DEFAULT_SUMMARY_WORKERS = int(os.environ.get("SUMMARY_WORKERS", "1"))
+# Temas que se conservan al unir resúmenes parciales (los más repetidos)
+MAX_MERGED_TOPICS = 8
+
+
+def _split_message(message, max_tokens):
+    """Parte por líneas un mensaje que no cabe en una ventana (p. ej. mucho código pegado)."""
+    content = str(message["content"])
+    if count_tokens(content) <= max_tokens:
+        return [message]
+    pieces, lines, used = [], [], 0
+    for line in content.split("\n"):
+        # Una línea enorme (código minificado) se corta por caracteres: nunca hay más tokens que caracteres
+        for part in [line[i:i + max_tokens] for i in range(0, max(len(line), 1), max_tokens)]:
+            tokens = count_tokens(part) + 1
+            if lines and used + tokens > max_tokens:
+                pieces.append("\n".join(lines))
+                lines, used = [], 0
+            lines.append(part)
+            used += tokens
+    pieces.append("\n".join(lines))
+    return [{**message, "content": piece} for piece in pieces]
+
+
+def split_windows(messages, max_tokens):
+    """
+    Reparte los mensajes en ventanas consecutivas de como mucho `max_tokens`
+    (estimados localmente). Los mensajes que no caben solos se parten, así que
+    no se pierde nada aunque la conversación tenga mucho código.
+
+    Returns:
+        list: Listas de mensajes {'role', 'content'}, en orden.
+    """
+    windows, current, used = [], [], 0
+    for message in messages:
+        for piece in _split_message(message, max_tokens):
+            tokens = count_tokens(str(piece["content"]))
+            if current and used + tokens > max_tokens:
+                windows.append(current)
+                current, used = [], 0
+            current.append(piece)
+            used += tokens
+    if current:
+        windows.append(current)
+    return windows
+
+
+def _normalized(text):
+    return " ".join(str(text).split()).casefold()
+
+
+def _dedupe(items, key):
+    seen, unique = set(), []
+    for item in items:
+        item_key = key(item)
+        if item_key and item_key not in seen:
+            seen.add(item_key)
+            unique.append(item)
+    return unique
+
+
+def merge_analyses(analyses):
+    """
+    Une análisis parciales (dicts de ConversationAnalysis, en orden cronológico)
+    sin llamar al LLM: los temas se ordenan por las veces que aparecen y se
+    quedan los MAX_MERGED_TOPICS primeros, el código se deduplica ignorando
+    espacios y las listas de mejoras y prácticas se deduplican sin distinguir
+    mayúsculas. Los textos se concatenan; quien llama puede reescribirlos.
+    """
+    topics, labels = Counter(), {}
+    for analysis in analyses:
+        for topic in analysis.get("temas_discutidos", []):
+            key = _normalized(topic)
+            if key:
+                topics[key] += 1
+                labels.setdefault(key, topic)
+    first_seen = list(labels)
+    ranked = sorted(topics, key=lambda key: (-topics[key], first_seen.index(key)))
+
+    def collect(field):
+        return [item for analysis in analyses for item in analysis.get(field, [])]
+
+    return {
+        "resumen_general": " ".join(a["resumen_general"] for a in analyses if a.get("resumen_general")),
+        "temas_discutidos": [labels[key] for key in ranked[:MAX_MERGED_TOPICS]],
+        "codigo_compartido": _dedupe(collect("codigo_compartido"),
+                                     lambda item: " ".join(str(item.get("codigo", "")).split())),
+        "mejoras_sugeridas": _dedupe(collect("mejoras_sugeridas"), _normalized),
+        "buenas_practicas": _dedupe(collect("buenas_practicas"), _normalized),
+        "conclusiones": next((a["conclusiones"] for a in reversed(analyses) if a.get("conclusiones")), ""),
+    }
+
+
+def _prefix_key(messages):
+    return make_key(*(f"{m['role']}:{m['content']}" for m in messages))
+
+
+class _SessionSummary:
+    def __init__(self):
+        self.analysis = None  # Resumen de los `covered` primeros mensajes
+        self.covered = 0
+        self.prefix = _prefix_key([])
+        self.lock = threading.Lock()
+        self.scheduled = False
+        self.latest = []  # Último historial observado
+
+
+class ConversationSummaries:
+    """
+    Resumen incremental de cada sesión de chat. Tras cada turno `observe` decide
+    si toca actualizarlo y, cada `batch_turns` turnos, lo hace en segundo plano
+    (en un pool propio de `workers` hilos) con solo los mensajes nuevos. Al pedir el PDF, `summarize` solo
+    tiene que resumir lo que quede pendiente, así que su coste no crece con la
+    longitud de la conversación.
+
+    `update(previous, messages)` recibe el resumen anterior (o None) y los
+    mensajes nuevos, y devuelve el resumen actualizado.
+    """
+
+    def __init__(self, update, batch_turns=DEFAULT_SUMMARY_BATCH_TURNS,
+                 max_sessions=DEFAULT_SUMMARY_SESSIONS, ttl=DEFAULT_SUMMARY_TTL, workers=DEFAULT_SUMMARY_WORKERS):
+        self.update = update
+        self.batch_turns = batch_turns
+        self._sessions = LRUCache(maxsize=max_sessions, ttl=ttl)
+        self._lock = threading.Lock()
+        # Los hilos se crean con el primer `submit`
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="summary")
+
+    def _session(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = _SessionSummary()
+                self._sessions.set(session_id, session)
+            return session
+
+    def observe(self, session_id, messages):
+        """
+        Llamar tras cada turno con el historial completo. Encola la actualización
+        en segundo plano cuando hay `batch_turns` turnos sin resumir.
+        """
+        if not session_id:
+            return
+        session = self._session(session_id)
+        session.latest = list(messages)
+        # Tras limpiar el chat el historial es más corto que lo resumido: todo está pendiente
+        pending = len(messages) - session.covered if len(messages) >= session.covered else len(messages)
+        if session.scheduled or pending < 2 * self.batch_turns:
+            return
+        session.scheduled = True
+        self._executor.submit(self._background_update, session)
+
+    def _background_update(self, session):
+        try:
+            with session.lock:
+                # El historial más reciente en el momento de ejecutarse, no el de cuando se encoló
+                self._catch_up(session, session.latest)
+        except Exception as e:
+            # Se reintenta en el siguiente lote o al pedir el PDF
+            print(f"⚠️ No se pudo actualizar el resumen de la conversación: {e}")
+        finally:
+            session.scheduled = False
+
+    def _catch_up(self, session, messages):
+        """Incorpora al resumen los mensajes que aún no cubre (con `session.lock` tomado)."""
+        if len(messages) < session.covered or _prefix_key(messages[:session.covered]) != session.prefix:
+            # El historial cambió (p. ej. se limpió el chat): se empieza de cero
+            session.analysis, session.covered, session.prefix = None, 0, _prefix_key([])
+        delta = messages[session.covered:]
+        if not delta:
+            return session.analysis
+        print(f"🧾 Actualizando resumen con {len(delta)} mensajes nuevos "
+              f"({session.covered} ya resumidos)")
+        session.analysis = self.update(session.analysis, delta)
+        session.covered = len(messages)
+        session.prefix = _prefix_key(messages)
+        return session.analysis
+
+    def summarize(self, session_id, messages):
+        """
+        Resumen al día de toda la conversación. Espera a la actualización en curso,
+        si la hay, y resume solo los mensajes posteriores.
+        """
+        session = self._session(session_id)
+        session.latest = list(messages)
+        with session.lock:
+            try:
+                return self._catch_up(session, session.latest)
+            except Exception as e:
+                if session.analysis is None:
+                    raise
+                # Mejor un resumen al que le faltan los últimos mensajes que ninguno
+                print(f"⚠️ No se pudo actualizar el resumen, se usa el anterior: {e}")
+                return session.analysis
@@ -0,0 +1,82 @@
+import os
+import json
+import hashlib
+from .cache import LRUCache, SQLiteCache, TieredCache, make_key
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DocumentationCache:
+    """
+    Caché de documentación generada. La clave es el hash de la estructura
+    analizada más la versión (hash) de las mejores prácticas usadas en el prompt;
+    el valor es el JSON de secciones y la ruta del PDF renderizado.
+
+    El PDF solo se reutiliza si el archivo sigue existiendo con el mismo
+    contenido; si no, se devuelve el JSON para volver a renderizar sin pasar
+    por el LLM.
+    """
+
+    def __init__(self, max_size=256, db_path=None):
+        disk = SQLiteCache(db_path, table="documentation") if db_path else None
+        self._store = TieredCache(LRUCache(maxsize=max_size), disk)
+
+    @staticmethod
+    def key(structure, best_practices):
+        """`structure` es el ModuleInfo devuelto por CodeAnalyzer."""
+        structure_hash = make_key(json.dumps(structure.to_dict(), sort_keys=True))
+        # to_dict() no incluye los cuerpos: los hashes de código detectan ediciones internas
+        source_hashes = [symbol.source_hash for symbol in structure.symbols()]
+        structure_hash = make_key(structure_hash, json.dumps(source_hashes))
+        best_practices_version = make_key(best_practices)
+        return make_key(structure_hash, best_practices_version)
+
+    def get(self, key):
+        """
+        Returns:
+            dict | None: {"data": ..., "pdf_path": ruta o None si hay que re-renderizar}
+        """
+        entry = self._store.get(key)
+        if entry is None:
+            return None
+        pdf_path = entry.get("pdf_path")
+        try:
+            if not pdf_path or _file_sha256(pdf_path) != entry.get("pdf_sha256"):
+                pdf_path = None
+        except OSError:
+            pdf_path = None
+        return {"data": entry["data"], "pdf_path": pdf_path}
+
+    def set(self, key, data, pdf_path):
+        self._store.set(key, {
+            "data": data,
+            "pdf_path": pdf_path,
+            "pdf_sha256": _file_sha256(pdf_path) if pdf_path and os.path.exists(pdf_path) else None
+        })
+
+    # Partes reutilizables de un documento (secciones de cada símbolo e introducción),
+    # para regenerar solo lo que cambió entre versiones del mismo código.
+
+    @staticmethod
+    def symbol_key(symbol, best_practices):
+        return make_key("symbol", symbol.qualname, symbol.source_hash, make_key(best_practices))
+
+    @staticmethod
+    def overview_key(structure, best_practices):
+        names = [symbol.qualname for symbol in structure.symbols()]
+        return make_key("overview", json.dumps(names), json.dumps(structure.imports), make_key(best_practices))
+
+    def get_part(self, key):
+        return self._store.get(key)
+
+    def set_part(self, key, value):
+        self._store.set(key, value)
+
+    def clear(self):
+        self._store.clear()
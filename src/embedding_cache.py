@@ -0,0 +1,101 @@
+import os
+import inspect
+import threading
+from langchain_core.embeddings import Embeddings
+from .cache import LRUCache, SQLiteCache, TieredCache, make_key, normalize_text
+
+# Tamaño de la capa en memoria y ruta opcional de la capa SQLite
+DEFAULT_MEMORY_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", "4096"))
+DEFAULT_DB_PATH = os.environ.get("EMBEDDING_CACHE_DB")
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+class EmbeddingCache:
+    """
+    Caché de embeddings direccionada por contenido: la clave es (modelo, texto
+    normalizado). Tiene una capa LRU acotada en memoria y una capa opcional en
+    SQLite para reutilizar vectores entre procesos.
+    """
+
+    def __init__(self, memory_size=DEFAULT_MEMORY_SIZE, db_path=DEFAULT_DB_PATH):
+        disk = SQLiteCache(db_path, table="embeddings") if db_path else None
+        self._store = TieredCache(LRUCache(maxsize=memory_size), disk)
+
+    @staticmethod
+    def key(model, text):
+        return make_key(model, normalize_text(text))
+
+    def get_many(self, model, texts):
+        """Devuelve una lista alineada con `texts` con el vector cacheado o None."""
+        return [self._store.get(self.key(model, text)) for text in texts]
+
+    def set_many(self, model, texts, vectors):
+        for text, vector in zip(texts, vectors):
+            self._store.set(self.key(model, text), list(vector))
+
+    def clear(self):
+        self._store.clear()
+
+    def stats(self):
+        return self._store.stats()
+
+
+def get_embedding_cache():
+    """Caché de embeddings compartida por todas las instancias del proceso."""
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_lock:
+            if _shared_cache is None:
+                _shared_cache = EmbeddingCache()
+    return _shared_cache
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Envuelve un modelo de embeddings para que documentos y consultas pasen por
+    la caché: solo los textos que no están cacheados llegan al backend, y en
+    una única llamada por lote.
+    """
+
+    def __init__(self, embeddings, model, cache=None):
+        self.embeddings = embeddings
+        self.model = model
+        self.cache = cache or get_embedding_cache()
+
+    def _embed_with_cache(self, texts, namespace, embed_fn):
+        # Documentos y consultas usan task types distintos en Gemini, así que no
+        # comparten vectores: el namespace forma parte del identificador del modelo.
+        model_key = f"{self.model}:{namespace}"
+        vectors = self.cache.get_many(model_key, texts)
+        missing = {}
+        for i, (text, vector) in enumerate(zip(texts, vectors)):
+            if vector is None:
+                missing.setdefault(normalize_text(text), []).append(i)
+
+        if missing:
+            # Un único texto representativo por clave normalizada
+            pending = [texts[positions[0]] for positions in missing.values()]
+            new_vectors = embed_fn(pending)
+            self.cache.set_many(model_key, pending, new_vectors)
+            for positions, vector in zip(missing.values(), new_vectors):
+                for i in positions:
+                    vectors[i] = list(vector)
+        return vectors
+
+    def embed_documents(self, texts):
+        return self._embed_with_cache(list(texts), "document", self.embeddings.embed_documents)
+
+    def embed_query(self, text):
+        return self._embed_with_cache([text], "query", lambda pending: [self.embeddings.embed_query(pending[0])])[0]
+
+    def embed_queries(self, texts):
+        """Embeddings de varias consultas en una única llamada por lote al backend."""
+        def embed_fn(pending):
+            # GoogleGenerativeAIEmbeddings permite elegir el task type en el lote;
+            # otros backends se consultan de uno en uno.
+            if "task_type" in inspect.signature(self.embeddings.embed_documents).parameters:
+                return self.embeddings.embed_documents(pending, task_type="RETRIEVAL_QUERY")
+            return [self.embeddings.embed_query(text) for text in pending]
+        return self._embed_with_cache(list(texts), "query", embed_fn)
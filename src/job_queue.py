@@ -0,0 +1,153 @@
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Etapas del pipeline que se notifican como progreso
+STAGES = ("analysis", "retrieval", "generation", "render")
+
+DEFAULT_JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+DEFAULT_JOB_RETENTION = int(os.environ.get("JOB_RETENTION", "3600"))
+
+
+class JobCancelled(BaseException):
+    """
+    Se lanza dentro de un trabajo cuando se cancela. Hereda de BaseException
+    (como asyncio.CancelledError) para atravesar los `except Exception` con los
+    que el pipeline convierte los errores en resultados.
+    """
+
+
+class Job:
+    """Estado de un trabajo en segundo plano. Solo lo modifica el hilo que lo ejecuta."""
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.status = "pending"  # pending | running | done | failed | cancelled
+        self.stage = None
+        self.events = []  # (segundos desde la creación, etapa, detalle)
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._future = None
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    def report(self, stage, detail=None):
+        """
+        Callback de progreso que recibe la tarea (`progress`). Si se pidió cancelar
+        el trabajo lanza JobCancelled: la cancelación ocurre entre etapas.
+        """
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+        self.stage = stage
+        self.events.append((round(time.time() - self.created_at, 2), stage, detail))
+
+    def snapshot(self):
+        """Copia del estado para la API o la interfaz."""
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "stage": self.stage,
+            "events": list(self.events),
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """
+    Cola local de trabajos con un pool acotado de hilos. Cada trabajo recibe un
+    ID, notifica su progreso por etapas, se puede cancelar y su resultado se
+    conserva `retention` segundos después de terminar.
+    """
+
+    def __init__(self, max_workers=DEFAULT_JOB_WORKERS, retention=DEFAULT_JOB_RETENTION):
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, kind="job", **kwargs):
+        """
+        Encola `fn(*args, progress=job.report, **kwargs)` y devuelve el Job sin esperar.
+        """
+        self._prune()
+        job = Job(kind)
+        with self._lock:
+            self._jobs[job.id] = job
+        job._future = self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    @staticmethod
+    def _run(job, fn, args, kwargs):
+        if job._cancel.is_set():
+            job.status, job.finished_at = "cancelled", time.time()
+            return
+        job.status = "running"
+        try:
+            job.result = fn(*args, progress=job.report, **kwargs)
+            job.status = "done"
+        except JobCancelled:
+            job.status = "cancelled"
+            print(f"🛑 Trabajo {job.id} cancelado")
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {str(e)}"
+            job.status = "failed"
+            print(f"❌ Trabajo {job.id} falló: {job.error}")
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id):
+        """Snapshot del trabajo, o None si no existe o ya caducó."""
+        job = self.get(job_id)
+        return job.snapshot() if job else None
+
+    def cancel(self, job_id):
+        """
+        Pide cancelar un trabajo: si aún no empezó se descarta y, si está en curso,
+        se detiene en la siguiente etapa.
+
+        Returns:
+            bool: False si el trabajo no existe o ya había terminado.
+        """
+        job = self.get(job_id)
+        if job is None or job.done:
+            return False
+        job._cancel.set()
+        if job._future.cancel():
+            job.status, job.finished_at = "cancelled", time.time()
+        return True
+
+    def wait(self, job_id, timeout=None):
+        """Espera a que termine el trabajo y devuelve su snapshot."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        try:
+            job._future.result(timeout=timeout)
+        except Exception:
+            pass  # cancelado antes de empezar o tiempo agotado: el estado ya lo refleja
+        return job.snapshot()
+
+    def _prune(self):
+        """Olvida los trabajos terminados hace más de `retention` segundos."""
+        limit = time.time() - self.retention
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items()
+                           if job.finished_at and job.finished_at < limit]:
+                del self._jobs[job_id]
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,238 @@
+import re
+import json
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+def extract_json(text):
+    """
+    Aísla el primer objeto JSON del texto (quitando bloques ```json```).
+    Si el objeto no se cierra, devuelve desde la primera llave hasta el final
+    para que `loads_lenient` pueda completarlo.
+    """
+    fenced = _FENCE.search(text)
+    if fenced and "{" in fenced.group(1):
+        text = fenced.group(1)
+    start = text.find("{")
+    if start == -1:
+        return ""
+    depth = 0
+    in_string = False
+    escape = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return text[start:]
+
+
+def repair_json(text):
+    """
+    Corrige localmente los fallos habituales del JSON generado por un LLM:
+    saltos de línea y tabuladores sin escapar dentro de strings, comas finales,
+    literales de Python (True/False/None) y objetos o strings sin cerrar
+    (respuesta cortada por el límite de tokens).
+    """
+    out = []
+    stack = []
+    in_string = False
+    escape = False
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            elif ch == "\n":
+                ch = "\\n"
+            elif ch == "\r":
+                ch = "\\r"
+            elif ch == "\t":
+                ch = "\\t"
+            out.append(ch)
+        elif ch == '"':
+            in_string = True
+            out.append(ch)
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            out.append(ch)
+        elif ch in "}]":
+            _strip_trailing_comma(out)
+            if stack:
+                out.append(stack.pop())
+            if not stack:
+                break
+        else:
+            literal = next((word for word in _LITERALS if text.startswith(word, i)), None)
+            if literal and not (out and (out[-1].isalnum() or out[-1] == "_")):
+                out.append(_LITERALS[literal])
+                i += len(literal)
+                continue
+            out.append(ch)
+        i += 1
+
+    # Respuesta truncada: cerrar el string abierto y descartar la clave o valor a medias
+    if in_string:
+        if escape:
+            out.pop()
+        out.append('"')
+    if stack and stack[-1] == "}":
+        _drop_incomplete_member(out)
+    for closer in reversed(stack):
+        _strip_trailing_comma(out)
+        out.append(closer)
+    return "".join(out)
+
+
+def _strip_trailing_comma(out):
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def _drop_incomplete_member(out):
+    """Elimina un `"clave":` sin valor o una clave suelta al final de un objeto truncado."""
+    text = "".join(out).rstrip()
+    match = re.search(r'([{,])\s*"(?:[^"\\]|\\.)*"\s*:?\s*$', text)
+    if match:
+        # Se conserva la llave de apertura; una coma previa sobra
+        text = text[:match.start()] + ("{" if match.group(1) == "{" else "")
+    out[:] = list(text)
+
+
+def loads_lenient(text):
+    """
+    `json.loads` tolerante: extrae el objeto de la respuesta y, si no es JSON
+    válido, lo repara localmente antes de volver a intentarlo.
+
+    Raises:
+        json.JSONDecodeError: Si ni siquiera la versión reparada es válida.
+    """
+    candidate = extract_json(text.strip()) or text.strip()
+    try:
+        return json.loads(candidate)
+    except json.JSONDecodeError:
+        return json.loads(repair_json(candidate))
+
+
+class StreamingJSONParser:
+    """
+    Parser incremental para una respuesta JSON que llega en fragmentos.
+
+    `feed` devuelve eventos `(clave, valor)` en cuanto se completan: los valores
+    escalares del objeto raíz (p. ej. "title") y cada elemento del array
+    `array_key` (p. ej. cada sección) al cerrarse su llave, sin esperar al
+    resto de la respuesta. `close` recupera con el parser tolerante lo que no
+    llegó a cerrarse si el stream se cortó.
+    """
+
+    def __init__(self, array_key="sections"):
+        self.array_key = array_key
+        self.text = ""
+        self.items = 0
+        self.keys = set()
+        self._pos = 0
+        self._depth = 0
+        self._started = False
+        self._done = False
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_key = None
+        self._key = None
+        self._expect_value = False
+        self._in_array = False
+        self._item_start = None
+
+    def feed(self, chunk):
+        self.text += chunk
+        events = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            if self._done:
+                break
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._root_string(json.loads(text[self._string_start:i + 1]), events)
+            elif not self._started:
+                # Texto previo al objeto (p. ej. "```json")
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch == ":" and self._depth == 1:
+                self._key = self._last_key
+                self._expect_value = True
+            elif ch == "," and self._depth == 1:
+                self._key = None
+                self._expect_value = False
+            elif ch in "{[":
+                if self._depth == 1:
+                    self._expect_value = False
+                self._depth += 1
+                if ch == "[" and self._depth == 2 and self._key == self.array_key:
+                    self._in_array = True
+                elif ch == "{" and self._in_array and self._depth == 3:
+                    self._item_start = i
+            elif ch in "}]":
+                if ch == "}" and self._in_array and self._depth == 3 and self._item_start is not None:
+                    events.append((self.array_key, loads_lenient(text[self._item_start:i + 1])))
+                    self.items += 1
+                    self._item_start = None
+                elif ch == "]" and self._in_array and self._depth == 2:
+                    self._in_array = False
+                self._depth -= 1
+                self._done = self._depth == 0
+        self._pos = len(text)
+        return events
+
+    def _root_string(self, value, events):
+        if self._expect_value:
+            events.append((self._key, value))
+            self.keys.add(self._key)
+            self._expect_value = False
+        else:
+            self._last_key = value
+
+    def close(self):
+        """Eventos pendientes tras el final del stream (respuesta truncada o sin cerrar)."""
+        try:
+            data = loads_lenient(self.text)
+        except json.JSONDecodeError:
+            return []
+        if not isinstance(data, dict):
+            return []
+        events = [(key, value) for key, value in data.items()
+                  if key != self.array_key and key not in self.keys and isinstance(value, (str, int, float, bool))]
+        items = data.get(self.array_key)
+        if isinstance(items, list):
+            events.extend((self.array_key, item) for item in items[self.items:])
+        return events
@@ -0,0 +1,622 @@
+import re
+import posixpath
+from bisect import bisect_right
+from .cache import make_key
+from .code_analyzer import ArgInfo, FunctionInfo, ClassInfo, ModuleInfo, register_parser
+
+# Analizadores locales para lenguajes con llaves (JavaScript/TypeScript, Go, Java).
+# No construyen un AST completo: enmascaran comentarios, literales de texto y
+# regex de JavaScript, recorren las llaves con una pila de ámbitos y clasifican
+# con expresiones regulares el encabezado que precede a cada bloque. Producen los mismos
+# registros (ModuleInfo, ClassInfo, FunctionInfo) que el análisis de Python.
+
+_C_COMMENTS = r"//[^\n]*|/\*.*?\*/"
+_QUOTED = r"\"(?:\\.|[^\"\\\n])*\"|'(?:\\.|[^'\\\n])*'"
+_BACKTICK = r"`(?:\\.|[^`\\])*`"
+_BACKTICK_RAW = r"`[^`]*`"
+# Literal de expresión regular de JavaScript: una `/` que sigue a un operador o
+# signo de puntuación (nunca a un valor, que sería una división). El operador
+# forma parte de la coincidencia y se conserva al enmascarar, como las comillas
+_JS_REGEX = r"[=(,:\[!&|?{};+\-*%~^]\s*/(?![/*])(?:\\.|\[(?:\\.|[^\]\\\n])*\]|[^/\\\n\[])+/[A-Za-z]*"
+
+_BLANK = re.compile(r"[^\n]")
+_DOC_LINE = re.compile(r"^\s*(?://+|\*+)?\s?")
+
+
+def _balanced(text, start):
+    """Índice del paréntesis que cierra el abierto en `start`, o None."""
+    depth = 0
+    for i in range(start, len(text)):
+        if text[i] == "(":
+            depth += 1
+        elif text[i] == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+    return None
+
+
+def _split_top_level(text, angles=False):
+    """Separa por comas que no estén dentro de (), [], {} (ni <> si `angles`)."""
+    openers, closers = ("([{<", ")]}>") if angles else ("([{", ")]}")
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(text):
+        if ch in openers:
+            depth += 1
+        elif ch in closers and not (ch == ">" and text[i - 1:i] == "="):
+            depth = max(0, depth - 1)
+        elif ch == "," and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _top_level_assignment(text):
+    """Posición del `=` de un valor por defecto (fuera de llaves/corchetes y sin ser `=>` ni `==`)."""
+    depth = 0
+    for i, ch in enumerate(text):
+        if ch in "([{":
+            depth += 1
+        elif ch in ")]}":
+            depth -= 1
+        elif ch == "=" and depth == 0 and text[i + 1:i + 2] not in ("=", ">") and text[i - 1:i] not in ("=", "!", "<", ">"):
+            return i
+    return None
+
+
+def _clean_doc(text):
+    if text.startswith("/*"):
+        text = text[3:] if text.startswith("/**") else text[2:]
+        text = text[:-2] if text.endswith("*/") else text
+    lines = [_DOC_LINE.sub("", line).rstrip() for line in text.splitlines()]
+    return "\n".join(lines).strip() or None
+
+
+def _collapse(text):
+    return " ".join(text.split())
+
+
+class _Source:
+    """Código original, versiones enmascaradas y comentarios con sus posiciones."""
+
+    def __init__(self, code, token_pattern):
+        self.code = code
+        self.lines = code.splitlines()
+        self.comments = []
+        self.masked = token_pattern.sub(self._mask, code)
+        # Solo sin comentarios: para mostrar declaraciones con sus valores por defecto
+        self.readable = token_pattern.sub(self._strip_comment, code)
+        self.comment_ends = [end for _, end, _ in self.comments]
+        self.line_starts = [0] + [m.end() for m in re.finditer(r"\n", code)]
+        # Métodos declarados fuera de su tipo (receptores de Go), a resolver al final
+        self.pending_methods = []
+
+    def _mask(self, match):
+        text = match.group(0)
+        if text.startswith(("//", "/*")):
+            self.comments.append((match.start(), match.end(), text))
+            return _BLANK.sub(" ", text)
+        return text[0] + _BLANK.sub(" ", text[1:-1]) + text[-1]
+
+    @staticmethod
+    def _strip_comment(match):
+        text = match.group(0)
+        return _BLANK.sub(" ", text) if text.startswith(("//", "/*")) else text
+
+    def line(self, offset):
+        return bisect_right(self.line_starts, offset)
+
+    def source_hash(self, lineno, end_lineno):
+        segment = "\n".join(line.rstrip() for line in self.lines[lineno - 1:end_lineno])
+        return make_key(segment)[:16]
+
+    def doc_before(self, offset, doc_prefix):
+        """Comentario de documentación inmediatamente anterior a `offset`."""
+        index = bisect_right(self.comment_ends, offset) - 1
+        if index < 0 or self.masked[self.comments[index][1]:offset].strip():
+            return None
+        start, end, text = self.comments[index]
+        if not text.startswith(doc_prefix):
+            return None
+        if text.startswith("//"):
+            # Bloque de comentarios de línea consecutivos (convención de Go)
+            block = [text]
+            while index > 0:
+                prev_start, prev_end, prev_text = self.comments[index - 1]
+                gap = self.masked[prev_end:self.comments[index][0]]
+                if not prev_text.startswith("//") or gap.strip() or gap.count("\n") != 1:
+                    break
+                block.insert(0, prev_text)
+                index -= 1
+            text = "\n".join(block)
+        return _clean_doc(text)
+
+
+class BraceLanguageParser:
+    """
+    Base de los analizadores por llaves. Las subclases definen `token_pattern`,
+    `doc_prefix`, `_imports(code)` y `_classify(header, scope, body)`, que
+    devuelve (tipo, campos) con tipo "class" o "function", o None.
+    """
+
+    token_pattern = None
+    doc_prefix = "/**"
+    # Líneas máximas de un encabezado (firmas multilínea, anotaciones)
+    max_header_lines = 12
+
+    def parse(self, code):
+        try:
+            source = _Source(code, self.token_pattern)
+            module = ModuleInfo(docstring=self._module_doc(source))
+            module.imports = self._imports(code)
+            self._scan(source, module)
+            self._finish(source, module)
+            return module
+        except Exception as e:
+            return ModuleInfo(error=f"Error al analizar: {str(e)[:100]}")
+
+    def _module_doc(self, source):
+        match = re.search(r"^[ \t]*package\b", source.masked, re.MULTILINE)
+        return source.doc_before(match.start(), self.doc_prefix) if match else None
+
+    def _imports(self, code):
+        return []
+
+    def _classify(self, header, scope, body):
+        return None
+
+    def _finish(self, source, module):
+        """Ajustes tras recorrer todo el archivo (p. ej. métodos de Go)."""
+
+    def _on_close(self, source, record, fields, body_start, body_end):
+        """Se llama al cerrar el bloque de un símbolo."""
+
+    def _scan(self, source, module):
+        masked = source.masked
+        # Cada entrada: (registro, campos, inicio del cuerpo) o None para bloques anónimos
+        stack = []
+        statement_start = 0
+        parens = 0
+        for match in re.finditer(r"[{}();]", masked):
+            ch, i = match.group(), match.start()
+            if ch == "(":
+                parens += 1
+            elif ch == ")":
+                parens = max(0, parens - 1)
+            elif ch == "{":
+                entry = None
+                if parens == 0:
+                    entry = self._declare(source, module, stack, statement_start, i, body=True)
+                    statement_start = i + 1
+                stack.append(entry)
+            elif ch == "}":
+                entry = stack.pop() if stack else None
+                if entry is not None:
+                    self._close(source, entry, i)
+                if parens == 0:
+                    statement_start = i + 1
+            elif parens == 0:
+                self._declare(source, module, stack, statement_start, i, body=False)
+                statement_start = i + 1
+        # Bloques sin cerrar (código incompleto): terminan al final del archivo
+        for entry in reversed(stack):
+            if entry is not None:
+                self._close(source, entry, len(masked))
+
+    def _close(self, source, entry, offset):
+        record, fields, body_start = entry
+        record.end_lineno = source.line(offset)
+        record.source_hash = source.source_hash(record.lineno, record.end_lineno)
+        self._on_close(source, record, fields, body_start, offset)
+
+    def _declare(self, source, module, stack, start, end, body):
+        """Clasifica el encabezado `masked[start:end]` y registra el símbolo si lo es."""
+        scope = stack[-1][0] if stack and stack[-1] is not None else None
+        if stack and scope is None:
+            return None  # Dentro de un bloque anónimo (if, callback, inicializador...)
+        header_text = source.masked[start:end]
+        if not header_text.strip():
+            return None
+        offsets = [start] + [start + m.end() for m in re.finditer(r"\n", header_text)]
+        # Del encabezado más largo al más corto: sin punto y coma (JS, Go) el
+        # encabezado puede arrastrar sentencias de líneas anteriores
+        for offset in offsets[-self.max_header_lines:]:
+            header = source.masked[offset:end].strip()
+            if not header:
+                continue
+            classified = self._classify(header, scope, body)
+            if classified:
+                header_start = offset + len(source.masked[offset:end]) - len(source.masked[offset:end].lstrip())
+                return self._build(source, module, stack, scope, classified, header_start, end, body)
+        return None
+
+    def _build(self, source, module, stack, scope, classified, start, end, body):
+        kind, fields = classified
+        lineno = source.line(start)
+        docstring = source.doc_before(start, self.doc_prefix)
+        name = fields["name"]
+        owner = fields.get("receiver")
+        if owner:
+            qualname = f"{owner}.{name}"
+        elif scope is None:
+            qualname = name
+        else:
+            qualname = scope.qualname + (".<locals>." if isinstance(scope, FunctionInfo) else ".") + name
+
+        if kind == "class":
+            record = ClassInfo(name, qualname, lineno, lineno, bases=fields.get("bases", ()),
+                               decorators=fields.get("decorators", ()), docstring=docstring)
+        else:
+            record = FunctionInfo(
+                name, qualname, lineno, lineno,
+                is_async=fields.get("is_async", False),
+                is_method=isinstance(scope, ClassInfo) or bool(owner),
+                decorators=fields.get("decorators", ()),
+                args=fields.get("args", ()),
+                returns=fields.get("returns") or None,
+                docstring=docstring,
+                declaration=_collapse(source.readable[start:end])
+            )
+
+        if owner:
+            # Métodos con receptor (Go): se asignan a su tipo al terminar el archivo
+            source.pending_methods.append((owner, record))
+        elif scope is None:
+            (module.classes if kind == "class" else module.functions).append(record)
+        elif isinstance(scope, ClassInfo):
+            (scope.classes if kind == "class" else scope.methods).append(record)
+        else:
+            scope.nested.append(record)
+
+        if not body:
+            record.source_hash = source.source_hash(lineno, lineno)
+            return None
+        return record, fields, end + 1
+
+
+class JavaScriptParser(BraceLanguageParser):
+    token_pattern = re.compile("|".join([_C_COMMENTS, _QUOTED, _BACKTICK, _JS_REGEX]), re.DOTALL)
+
+    _MODIFIERS = r"(?:(?:public|private|protected|static|readonly|abstract|override|declare|async|get|set)\s+)*"
+    _FUNCTION = re.compile(
+        r"(?:export\s+)?(?:default\s+)?(?P<async>async\s+)?function\s*\*?\s*(?P<name>[\w$]+)\s*(?:<[^()]*>\s*)?\("
+    )
+    _FUNCTION_EXPR = re.compile(
+        r"(?:export\s+)?(?:const|let|var)\s+(?P<name>[\w$]+)\s*(?::[^=]+)?=\s*(?P<async>async\s+)?"
+        r"(?:function\s*\*?\s*[\w$]*\s*(?:<[^()]*>\s*)?\(|(?:<[^()]*>\s*)?\()"
+    )
+    _ARROW_PARAM = re.compile(
+        r"(?:export\s+)?(?:const|let|var)\s+(?P<name>[\w$]+)\s*=\s*(?P<async>async\s+)?(?P<param>[\w$]+)\s*=>"
+        r"(?P<expr>[^\n]*)"
+    )
+    _METHOD = re.compile(
+        r"(?P<modifiers>" + _MODIFIERS + r")\*?\s*(?P<name>#?[\w$]+)\s*\??\s*(?:<[^()]*>\s*)?\("
+    )
+    _FIELD_ARROW = re.compile(
+        r"(?P<modifiers>" + _MODIFIERS + r")(?P<name>#?[\w$]+)\s*(?::[^=]+)?=\s*(?P<async>async\s+)?\("
+    )
+    _CLASS = re.compile(
+        r"(?:(?:export|default|declare|abstract)\s+)*(?P<kind>class|interface)\s+(?P<name>[\w$]+)"
+        r"(?:\s*<.*?>)?(?:\s+extends\s+(?P<extends>.+?))?(?:\s+implements\s+(?P<implements>.+?))?",
+        re.DOTALL
+    )
+    # Cola tras los parámetros: tipo de retorno opcional y flecha (o cuerpo de expresión)
+    _TAIL = re.compile(r"\s*(?::\s*(?P<returns>.+?))?\s*", re.DOTALL)
+    _ARROW_TAIL = re.compile(r"\s*(?::\s*(?P<returns>.+?))?\s*=>(?P<expr>[^\n]*)", re.DOTALL)
+    _KEYWORDS = {"if", "for", "while", "switch", "catch", "function", "return", "with", "else", "do", "try",
+                 "new", "typeof", "await", "super", "import", "yield"}
+    _IMPORT = re.compile(
+        r"""^\s*(?:import|export)\b[^'"`;]*?\bfrom\s*['"]([^'"]+)['"]|^\s*import\s*['"]([^'"]+)['"]"""
+        r"""|\brequire\(\s*['"]([^'"]+)['"]\s*\)""",
+        re.MULTILINE
+    )
+
+    def _imports(self, code):
+        imports = []
+        for match in self._IMPORT.finditer(code):
+            name = next(group for group in match.groups() if group)
+            if name not in imports:
+                imports.append(name)
+        return imports
+
+    def _args(self, params):
+        args = []
+        for param in _split_top_level(params, angles=True):
+            param = re.sub(r"^(?:(?:public|private|protected|readonly|override)\s+)+", "", param)
+            kind = "vararg" if param.startswith("...") else "positional"
+            param = param[3:] if kind == "vararg" else param
+            default = None
+            index = _top_level_assignment(param)
+            if index is not None:
+                default = param[index + 1:].strip()
+                param = param[:index].strip()
+            if param.startswith(("{", "[")):
+                # Desestructuración: el nombre es el patrón completo
+                closer = "}" if param.startswith("{") else "]"
+                name, annotation = param[:param.rfind(closer) + 1], param[param.rfind(closer) + 1:].lstrip(" :?")
+            else:
+                name, _, annotation = param.partition(":")
+            args.append(ArgInfo(name.strip().rstrip("?"), kind, annotation.strip() or None, default))
+        return args
+
+    def _callable(self, pattern, header, tail=None):
+        """Encabezado `prefijo(parámetros)cola` -> (match del prefijo, parámetros, match de la cola)."""
+        match = pattern.match(header)
+        if not match:
+            return None
+        close = _balanced(header, match.end() - 1)
+        if close is None:
+            return None
+        tail_match = (tail or self._TAIL).fullmatch(header[close + 1:])
+        if not tail_match:
+            return None
+        return match, header[match.end():close], tail_match
+
+    def _function_fields(self, match, params, tail_match, is_async=None):
+        groups = match.groupdict()
+        if is_async is None:
+            is_async = bool(groups.get("async")) or "async" in (groups.get("modifiers") or "").split()
+        return {
+            "name": groups["name"],
+            "is_async": is_async,
+            "args": self._args(params),
+            "returns": (tail_match.groupdict().get("returns") or "").strip()
+        }
+
+    def _classify(self, header, scope, body):
+        if isinstance(scope, ClassInfo):
+            parsed = self._callable(self._FIELD_ARROW, header, self._ARROW_TAIL)
+            if parsed and (body or parsed[2].group("expr").strip()):
+                return "function", self._function_fields(*parsed)
+            parsed = self._callable(self._METHOD, header)
+            if parsed and parsed[0].group("name") not in self._KEYWORDS:
+                # Sin cuerpo solo cuentan las firmas (interfaces, métodos abstractos)
+                return "function", self._function_fields(*parsed)
+            return None
+
+        if body:
+            match = self._CLASS.fullmatch(header)
+            if match:
+                bases = [match.group("extends"), match.group("implements")]
+                bases = [base for part in bases if part for base in _split_top_level(part, angles=True)]
+                return "class", {"name": match.group("name"), "bases": bases}
+            parsed = self._callable(self._FUNCTION, header)
+            if parsed:
+                return "function", self._function_fields(*parsed)
+        parsed = self._callable(self._FUNCTION_EXPR, header, self._ARROW_TAIL)
+        if parsed and (body or parsed[2].group("expr").strip()):
+            return "function", self._function_fields(*parsed)
+        if body:
+            parsed = self._callable(self._FUNCTION_EXPR, header)
+            if parsed and "function" in parsed[0].group(0):
+                return "function", self._function_fields(*parsed)
+        match = self._ARROW_PARAM.fullmatch(header)
+        if match and (body or match.group("expr").strip()):
+            return "function", {"name": match.group("name"), "is_async": bool(match.group("async")),
+                                "args": [ArgInfo(match.group("param"))]}
+        return None
+
+
+class TypeScriptParser(JavaScriptParser):
+    """Igual que JavaScript: los tipos se recogen como anotaciones y tipo de retorno."""
+
+
+class GoParser(BraceLanguageParser):
+    token_pattern = re.compile("|".join([_C_COMMENTS, _QUOTED, _BACKTICK_RAW]), re.DOTALL)
+    doc_prefix = "//"
+
+    _FUNCTION = re.compile(
+        r"func\s*(?:\(\s*(?:\w+\s+)?\*?\s*(?P<receiver>\w+)(?:\[[^\]]*\])?\s*\)\s*)?(?P<name>\w+)\s*(?:\[[^\]]*\]\s*)?\("
+    )
+    _TYPE = re.compile(r"type\s+(?P<name>\w+)(?:\[[^\]]*\])?\s+(?P<kind>struct|interface)")
+    _INTERFACE_METHOD = re.compile(r"^[ \t]*(?P<name>\w+)\s*\(", re.MULTILINE)
+    _IMPORT = re.compile(r'^import\s+(?:[\w.]+\s+)?"([^"]+)"', re.MULTILINE)
+    _IMPORT_BLOCK = re.compile(r"^import\s*\((.*?)^\)", re.MULTILINE | re.DOTALL)
+
+    def _imports(self, code):
+        imports = self._IMPORT.findall(code)
+        for block in self._IMPORT_BLOCK.findall(code):
+            imports.extend(re.findall(r'"([^"]+)"', block))
+        return imports
+
+    @staticmethod
+    def _args(params):
+        items = [item.split(None, 1) for item in _split_top_level(params)]
+        named = any(len(item) == 2 for item in items)
+        args, pending = [], []
+        for item in items:
+            if named and len(item) == 1:
+                # `a, b int`: los nombres sin tipo toman el del siguiente parámetro
+                pending.append(item[0])
+                continue
+            name, annotation = (item[0], item[1]) if named else ("_", item[0])
+            kind = "vararg" if annotation.startswith("...") else "positional"
+            for pending_name in pending:
+                args.append(ArgInfo(pending_name, kind, annotation.lstrip(".")))
+            pending = []
+            args.append(ArgInfo(name, kind, annotation.lstrip(".")))
+        args.extend(ArgInfo(name) for name in pending)
+        return args
+
+    def _classify(self, header, scope, body):
+        if scope is not None or not body:
+            return None
+        match = self._TYPE.fullmatch(header)
+        if match:
+            return "class", {"name": match.group("name"), "kind": match.group("kind")}
+        match = self._FUNCTION.match(header)
+        if match:
+            close = _balanced(header, match.end() - 1)
+            if close is not None:
+                return "function", {
+                    "name": match.group("name"),
+                    "receiver": match.group("receiver"),
+                    "args": self._args(header[match.end():close]),
+                    "returns": header[close + 1:].strip()
+                }
+        return None
+
+    def _on_close(self, source, record, fields, body_start, body_end):
+        if fields.get("kind") != "interface":
+            return
+        # Métodos declarados en la interfaz (una firma por línea, sin cuerpo)
+        body = source.masked[body_start:body_end]
+        for match in self._INTERFACE_METHOD.finditer(body):
+            close = _balanced(body, match.end() - 1)
+            if close is None:
+                continue
+            start = body_start + match.start("name")
+            lineno = source.line(start)
+            record.methods.append(FunctionInfo(
+                match.group("name"), f"{record.qualname}.{match.group('name')}", lineno, lineno,
+                is_method=True,
+                args=self._args(body[match.end():close]),
+                returns=body[close + 1:].split("\n", 1)[0].strip() or None,
+                docstring=source.doc_before(start, self.doc_prefix),
+                source_hash=source.source_hash(lineno, lineno),
+                declaration=_collapse(source.lines[lineno - 1])
+            ))
+
+    def _finish(self, source, module):
+        types = {cls.name: cls for cls in module.classes}
+        for owner, record in source.pending_methods:
+            if owner in types:
+                types[owner].methods.append(record)
+            else:
+                # El tipo está en otro archivo del paquete
+                module.functions.append(record)
+        for cls in module.classes:
+            cls.methods.sort(key=lambda method: method.lineno)
+
+
+class JavaParser(BraceLanguageParser):
+    token_pattern = re.compile("|".join([_C_COMMENTS, _QUOTED, r'"""(?:\\.|[^\\])*?"""']), re.DOTALL)
+
+    _ANNOTATIONS = r"(?P<annotations>(?:@[\w.]+(?:\s*\([^)]*\))?\s*)*)"
+    _CLASS = re.compile(
+        _ANNOTATIONS + r"(?:(?:public|protected|private|abstract|static|final|sealed|non-sealed|strictfp)\s+)*"
+        r"(?P<kind>class|interface|enum|record|@interface)\s+(?P<name>\w+)(?:\s*<.*?>)?(?:\s*\(.*?\))?"
+        r"(?:\s+extends\s+(?P<extends>.+?))?(?:\s+implements\s+(?P<implements>.+?))?(?:\s+permits\s+.+?)?",
+        re.DOTALL
+    )
+    _METHOD = re.compile(
+        _ANNOTATIONS + r"(?P<modifiers>(?:(?:public|protected|private|abstract|static|final|synchronized|native"
+        r"|default|strictfp)\s+)*)(?:<[^()]*?>\s*)?(?:(?P<returns>[\w.$]+(?:\s*<.*?>)?(?:\s*\[\s*\])*)\s+)?"
+        r"(?P<name>\w+)\s*\(",
+        re.DOTALL
+    )
+    _TAIL = re.compile(r"\s*(?:throws\s+[\w.,\s]+?)?\s*(?:default\s+.+)?", re.DOTALL)
+    _KEYWORDS = {"if", "for", "while", "switch", "catch", "synchronized", "return", "new", "else", "try", "do",
+                 "throw", "assert"}
+    _IMPORT = re.compile(r"^\s*import\s+(?:static\s+)?([\w.]+(?:\.\*)?)\s*;", re.MULTILINE)
+
+    def _imports(self, code):
+        return self._IMPORT.findall(code)
+
+    @staticmethod
+    def _annotations(text):
+        return [_collapse(annotation.lstrip("@")) for annotation in re.findall(r"@[\w.]+(?:\s*\([^)]*\))?", text or "")]
+
+    @staticmethod
+    def _args(params):
+        args = []
+        for param in _split_top_level(params, angles=True):
+            param = re.sub(r"@[\w.]+(?:\s*\([^)]*\))?\s*|\bfinal\s+", "", param).strip()
+            annotation, _, name = param.rpartition(" ")
+            kind = "vararg" if "..." in annotation else "positional"
+            args.append(ArgInfo(name, kind, annotation.replace("...", "").strip() or None))
+        return args
+
+    def _classify(self, header, scope, body):
+        if body:
+            match = self._CLASS.fullmatch(header)
+            if match:
+                bases = [match.group("extends"), match.group("implements")]
+                return "class", {
+                    "name": match.group("name"),
+                    "bases": [base for part in bases if part for base in _split_top_level(part, angles=True)],
+                    "decorators": self._annotations(match.group("annotations"))
+                }
+        if not isinstance(scope, ClassInfo):
+            return None
+        match = self._METHOD.match(header)
+        if not match or match.group("name") in self._KEYWORDS or match.group("returns") in self._KEYWORDS:
+            return None
+        if not body and not match.group("returns"):
+            return None  # Constante de enum con argumentos, no un método abstracto
+        close = _balanced(header, match.end() - 1)
+        if close is None or not self._TAIL.fullmatch(header[close + 1:]):
+            return None
+        return "function", {
+            "name": match.group("name"),
+            "args": self._args(header[match.end():close]),
+            "returns": _collapse(match.group("returns") or ""),
+            "decorators": self._annotations(match.group("annotations"))
+        }
+
+
+# Resolución de imports a módulos internos (ver `build_import_graph`). Reciben la
+# ruta del archivo que importa y {ruta relativa a la raíz con "/": nombre del módulo}.
+
+_JS_EXTENSIONS = (".ts", ".tsx", ".mts", ".cts", ".js", ".jsx", ".mjs", ".cjs")
+
+
+def resolve_js_import(importer, imported, paths):
+    """
+    JavaScript/TypeScript: solo las rutas relativas (`./util`, `../lib/x.js`) son
+    internas. Como Node y TypeScript, se prueba la ruta tal cual, con cada
+    extensión, como directorio con `index` y `./x.js` también como `x.ts`.
+    """
+    if not imported.startswith("."):
+        return []  # Paquete de npm
+    base = posixpath.normpath(posixpath.join(posixpath.dirname(importer), imported))
+    stem, extension = posixpath.splitext(base)
+    candidates = [base] + [base + ext for ext in _JS_EXTENSIONS] + [f"{base}/index{ext}" for ext in _JS_EXTENSIONS]
+    if extension in _JS_EXTENSIONS:
+        candidates += [stem + ext for ext in _JS_EXTENSIONS]
+    return next(([paths[path]] for path in candidates if path in paths), [])
+
+
+def resolve_go_import(importer, imported, paths):
+    """
+    Go: un import es la ruta de un paquete, es decir, de un directorio. Sin leer
+    `go.mod`, un directorio del árbol es el paquete importado si la ruta del
+    import termina en él (`ejemplo.com/app/util` -> `util/*.go`).
+    """
+    targets = []
+    for path, name in paths.items():
+        directory = posixpath.dirname(path)
+        if path.endswith(".go") and directory and (imported == directory or imported.endswith("/" + directory)):
+            targets.append(name)
+    return targets
+
+
+def resolve_java_import(importer, imported, paths):
+    """
+    Java: `pkg.Clase`, `pkg.*` o un import estático (`pkg.Clase.miembro`). La ruta
+    del archivo sin extensión debe terminar en el nombre importado, de modo que
+    raíces como `src/main/java/` no importan.
+    """
+    def ends_with(dotted, suffix):
+        return dotted == suffix or dotted.endswith("." + suffix)
+
+    classes = {posixpath.splitext(path)[0].replace("/", "."): name
+               for path, name in paths.items() if path.endswith(".java")}
+    if imported.endswith(".*"):
+        package = imported[:-2]
+        return [name for dotted, name in classes.items()
+                if ends_with(dotted.rpartition(".")[0], package) or ends_with(dotted, package)]
+    for candidate in (imported, imported.rpartition(".")[0]):
+        found = [name for dotted, name in classes.items() if candidate and ends_with(dotted, candidate)]
+        if found:
+            return found
+    return []
+
+
+register_parser(JavaScriptParser().parse, ["javascript", "js", "jsx"], extensions=(".js", ".jsx", ".mjs", ".cjs"),
+                resolver=resolve_js_import)
+register_parser(TypeScriptParser().parse, ["typescript", "ts", "tsx"], extensions=(".ts", ".tsx", ".mts", ".cts"),
+                resolver=resolve_js_import)
+register_parser(GoParser().parse, ["go", "golang"], extensions=(".go",), resolver=resolve_go_import)
+register_parser(JavaParser().parse, ["java"], extensions=(".java",), resolver=resolve_java_import)
@@ -0,0 +1,117 @@
+import os
+import threading
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps
+from langchain_core.messages import HumanMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+from .cache import LRUCache, SQLiteCache, TieredCache, make_key
+
+
+def _serialize(generations):
+    serialized = []
+    for gen in generations:
+        if isinstance(gen, ChatGeneration):
+            serialized.append({"text": gen.text, "message": message_to_dict(gen.message)})
+        else:
+            serialized.append({"text": gen.text})
+    return serialized
+
+
+def _deserialize(serialized):
+    generations = []
+    for item in serialized:
+        if "message" in item:
+            generations.append(ChatGeneration(message=messages_from_dict([item["message"]])[0]))
+        else:
+            generations.append(Generation(text=item["text"]))
+    return generations
+
+
+class LLMResponseCache(BaseCache):
+    """
+    Caché de respuestas del LLM compatible con LangChain (`cache=` del modelo).
+
+    La clave combina el `llm_string` de LangChain, que incluye modelo, temperatura
+    y max_output_tokens, con el hash del prompt serializado. Tiene una capa LRU
+    en memoria y una capa SQLite opcional, ambas con límite de tamaño y TTL.
+    Los contadores de aciertos/fallos se exportan a Langfuse como metadata de la
+    observación en curso.
+    """
+
+    def __init__(self, max_size=512, db_path=None, max_entries=10000, ttl=None):
+        disk = SQLiteCache(db_path, table="llm_responses", max_entries=max_entries, ttl=ttl) if db_path else None
+        self._store = TieredCache(LRUCache(maxsize=max_size, ttl=ttl), disk)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(prompt, llm_string):
+        return make_key(llm_string, prompt.strip())
+
+    def _record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        try:
+            from opentelemetry import trace
+            from langfuse import get_client
+            # Langfuse se apoya en OpenTelemetry: solo se anota si hay una observación activa
+            if trace.get_current_span().is_recording():
+                get_client().update_current_span(metadata={"llm_cache": self.stats()})
+        except Exception:
+            pass  # Langfuse es opcional: sin traza activa no hay nada que actualizar
+
+    def lookup(self, prompt, llm_string):
+        cached = self._store.get(self._key(prompt, llm_string))
+        self._record(cached is not None)
+        return _deserialize(cached) if cached is not None else None
+
+    def update(self, prompt, llm_string, return_val):
+        self._store.set(self._key(prompt, llm_string), _serialize(return_val))
+
+    def clear(self, **kwargs):
+        self._store.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    def stream(self, llm, prompt, **kwargs):
+        """
+        Equivalente a `llm.stream(prompt, **kwargs)` pasando por la caché: LangChain no
+        consulta la caché al hacer streaming, así que un acierto se emite como un
+        único fragmento y un fallo se guarda al terminar el stream. Los `kwargs`
+        (p. ej. el JSON schema de la respuesta) forman parte de la clave.
+        """
+        llm_string = llm._get_llm_string(**kwargs)
+        cache_prompt = dumps([HumanMessage(content=prompt)])
+        cached = self.lookup(cache_prompt, llm_string)
+        if cached:
+            yield cached[0].message
+            return
+
+        full = None
+        for chunk in llm.stream(prompt, **kwargs):
+            full = chunk if full is None else full + chunk
+            yield chunk
+        if full is not None:
+            self.update(cache_prompt, llm_string, [ChatGeneration(message=full)])
+
+
+def create_llm_cache_from_env():
+    """
+    Crea la caché según variables de entorno, o devuelve None si no se activó:
+    LLM_CACHE ("on" la activa; desactivada por defecto), LLM_CACHE_SIZE, LLM_CACHE_DB,
+    LLM_CACHE_MAX_ENTRIES y LLM_CACHE_TTL (segundos, 1 hora por defecto; 0 sin caducidad).
+    """
+    if os.environ.get("LLM_CACHE", "off").lower() not in ("1", "on", "true", "yes"):
+        return None
+    ttl = float(os.environ.get("LLM_CACHE_TTL", "3600"))
+    return LLMResponseCache(
+        max_size=int(os.environ.get("LLM_CACHE_SIZE", "512")),
+        db_path=os.environ.get("LLM_CACHE_DB"),
+        max_entries=int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "10000")),
+        ttl=ttl or None
+    )
@@ -1,59 +1,161 @@
 from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
-from reportlab.lib.enums import TA_JUSTIFY, TA_LEFT
+from reportlab.platypus import SimpleDocTemplate, Paragraph, XPreformatted
 from reportlab.lib import colors
 from langfuse import observe
+from datetime import datetime
+from functools import lru_cache
+from xml.sax.saxutils import escape
+import contextlib
+import io
+import os
+import tempfile
+import uuid
+
+OUTPUT_DIR = "data"
+
+# Separación entre bloques (antes un Spacer(1, 12) tras cada uno)
+BLOCK_SPACING = 12
+# A partir de este número de líneas un bloque de código se maqueta con
+# XPreformatted, que no recalcula el ajuste de línea palabra a palabra
+LARGE_CODE_LINES = 20
+# Caracteres de Courier 8pt que caben en el ancho útil de una página carta
+CODE_LINE_CHARS = 92
+# Documentos con al menos estas secciones se renderizan por partes en un pool
+# de procesos (ver pdf_parallel); PDF_RENDER_WORKERS limita los procesos
+PARALLEL_MIN_SECTIONS = int(os.environ.get("PDF_PARALLEL_SECTIONS", "1500"))
+RENDER_WORKERS = int(os.environ.get("PDF_RENDER_WORKERS", "0")) or None
+
+
+@lru_cache(maxsize=None)
+def get_styles():
+    """
+    Hoja de estilos compartida, construida una sola vez por proceso. Añade a los
+    estilos de ReportLab variantes "*Block" con la separación entre bloques
+    incluida en `spaceAfter` y el estilo de los bloques de código. Es de solo
+    lectura: la comparten todos los PDFGenerator y todos los hilos.
+    """
+    styles = getSampleStyleSheet()
+    for name in ("Title", "Heading1", "Heading2", "Heading3", "Normal"):
+        base = styles[name]
+        styles.add(ParagraphStyle(f"{name}Block", parent=base, spaceAfter=base.spaceAfter + BLOCK_SPACING))
+    styles.add(ParagraphStyle(
+        "CodeBlock",
+        parent=styles["Code"],
+        backColor=colors.lightgrey,
+        borderColor=colors.black,
+        borderWidth=1,
+        borderPadding=5,
+        fontSize=8,
+        leading=10,
+        fontName="Courier",
+        spaceAfter=BLOCK_SPACING
+    ))
+    # Entradas del índice de los documentos renderizados por partes
+    styles.add(ParagraphStyle("TOCEntry1", parent=styles["Normal"]))
+    return styles
+
+
+_HEADING_STYLES = {1: "Heading1Block", 2: "Heading2Block"}
+
 
 class PDFGenerator:
+    """
+    Genera PDFs a partir del JSON de documentación. `generate` y `begin` no
+    guardan estado del documento en la instancia, así que un mismo generador
+    (el del registro) se puede usar desde varios hilos a la vez; cada PDF se
+    escribe en una ruta única. Para construir un documento sección a sección
+    se usa `begin()`, que devuelve un `StreamingDocument`.
+
+    Con `persist=False` el PDF se maqueta en memoria y se devuelve como un
+    `io.BytesIO`, sin tocar el disco.
+    """
+
     def __init__(self, output_filename="documentacion_tecnica.pdf"):
         self.output_filename = output_filename
-        self.styles = getSampleStyleSheet()
-        self.story = []
-
-    def add_title(self, title):
-        style = self.styles["Title"]
-        self.story.append(Paragraph(title, style))
-        self.story.append(Spacer(1, 12))
-
-    def add_heading(self, text, level=1):
-        if level == 1:
-            style = self.styles["Heading1"]
-        elif level == 2:
-            style = self.styles["Heading2"]
-        else:
-            style = self.styles["Heading3"]
-        self.story.append(Paragraph(text, style))
-        self.story.append(Spacer(1, 12))
-
-    def add_paragraph(self, text):
-        style = self.styles["Normal"]
+        self.styles = get_styles()
+
+    # Constructores de flowables: no guardan estado, así se pueden usar para ir
+    # preparando un documento sección a sección (ver StreamingDocument)
+
+    def title_flowables(self, title):
+        return [Paragraph(title, self.styles["TitleBlock"])]
+
+    def heading_flowables(self, text, level=1):
+        return [Paragraph(text, self.styles[_HEADING_STYLES.get(level, "Heading3Block")])]
+
+    def paragraph_flowables(self, text):
         # Reemplazar saltos de línea con <br/> para ReportLab
-        text = text.replace("\n", "<br/>")
-        self.story.append(Paragraph(text, style))
-        self.story.append(Spacer(1, 12))
-
-    def add_code_block(self, code):
-        style = ParagraphStyle(
-            'Code',
-            parent=self.styles['Code'],
-            backColor=colors.lightgrey,
-            borderColor=colors.black,
-            borderWidth=1,
-            borderPadding=5,
-            fontSize=8,
-            leading=10,
-            fontName='Courier'
-        )
-        # Escapar caracteres especiales si es necesario y formatear
-        code = code.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
-        code = code.replace("\n", "<br/>")
-        self.story.append(Paragraph(code, style))
-        self.story.append(Spacer(1, 12))
+        return [Paragraph(text.replace("\n", "<br/>"), self.styles["NormalBlock"])]
+
+    def code_flowables(self, code):
+        style = self.styles["CodeBlock"]
+        lines = code.split("\n")
+        if len(lines) < LARGE_CODE_LINES:
+            return [Paragraph(escape(code).replace("\n", "<br/>"), style)]
+        # Bloque grande: XPreformatted respeta saltos e indentación sin el ajuste
+        # de línea de Paragraph (decenas de veces más rápido al paginar). Como no
+        # ajusta, las líneas que no caben en la página se parten aquí
+        wrapped = [line[i:i + CODE_LINE_CHARS] for line in lines
+                   for i in range(0, max(len(line), 1), CODE_LINE_CHARS)]
+        return [XPreformatted(escape("\n".join(wrapped)), style)]
+
+    def section_flowables(self, section):
+        """Flowables de una sección {"type", "content", "level"} del JSON de documentación."""
+        section_type = section.get("type", "paragraph")
+        content = section.get("content", "")
+
+        if section_type == "heading":
+            level = section.get("level", 1)
+            return self.heading_flowables(str(content), int(level))
+        elif section_type == "paragraph":
+            return self.paragraph_flowables(str(content))
+        elif section_type == "code":
+            return self.code_flowables(str(content))
+        print(f"⚠️ Tipo de sección desconocido: {section_type}, tratando como párrafo")
+        return self.paragraph_flowables(str(content))
+
+    def begin(self, title=None, filename=None, persist=True):
+        """Empieza un documento que se completa sección a sección (ver StreamingDocument)."""
+        return StreamingDocument(self, title, filename, persist)
+
+    def _unique_path(self, filename=None):
+        """`data/<nombre>_<fecha>_<id>.pdf`: dos trabajos nunca comparten archivo."""
+        stem, ext = os.path.splitext(filename or self.output_filename)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return os.path.join(OUTPUT_DIR, f"{stem}_{stamp}_{uuid.uuid4().hex[:8]}{ext or '.pdf'}")
+
+    def _write(self, story, filename=None, persist=True):
+        return self._save(lambda target: SimpleDocTemplate(target, pagesize=letter).build(story), filename, persist)
+
+    def _save(self, build, filename=None, persist=True):
+        """`build(destino)` maqueta el PDF en una ruta o en un archivo binario."""
+        if not persist:
+            buffer = io.BytesIO()
+            build(buffer)
+            buffer.seek(0)
+            print(f"✅ PDF generado en memoria ({buffer.getbuffer().nbytes // 1024} KB)")
+            return buffer
+
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        output_path = self._unique_path(filename)
+
+        # Se maqueta en un temporal del mismo directorio y se renombra al final:
+        # nadie llega a ver (ni a servir) un PDF a medio escribir
+        fd, tmp_path = tempfile.mkstemp(dir=OUTPUT_DIR, suffix=".pdf.tmp")
+        os.close(fd)
+        try:
+            build(tmp_path)
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            raise
+        print(f"✅ PDF generado: {output_path}")
+        return output_path
 
     @observe(as_type="span")
-    def generate(self, data):
+    def generate(self, data, filename=None, persist=True, parallel=None):
         """
         Genera el PDF basado en un diccionario de datos estructurado.
         data = {
@@ -64,16 +166,22 @@ class PDFGenerator:
                 {"type": "code", "content": "print('Hola')"}
             ]
         }
+
+        `filename` (por defecto `output_filename`) es la base del nombre; la ruta
+        devuelta lleva además fecha e identificador únicos.
+
+        `parallel` fuerza (True) o desactiva (False) el render por partes en un
+        pool de procesos; por defecto se usa a partir de PARALLEL_MIN_SECTIONS
+        secciones. Ese modo añade índice, marcadores y números de página.
+
+        Returns:
+            str | io.BytesIO: Ruta del PDF escrito en `data/` o, con `persist=False`,
+            el PDF en memoria (posicionado al inicio).
         """
         try:
             # Validar que data es un diccionario
             if not isinstance(data, dict):
                 raise TypeError(f"data debe ser un diccionario, recibido: {type(data)}")
-            
-            self.story = [] # Reiniciar historia
-            
-            if "title" in data:
-                self.add_title(str(data["title"]))
 
             sections = data.get("sections", [])
             if not isinstance(sections, list):
@@ -82,30 +190,60 @@ class PDFGenerator:
             for i, section in enumerate(sections):
                 if not isinstance(section, dict):
                     raise TypeError(f"section {i} debe ser un diccionario, recibido: {type(section)}")
-                
-                section_type = section.get("type", "paragraph")
-                content = section.get("content", "")
-                
-                if section_type == "heading":
-                    level = section.get("level", 1)
-                    self.add_heading(str(content), int(level))
-                elif section_type == "paragraph":
-                    self.add_paragraph(str(content))
-                elif section_type == "code":
-                    self.add_code_block(str(content))
-                else:
-                    print(f"⚠️ Tipo de sección desconocido: {section_type}, tratando como párrafo")
-                    self.add_paragraph(str(content))
-            
-            # Crear directorio data/ si no existe
-            import os
-            os.makedirs("data", exist_ok=True)
-            output_path = os.path.join("data", self.output_filename)
-            
-            doc = SimpleDocTemplate(output_path, pagesize=letter)
-            doc.build(self.story)
-            print(f"✅ PDF generado: {output_path}")
-            return output_path
+
+            if parallel is None:
+                # Con un solo núcleo repartir el trabajo solo añade el coste de unir las partes
+                parallel = len(sections) >= PARALLEL_MIN_SECTIONS and (RENDER_WORKERS or os.cpu_count() or 1) > 1
+            if parallel:
+                # Import diferido: pdf_parallel depende de este módulo
+                from .pdf_parallel import render_parallel
+                return self._save(lambda target: render_parallel(self, data, target, RENDER_WORKERS),
+                                  filename, persist)
+
+            # Story local: llamadas concurrentes no comparten flowables
+            story = []
+
+            if "title" in data:
+                story.extend(self.title_flowables(str(data["title"])))
+
+            for section in sections:
+                story.extend(self.section_flowables(section))
+
+            return self._write(story, filename, persist)
+        except Exception as e:
+            error_msg = f"Error generando PDF: {type(e).__name__}: {str(e)}"
+            print(f"❌ {error_msg}")
+            raise Exception(error_msg)
+
+
+class StreamingDocument:
+    """
+    Documento PDF que se construye mientras llega la respuesta del LLM: cada
+    sección se convierte en flowables (el parseo del marcado de ReportLab) en
+    cuanto se recibe, y al terminar solo queda maquetar y escribir el archivo.
+    """
+
+    def __init__(self, generator, title=None, filename=None, persist=True):
+        self.generator = generator
+        self.title = title
+        self.filename = filename
+        self.persist = persist
+        self.sections = []
+        self._flowables = []
+
+    def add_section(self, section):
+        self._flowables.extend(self.generator.section_flowables(section))
+        self.sections.append(section)
+
+    def data(self):
+        """JSON equivalente, para la caché de documentación."""
+        return {"title": self.title or "Documentación del código", "sections": list(self.sections)}
+
+    @observe(as_type="span")
+    def finish(self):
+        try:
+            title = self.generator.title_flowables(str(self.data()["title"]))
+            return self.generator._write(title + self._flowables, self.filename, self.persist)
         except Exception as e:
             error_msg = f"Error generando PDF: {type(e).__name__}: {str(e)}"
             print(f"❌ {error_msg}")
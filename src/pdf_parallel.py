@@ -0,0 +1,146 @@
+import io
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape
+from pypdf import PdfReader, PdfWriter
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, TableStyle
+from .pdf_generator import PDFGenerator
+
+# Partes por proceso: con más partes que procesos el reparto queda equilibrado
+# aunque los capítulos tengan tamaños muy distintos
+PARTS_PER_WORKER = 2
+
+_LEVELS = {"Heading1Block": 1, "Heading2Block": 2}
+
+
+class _HeadingTracker(SimpleDocTemplate):
+    """SimpleDocTemplate que anota la página (1-based) de cada heading de nivel 1 y 2."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.headings = []
+
+    def afterFlowable(self, flowable):
+        level = _LEVELS.get(getattr(getattr(flowable, "style", None), "name", None))
+        if level:
+            self.headings.append((level, flowable.getPlainText(), self.page))
+
+
+def split_at_headings(sections, parts):
+    """
+    Divide las secciones por los headings de nivel 1 y agrupa los capítulos
+    consecutivos en como mucho `parts` partes de tamaño parecido.
+
+    Returns:
+        list: Listas de secciones, en el orden original.
+    """
+    chapters = []
+    for section in sections:
+        if not chapters or (section.get("type") == "heading" and int(section.get("level", 1)) == 1):
+            chapters.append([])
+        chapters[-1].append(section)
+
+    target = len(sections) / max(1, min(parts, len(chapters)))
+    groups, current = [], []
+    for chapter in chapters:
+        if current and len(current) + len(chapter) / 2 > target:
+            groups.append(current)
+            current = []
+        current.extend(chapter)
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _render_part(sections):
+    """Renderiza una parte (en un proceso del pool). Devuelve (bytes del PDF, headings)."""
+    generator = PDFGenerator()
+    story = [flowable for section in sections for flowable in generator.section_flowables(section)]
+    buffer = io.BytesIO()
+    doc = _HeadingTracker(buffer, pagesize=letter)
+    doc.build(story)
+    return buffer.getvalue(), doc.headings
+
+
+def _toc(generator, title, entries):
+    """Portada con el título y el índice de capítulos. `entries`: (nivel, texto, página final)."""
+    styles = generator.styles
+    story = generator.title_flowables(title) + generator.heading_flowables("Índice", 1)
+    # El índice impreso solo lista capítulos; los niveles 2 van en los marcadores
+    rows = [[Paragraph(escape(text), styles["TOCEntry1"]), str(page)] for level, text, page in entries if level == 1]
+    if rows:
+        table = Table(rows, colWidths=[420, 48])
+        table.setStyle(TableStyle([("ALIGN", (1, 0), (1, -1), "RIGHT"), ("VALIGN", (0, 0), (-1, -1), "TOP")]))
+        story.append(table)
+    buffer = io.BytesIO()
+    SimpleDocTemplate(buffer, pagesize=letter).build(story)
+    return PdfReader(buffer)
+
+
+def _page_numbers(total):
+    """PDF de `total` páginas en blanco con solo el pie "Página N de M", para superponer."""
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=letter)
+    width = letter[0]
+    for number in range(1, total + 1):
+        pdf.setFont("Helvetica", 8)
+        pdf.drawCentredString(width / 2, 30, f"Página {number} de {total}")
+        pdf.showPage()
+    pdf.save()
+    return PdfReader(buffer)
+
+
+def render_parallel(generator, data, output, max_workers=None):
+    """
+    Renderiza un documento grande repartiendo sus capítulos (headings de nivel 1)
+    entre un pool de procesos y une las partes con pypdf. Como cada parte se
+    pagina por separado, al unirlas se añaden una página de índice con la
+    paginación final, el árbol de marcadores y la numeración de páginas.
+
+    Args:
+        output: Ruta o archivo binario donde se escribe el PDF completo.
+    """
+    workers = max_workers or os.cpu_count() or 1
+    parts = split_at_headings(data.get("sections", []), workers * PARTS_PER_WORKER)
+    print(f"   ⚡ Renderizando {len(parts)} partes en paralelo ({workers} procesos)...")
+    # `spawn` y no `fork`: el servidor tiene hilos vivos (cola de trabajos,
+    # resúmenes, Langfuse) y un hijo creado con fork hereda sus locks tomados
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        results = list(executor.map(_render_part, parts))
+
+    readers, headings, offset = [], [], 0
+    for pdf_bytes, part_headings in results:
+        reader = PdfReader(io.BytesIO(pdf_bytes))
+        readers.append(reader)
+        headings.extend((level, text, offset + page) for level, text, page in part_headings)
+        offset += len(reader.pages)
+
+    # Las páginas del índice desplazan al resto: se repite hasta que su longitud se estabiliza
+    title = str(data.get("title", "Documentación del código"))
+    toc_pages = 1
+    while True:
+        toc = _toc(generator, title, [(level, text, toc_pages + page) for level, text, page in headings])
+        if len(toc.pages) == toc_pages:
+            break
+        toc_pages = len(toc.pages)
+
+    writer = PdfWriter()
+    for reader in [toc] + readers:
+        for page in reader.pages:
+            writer.add_page(page)
+
+    parent = None
+    for level, text, page in headings:
+        if level == 1 or parent is None:
+            parent = writer.add_outline_item(text, toc_pages + page - 1)
+        else:
+            writer.add_outline_item(text, toc_pages + page - 1, parent=parent)
+
+    overlay = _page_numbers(len(writer.pages))
+    for page, number in zip(writer.pages, overlay.pages):
+        page.merge_page(number)
+
+    writer.write(output)
@@ -0,0 +1,194 @@
+import os
+import re
+from .code_analyzer import ClassInfo
+
+# Presupuestos de tokens por prompt (configurables por entorno)
+DEFAULT_DOC_PROMPT_TOKENS = int(os.environ.get("DOC_PROMPT_TOKENS", "6000"))
+DEFAULT_CHAT_PROMPT_TOKENS = int(os.environ.get("CHAT_PROMPT_TOKENS", "2500"))
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_WORD_PATTERN = re.compile(r"\w{3,}", re.UNICODE)
+
+
+def count_tokens(text):
+    """
+    Estimación local del número de tokens, sin llamar a la API: cada signo de
+    puntuación cuenta como un token y cada palabra como un token por cada 4
+    caracteres. Se queda algo por encima de los tokenizadores BPE habituales,
+    lo que deja margen al presupuesto.
+    """
+    return sum((len(token) + 3) // 4 for token in _TOKEN_PATTERN.findall(text or ""))
+
+
+def truncate_to_tokens(text, max_tokens, marker=" [...]"):
+    """Recorta `text` a `max_tokens` por el final de una palabra."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    budget = max_tokens - count_tokens(marker)
+    used = 0
+    for match in _TOKEN_PATTERN.finditer(text):
+        used += (len(match.group()) + 3) // 4
+        if used > budget:
+            return text[:match.start()].rstrip() + marker
+    return text
+
+
+def _first_paragraph(docstring):
+    return docstring.strip().split("\n\n", 1)[0].replace("\n", " ") if docstring else None
+
+
+def _outline_symbol(symbol, detail, indent=""):
+    """Líneas del esquema de un símbolo. `detail`: 2 completo, 1 sin anidados ni docstrings largos, 0 solo firmas."""
+    lines = [f"{indent}@{decorator}" for decorator in symbol.decorators] if detail else []
+    if isinstance(symbol, ClassInfo):
+        bases = f"({', '.join(symbol.bases)})" if symbol.bases else ""
+        lines.append(f"{indent}class {symbol.name}{bases}")
+        children = symbol.classes + symbol.methods
+    else:
+        lines.append(f"{indent}{symbol.signature()}")
+        children = symbol.nested if detail == 2 else []
+    # Sin docstring no se escribe nada: el "No docstring" repetido solo gasta tokens
+    docstring = symbol.docstring if detail == 2 else _first_paragraph(symbol.docstring) if detail else None
+    if docstring:
+        lines.append(f'{indent}    """{docstring.strip()}"""')
+    for child in sorted(children, key=lambda child: child.lineno):
+        lines.extend(_outline_symbol(child, detail, indent + "    "))
+    return lines
+
+
+def compact_symbols(symbols, max_tokens=None):
+    """
+    Serializa símbolos como un esquema indentado de firmas y docstrings, mucho
+    más compacto que `json.dumps(..., indent=2)`. Si no cabe en `max_tokens`
+    se reduce el detalle y, en último caso, se omiten los últimos símbolos.
+    """
+    text = ""
+    for detail in (2, 1, 0):
+        text = "\n".join(line for symbol in symbols for line in _outline_symbol(symbol, detail))
+        if max_tokens is None or count_tokens(text) <= max_tokens:
+            return text
+    # La nota final de símbolos omitidos también cuenta en el presupuesto
+    note_tokens = count_tokens(f"# ... {len(symbols)} símbolos más omitidos por longitud")
+    lines, used = [], 0
+    for symbol in symbols:
+        block = "\n".join(_outline_symbol(symbol, 0))
+        used += count_tokens(block)
+        if used + note_tokens > max_tokens:
+            lines.append(f"# ... {len(symbols) - len(lines)} símbolos más omitidos por longitud")
+            break
+        lines.append(block)
+    return "\n".join(lines)
+
+
+def compact_structure(structure, max_tokens=None):
+    """Versión compacta de un ModuleInfo para el prompt (ver `compact_symbols`)."""
+    if structure.error:
+        return f"# {structure.error}"
+    if structure.info:
+        return f"# {structure.info}"
+    header = []
+    if structure.docstring:
+        header.append(f'"""{_first_paragraph(structure.docstring)}"""')
+    if structure.imports:
+        header.append(f"imports: {', '.join(structure.imports)}")
+    header = "\n".join(header)
+    if max_tokens is not None:
+        # Los símbolos importan más que la cabecera: como mucho un cuarto del presupuesto
+        header = truncate_to_tokens(header, max_tokens // 4) if max_tokens >= 40 else ""
+    remaining = None if max_tokens is None else max(0, max_tokens - count_tokens(header))
+    body = compact_symbols(structure.symbols(), remaining)
+    return f"{header}\n{body}" if header else body
+
+
+def rank_context(texts, query, max_tokens, max_items=None):
+    """
+    Ordena fragmentos de contexto por relevancia para `query` y los recorta para
+    que quepan en `max_tokens`. La relevancia combina las palabras de la consulta
+    que aparecen en el fragmento con su posición original (el orden del
+    recuperador), y se descartan fragmentos duplicados.
+
+    Returns:
+        list: Fragmentos seleccionados, el último recortado si no cabía entero.
+    """
+    terms = {term.lower() for term in _WORD_PATTERN.findall(query or "")}
+    seen, candidates = set(), []
+    for position, text in enumerate(texts):
+        key = " ".join(text.split())
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        words = {word.lower() for word in _WORD_PATTERN.findall(text)}
+        overlap = len(terms & words) / len(terms) if terms else 0.0
+        candidates.append((overlap - 0.1 * position, text))
+    candidates.sort(key=lambda item: item[0], reverse=True)
+
+    selected, used = [], 0
+    for _, text in candidates[:max_items]:
+        tokens = count_tokens(text)
+        if used + tokens <= max_tokens:
+            selected.append(text)
+            used += tokens
+        elif max_tokens - used >= 50:
+            # Un fragmento parcial solo compensa si queda espacio razonable
+            selected.append(truncate_to_tokens(text, max_tokens - used))
+            break
+        else:
+            break
+    return selected
+
+
+class PromptBuilder:
+    """
+    Ensambla un prompt por bloques con un presupuesto de tokens. Los bloques fijos
+    (instrucciones, formato de salida) se incluyen siempre; los recortables se
+    reparten el presupuesto restante por prioridad (mayor primero) y se truncan
+    si no caben. El prompt conserva el orden en que se añadieron los bloques.
+    """
+
+    def __init__(self, max_tokens):
+        self.max_tokens = max_tokens
+        self._blocks = []
+
+    def add(self, text, title=None, priority=None):
+        """
+        Añade un bloque. `priority` None lo hace fijo; un número lo hace recortable.
+        En un bloque recortable `text` puede ser una función que recibe los tokens
+        disponibles y devuelve el texto ya ajustado (p. ej. `compact_structure`),
+        para reducir detalle en lugar de cortar a mitad.
+        """
+        if text:
+            self._blocks.append({"title": title, "text": text, "priority": priority})
+        return self
+
+    def remaining(self):
+        """Tokens libres tras los bloques fijos (para dimensionar contenido antes de añadirlo)."""
+        return max(0, self.max_tokens - sum(count_tokens(self._render(block)) for block in self._blocks
+                                            if block["priority"] is None))
+
+    @staticmethod
+    def _render(block):
+        return f"{block['title']}:\n{block['text']}" if block["title"] else block["text"]
+
+    def build(self):
+        budget = self.remaining()
+        texts = {}
+        trimmable = [block for block in self._blocks if block["priority"] is not None]
+        for block in sorted(trimmable, key=lambda block: block["priority"], reverse=True):
+            title_tokens = count_tokens(f"{block['title']}:\n") if block["title"] else 0
+            available = budget - title_tokens
+            if available <= 0:
+                continue
+            text = block["text"](available) if callable(block["text"]) else block["text"]
+            text = truncate_to_tokens(text, available)
+            if not text:
+                continue
+            texts[id(block)] = text
+            budget -= title_tokens + count_tokens(text)
+
+        parts = []
+        for block in self._blocks:
+            if block["priority"] is None:
+                parts.append(self._render(block))
+            elif id(block) in texts:
+                parts.append(self._render({**block, "text": texts[id(block)]}))
+        return "\n\n".join(parts)
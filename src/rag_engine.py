@@ -1,18 +1,147 @@
 import os
+import glob
+import json
+import uuid
+import hashlib
+import threading
+from collections import defaultdict
+import numpy as np
 from langchain_community.document_loaders import DirectoryLoader, TextLoader
 from langchain_classic.text_splitter import RecursiveCharacterTextSplitter
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.faiss import dependable_faiss_import
 from dotenv import load_dotenv
 from langfuse import observe
+from .embedding_cache import CachedEmbeddings
+from .cache import LRUCache, make_key, normalize_text
 
 load_dotenv()
 
+MANIFEST_FILENAME = "manifest.json"
+
+
+def _sha256(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
 class RAGEngine:
-    def __init__(self, knowledge_base_path="knowledge_base"):
+    def __init__(self, knowledge_base_path="knowledge_base", index_path=os.path.join("data", "faiss_index"),
+                 embedding_model="models/embedding-001", chunk_size=1000, chunk_overlap=200,
+                 query_cache_size=256, query_cache_ttl=3600):
         self.knowledge_base_path = knowledge_base_path
+        # Directorio donde se persiste el índice FAISS y su manifiesto
+        self.index_path = index_path
+        self.embedding_model = embedding_model
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
         self.vector_store = None
-        self.embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
+        self.manifest = None
+        # Versión del contenido indexado; cambia con cada reconstrucción o actualización
+        self.index_version = None
+        # Caché de resultados de búsqueda por (consulta, k, versión del índice)
+        self._query_cache = LRUCache(maxsize=query_cache_size, ttl=query_cache_ttl)
+        # Los embeddings de documentos y consultas pasan por la caché compartida del proceso
+        self.embeddings = CachedEmbeddings(GoogleGenerativeAIEmbeddings(model=embedding_model), model=embedding_model)
+        self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        # _index_lock protege las lecturas/escrituras del índice FAISS; _build_lock
+        # serializa las reconstrucciones y actualizaciones para que no se pisen.
+        self._index_lock = threading.RLock()
+        self._build_lock = threading.RLock()
+
+    def _settings(self):
+        """Configuración que, si cambia, obliga a reconstruir el índice completo."""
+        return {
+            "embedding_model": self.embedding_model,
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap
+        }
+
+    def _knowledge_base_files(self):
+        """Lista ordenada de los .txt de la base de conocimiento."""
+        pattern = os.path.join(self.knowledge_base_path, "**", "*.txt")
+        return sorted(glob.glob(pattern, recursive=True))
+
+    def _rel_path(self, path):
+        return os.path.relpath(path, self.knowledge_base_path).replace(os.sep, "/")
+
+    def scan_files(self):
+        """Devuelve {ruta relativa: hash del contenido} de la base de conocimiento."""
+        files = {}
+        for path in self._knowledge_base_files():
+            with open(path, "rb") as f:
+                files[self._rel_path(path)] = _sha256(f.read())
+        return files
+
+    def _read_saved_manifest(self):
+        manifest_path = os.path.join(self.index_path, MANIFEST_FILENAME)
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _save_index(self):
+        os.makedirs(self.index_path, exist_ok=True)
+        manifest_path = os.path.join(self.index_path, MANIFEST_FILENAME)
+        # Se borra el manifiesto antes de escribir el índice: si el proceso muere a
+        # mitad de guardado, el siguiente arranque no confiará en un índice a medias.
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        with self._index_lock:
+            self.vector_store.save_local(self.index_path)
+            manifest = json.loads(json.dumps(self.manifest))
+        tmp_path = manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, manifest_path)
+
+    def _set_index(self, vector_store, manifest):
+        """Publica un nuevo índice/manifiesto e invalida los resultados cacheados."""
+        with self._index_lock:
+            self.vector_store = vector_store
+            self.manifest = manifest
+            self.index_version = _sha256(json.dumps(manifest["files"], sort_keys=True))[:16]
+            self._query_cache.clear()
+
+    def _persist(self):
+        try:
+            self._save_index()
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar el índice en disco: {e}")
+
+    def _split_file(self, rel_path):
+        """Carga y trocea un único archivo de la base de conocimiento."""
+        path = os.path.join(self.knowledge_base_path, *rel_path.split("/"))
+        documents = TextLoader(path).load()
+        return self.text_splitter.split_documents(documents)
+
+    @observe(as_type="span")
+    def load_saved_index(self):
+        """
+        Carga el índice persistido si fue construido con la misma configuración.
+        No realiza ninguna llamada de embeddings.
+
+        Returns:
+            bool: True si se cargó el índice guardado.
+        """
+        saved = self._read_saved_manifest()
+        if not saved or saved.get("settings") != self._settings():
+            return False
+        try:
+            vector_store = FAISS.load_local(
+                self.index_path,
+                self.embeddings,
+                allow_dangerous_deserialization=True  # Archivo generado localmente por este motor
+            )
+        except Exception as e:
+            print(f"⚠️ No se pudo cargar el índice guardado: {e}")
+            return False
+        self._set_index(vector_store, saved)
+        print(f"✅ Índice vectorial cargado desde {self.index_path}")
+        return True
 
     @observe(as_type="span")
     def load_and_process_documents(self):
@@ -21,35 +150,185 @@ class RAGEngine:
         documents = loader.load()
         print(f"   - {len(documents)} documentos cargados.")
 
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        texts = text_splitter.split_documents(documents)
+        texts = self.text_splitter.split_documents(documents)
         print(f"   - {len(texts)} fragmentos generados.")
         return texts
 
     @observe(as_type="span")
-    def create_vector_store(self):
-        texts = self.load_and_process_documents()
-        if not texts:
-            print("⚠️ No se encontraron documentos para indexar.")
-            return
+    def create_vector_store(self, force_rebuild=False):
+        with self._build_lock:
+            if not force_rebuild and self.load_saved_index():
+                # El índice guardado sigue siendo válido: solo aplicar los cambios
+                # de archivos desde la última vez que se guardó.
+                self.update_index()
+                return
+
+            file_hashes = self.scan_files()
+            texts = self.load_and_process_documents()
+            if not texts:
+                print("⚠️ No se encontraron documentos para indexar.")
+                return
+
+            print("🧠 Creando índice vectorial (Embeddings)...")
+            files = {rel_path: {"hash": file_hash, "chunks": []} for rel_path, file_hash in file_hashes.items()}
+            ids = []
+            for doc in texts:
+                doc_id = uuid.uuid4().hex
+                ids.append(doc_id)
+                rel_path = self._rel_path(doc.metadata["source"])
+                files.setdefault(rel_path, {"hash": None, "chunks": []})
+                files[rel_path]["chunks"].append([_sha256(doc.page_content), doc_id])
+            vector_store = FAISS.from_documents(texts, self.embeddings, ids=ids)
+            self._set_index(vector_store, {"settings": self._settings(), "files": files})
+            self._persist()
+            print("✅ Base de conocimiento indexada correctamente.")
+
+    @observe(as_type="span")
+    def update_index(self):
+        """
+        Actualiza el índice de forma incremental: detecta archivos añadidos,
+        modificados y eliminados, re-trocea solo esos archivos y genera embeddings
+        únicamente para los fragmentos cuyo texto es nuevo. Los vectores se añaden
+        y eliminan en el propio índice, por lo que las consultas siguen atendiéndose
+        mientras tanto.
+
+        Returns:
+            dict: Archivos añadidos, modificados y eliminados, y fragmentos añadidos/eliminados.
+        """
+        with self._build_lock:
+            if self.vector_store is None or self.manifest is None:
+                self.create_vector_store()
+                return {}
+
+            current = self.scan_files()
+            indexed = self.manifest["files"]
+            added = [p for p in current if p not in indexed]
+            modified = [p for p in current if p in indexed and indexed[p]["hash"] != current[p]]
+            deleted = [p for p in indexed if p not in current]
+            if not (added or modified or deleted):
+                return {}
+
+            print(f"🔄 Actualizando índice: {len(added)} añadidos, {len(modified)} modificados, {len(deleted)} eliminados")
+            files = {p: dict(entry) for p, entry in indexed.items() if p not in deleted}
+            ids_to_delete = [doc_id for p in deleted for _, doc_id in indexed[p]["chunks"]]
+            new_docs, new_ids = [], []
+
+            for rel_path in added + modified:
+                # Fragmentos previos del archivo que pueden reutilizarse por su hash
+                reusable = defaultdict(list)
+                for chunk_hash, doc_id in indexed.get(rel_path, {}).get("chunks", []):
+                    reusable[chunk_hash].append(doc_id)
+
+                chunks = []
+                for doc in self._split_file(rel_path):
+                    chunk_hash = _sha256(doc.page_content)
+                    if reusable[chunk_hash]:
+                        doc_id = reusable[chunk_hash].pop()
+                    else:
+                        doc_id = uuid.uuid4().hex
+                        new_docs.append(doc)
+                        new_ids.append(doc_id)
+                    chunks.append([chunk_hash, doc_id])
+
+                ids_to_delete.extend(doc_id for doc_ids in reusable.values() for doc_id in doc_ids)
+                files[rel_path] = {"hash": current[rel_path], "chunks": chunks}
+
+            # Los embeddings se calculan fuera del lock del índice para no bloquear consultas
+            vectors = self.embeddings.embed_documents([d.page_content for d in new_docs]) if new_docs else []
 
-        print("🧠 Creando índice vectorial (Embeddings)...")
-        self.vector_store = FAISS.from_documents(texts, self.embeddings)
-        print("✅ Base de conocimiento indexada correctamente.")
+            with self._index_lock:
+                if new_docs:
+                    self.vector_store.add_embeddings(
+                        list(zip([d.page_content for d in new_docs], vectors)),
+                        metadatas=[d.metadata for d in new_docs],
+                        ids=new_ids
+                    )
+                if ids_to_delete:
+                    self.vector_store.delete(ids_to_delete)
+                self._set_index(self.vector_store, {"settings": self._settings(), "files": files})
+            self._persist()
+
+            summary = {
+                "added": added,
+                "modified": modified,
+                "deleted": deleted,
+                "chunks_added": len(new_ids),
+                "chunks_deleted": len(ids_to_delete)
+            }
+            print(f"✅ Índice actualizado: +{len(new_ids)} / -{len(ids_to_delete)} fragmentos")
+            return summary
+
+    def ensure_index(self):
+        """
+        Carga o construye el índice si aún no existe. Se comprueba de nuevo dentro
+        de `_build_lock`: varias consultas simultáneas al arrancar lo cargan una sola vez.
+        """
+        if self.vector_store is None:
+            with self._build_lock:
+                if self.vector_store is None:
+                    self.create_vector_store()
 
     def get_retriever(self):
-        if not self.vector_store:
-            self.create_vector_store()
+        self.ensure_index()
         return self.vector_store.as_retriever(search_kwargs={"k": 3})
 
     @observe(as_type="span")
-    def query(self, query_text):
-        if not self.vector_store:
-            self.create_vector_store()
-        
-        docs = self.vector_store.similarity_search(query_text)
+    def query(self, query_text, k=4, use_cache=True):
+        self.ensure_index()
+
+        index_version = self.index_version
+        cache_key = make_key(normalize_text(query_text), k, index_version)
+        if use_cache:
+            cached = self._query_cache.get(cache_key)
+            if cached is not None:
+                return list(cached)
+
+        # El embedding de la consulta se calcula fuera del lock; solo la búsqueda
+        # en FAISS se serializa con las actualizaciones incrementales.
+        embedding = self.embeddings.embed_query(query_text)
+        with self._index_lock:
+            docs = self.vector_store.similarity_search_by_vector(embedding, k=k)
+            # Solo se cachea si el índice no cambió durante la búsqueda
+            if index_version == self.index_version:
+                self._query_cache.set(cache_key, list(docs))
         return docs
 
+    @observe(as_type="span")
+    def query_batch(self, queries, k=4):
+        """
+        Busca varias consultas a la vez: un único lote de embeddings y una única
+        búsqueda matricial en FAISS.
+
+        Args:
+            queries (list[str]): Consultas a resolver.
+            k (int): Número de resultados por consulta.
+
+        Returns:
+            list[list[tuple[Document, float]]]: Para cada consulta, sus documentos
+            con la distancia devuelta por FAISS (menor es más similar).
+        """
+        queries = list(queries)
+        if not queries:
+            return []
+        self.ensure_index()
+
+        vectors = np.array(self.embeddings.embed_queries(queries), dtype=np.float32)
+        with self._index_lock:
+            store = self.vector_store
+            if store._normalize_L2:
+                dependable_faiss_import().normalize_L2(vectors)
+            scores, indices = store.index.search(vectors, k)
+            results = []
+            for row_scores, row_indices in zip(scores, indices):
+                row = []
+                for score, i in zip(row_scores, row_indices):
+                    if i == -1:  # FAISS rellena con -1 si hay menos de k vectores
+                        continue
+                    doc = store.docstore.search(store.index_to_docstore_id[i])
+                    row.append((doc, float(score)))
+                results.append(row)
+        return results
+
 if __name__ == "__main__":
     # Test básico
     rag = RAGEngine()
@@ -0,0 +1,146 @@
+"""
+Registro compartido de los componentes pesados de la aplicación (LLM, RAG,
+generador de PDF, analizador, handler de Langfuse).
+
+Cada componente se construye una sola vez por proceso y solo cuando se usa por
+primera vez, de modo que importar `src.app` o `src.agent` es barato y no se
+crean índices FAISS duplicados.
+"""
+
+import os
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+_components = {}
+_lock = threading.RLock()
+
+
+def _get_or_create(name, factory):
+    """Devuelve el componente `name`, creándolo con `factory` la primera vez."""
+    if name in _components:
+        return _components[name]
+    with _lock:
+        if name not in _components:
+            _components[name] = factory()
+        return _components[name]
+
+
+def get_langfuse_handler():
+    def factory():
+        from langfuse.langchain import CallbackHandler
+        return CallbackHandler()
+    return _get_or_create("langfuse_handler", factory)
+
+
+def get_llm_cache():
+    """Caché de respuestas del LLM, o None si no está activada (LLM_CACHE=on)."""
+    def factory():
+        from .llm_cache import create_llm_cache_from_env
+        return create_llm_cache_from_env()
+    return _get_or_create("llm_cache", factory)
+
+
+def get_llm():
+    def factory():
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        # Aumentar max_output_tokens para evitar cortes en JSON largos
+        return ChatGoogleGenerativeAI(
+            model="models/gemini-2.5-flash",
+            temperature=0.3,
+            max_output_tokens=8192,
+            callbacks=[get_langfuse_handler()],
+            cache=get_llm_cache()
+        )
+    return _get_or_create("llm", factory)
+
+
+def get_structured_llm(schema):
+    """
+    LLM con la salida restringida al JSON schema de `schema` (modelo Pydantic),
+    o None si el modelo no soporta salida estructurada.
+    """
+    def factory():
+        try:
+            return get_llm().with_structured_output(schema, method="json_schema", include_raw=True)
+        except (NotImplementedError, ValueError, TypeError):
+            return None
+    return _get_or_create(f"structured_llm:{schema.__name__}", factory)
+
+
+def get_rag_engine():
+    """Devuelve el RAGEngine compartido, o None si no se pudo inicializar."""
+    def factory():
+        # RAG es opcional: si falla (p. ej. sin API key) se recuerda el fallo
+        try:
+            from .rag_engine import RAGEngine
+            return RAGEngine()
+        except Exception as e:
+            print(f"⚠️ RAG no disponible: {e}")
+            return None
+    return _get_or_create("rag_engine", factory)
+
+
+def get_pdf_generator():
+    def factory():
+        from .pdf_generator import PDFGenerator
+        return PDFGenerator()
+    return _get_or_create("pdf_generator", factory)
+
+
+def get_code_analyzer():
+    def factory():
+        from .code_analyzer import CodeAnalyzer
+        return CodeAnalyzer()
+    return _get_or_create("code_analyzer", factory)
+
+
+def get_documentation_cache():
+    def factory():
+        from .doc_cache import DocumentationCache
+        return DocumentationCache(db_path=os.environ.get("DOC_CACHE_DB"))
+    return _get_or_create("documentation_cache", factory)
+
+
+def get_job_queue():
+    """Cola de trabajos en segundo plano (generación de PDFs) compartida por la app."""
+    def factory():
+        from .job_queue import JobQueue
+        return JobQueue()
+    return _get_or_create("job_queue", factory)
+
+
+def warm_up(background=True):
+    """
+    Construye por adelantado los componentes y el índice vectorial.
+    Pensado para ejecutarse en segundo plano una vez que el servidor ya escucha.
+
+    Returns:
+        threading.Thread | None: El hilo de calentamiento si `background` es True.
+    """
+    def _warm_up():
+        try:
+            print("🔥 Calentando componentes...")
+            get_code_analyzer()
+            get_pdf_generator()
+            get_llm()
+            rag = get_rag_engine()
+            if rag:
+                rag.ensure_index()
+            print("✅ Componentes listos.")
+        except Exception as e:
+            print(f"⚠️ Error durante el calentamiento: {e}")
+
+    if not background:
+        _warm_up()
+        return None
+    thread = threading.Thread(target=_warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def reset():
+    """Descarta todos los componentes construidos (útil en pruebas)."""
+    with _lock:
+        _components.clear()
@@ -0,0 +1,151 @@
+"""
+Modelos Pydantic de las respuestas estructuradas del LLM.
+
+Se usan como JSON schema de la salida nativa de Gemini (`with_structured_output`)
+y para validar localmente las respuestas que llegan como texto.
+"""
+
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field, field_validator
+from .json_utils import loads_lenient
+
+SECTION_TYPES = ("heading", "paragraph", "code")
+
+
+class Section(BaseModel):
+    """Sección del documento tal como la consume PDFGenerator."""
+    type: Literal["heading", "paragraph", "code"] = Field(description="Tipo de bloque")
+    level: Optional[int] = Field(default=None, description="Nivel del heading: 1 o 2")
+    content: str = Field(description="Texto del bloque")
+
+    @field_validator("type", mode="before")
+    @classmethod
+    def _known_type(cls, value):
+        # PDFGenerator trata los tipos desconocidos como párrafos
+        return value if value in SECTION_TYPES else "paragraph"
+
+
+class DocumentationOutput(BaseModel):
+    title: str = Field(description="Título descriptivo de la documentación")
+    sections: List[Section]
+
+
+class OverviewOutput(BaseModel):
+    title: str
+    introduction: str = Field(description="Descripción general del módulo")
+    best_practices: str = Field(description="Mejores prácticas aplicadas")
+
+
+class SymbolDocumentation(BaseModel):
+    name: str = Field(description="Nombre del símbolo tal como aparece en el código")
+    sections: List[Section]
+
+
+class SymbolBatchOutput(BaseModel):
+    symbols: List[SymbolDocumentation]
+
+
+class ModuleDocumentationOutput(BaseModel):
+    """Introducción y secciones por símbolo en una sola respuesta (módulos nuevos pequeños)."""
+    title: str = Field(description="Título descriptivo de la documentación")
+    introduction: str = Field(description="Descripción general del módulo")
+    symbols: List[SymbolDocumentation]
+    best_practices: str = Field(description="Mejores prácticas aplicadas")
+
+
+class CodeSnippet(BaseModel):
+    descripcion: str = ""
+    codigo: str = ""
+
+
+class ConversationAnalysis(BaseModel):
+    resumen_general: str = ""
+    temas_discutidos: List[str] = Field(default_factory=list)
+    codigo_compartido: List[CodeSnippet] = Field(default_factory=list)
+    mejoras_sugeridas: List[str] = Field(default_factory=list)
+    buenas_practicas: List[str] = Field(default_factory=list)
+    conclusiones: str = ""
+
+
+class SummaryCombination(BaseModel):
+    """Resumen de toda la conversación a partir de resúmenes parciales (map-reduce)."""
+    resumen_general: str = Field(description="Párrafo conciso (2-3 frases) sobre el tema principal")
+    conclusiones: str = Field(default="", description="Conclusión final de la conversación (1-2 frases)")
+
+
+def to_data(model):
+    """Modelo -> dict para PDFGenerator y las cachés (sin campos vacíos como `level` de un párrafo)."""
+    return model.model_dump(exclude_none=True)
+
+
+def _message_text(message):
+    content = message.content
+    if isinstance(content, list):
+        # Algunos modelos devuelven bloques de contenido en lugar de un string
+        return "".join(block.get("text", "") if isinstance(block, dict) else str(block) for block in content)
+    return content
+
+
+def parse_output(schema, raw):
+    """
+    Valida una respuesta contra `schema`. `raw` puede ser ya una instancia, un
+    dict o el texto del LLM; el texto se parsea con `loads_lenient`, que repara
+    localmente el JSON mal formado en lugar de pedírselo otra vez al modelo.
+
+    Raises:
+        json.JSONDecodeError | pydantic.ValidationError
+    """
+    if isinstance(raw, schema):
+        return raw
+    if isinstance(raw, str):
+        raw = loads_lenient(raw)
+    return schema.model_validate(raw)
+
+
+def _structured_result(schema, result):
+    if isinstance(result, dict) and "raw" in result:
+        # include_raw=True: si el parser de LangChain falló, se repara el texto crudo
+        if result.get("parsed") is not None:
+            return parse_output(schema, result["parsed"])
+        return parse_output(schema, _message_text(result["raw"]))
+    return parse_output(schema, _message_text(result))
+
+
+def invoke_structured(schema, prompt):
+    """Llama al LLM con salida restringida a `schema` y devuelve una instancia validada."""
+    from . import registry
+    structured = registry.get_structured_llm(schema)
+    if structured is None:
+        return _structured_result(schema, registry.get_llm().invoke(prompt))
+    return _structured_result(schema, structured.invoke(prompt))
+
+
+async def ainvoke_structured(schema, prompt):
+    from . import registry
+    structured = registry.get_structured_llm(schema)
+    if structured is None:
+        return _structured_result(schema, await registry.get_llm().ainvoke(prompt))
+    return _structured_result(schema, await structured.ainvoke(prompt))
+
+
+def _json_schema_kwargs(llm, schema):
+    # Salida JSON nativa de Gemini; otros modelos reciben el prompt sin restricciones
+    if "response_mime_type" not in getattr(type(llm), "model_fields", {}):
+        return {}
+    return {"response_mime_type": "application/json", "response_json_schema": schema.model_json_schema()}
+
+
+def stream_structured_text(schema, prompt):
+    """
+    Texto de la respuesta en streaming, restringido al JSON schema de `schema`
+    cuando el modelo lo soporta. Pensado para `StreamingJSONParser`.
+    """
+    from . import registry
+    llm = registry.get_llm()
+    kwargs = _json_schema_kwargs(llm, schema)
+    llm_cache = registry.get_llm_cache()
+    stream = llm_cache.stream(llm, prompt, **kwargs) if llm_cache else llm.stream(prompt, **kwargs)
+    for chunk in stream:
+        text = _message_text(chunk)
+        if text:
+            yield text
@@ -0,0 +1,83 @@
+import os
+import tempfile
+from langchain_core.embeddings import Embeddings
+from src.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+
+class CountingEmbeddings(Embeddings):
+    """Backend falso que registra cada lote que le llega."""
+
+    def __init__(self):
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        self.batches.append([text])
+        return [float(len(text)), 0.0]
+
+
+workdir = tempfile.mkdtemp()
+
+# Test 1: Caché de embeddings compartida entre instancias y normalizada
+print("Test 1: Caché de embeddings")
+try:
+    cache = EmbeddingCache(db_path=None)
+    backend = CountingEmbeddings()
+    first = CachedEmbeddings(backend, model="m", cache=cache)
+    second = CachedEmbeddings(backend, model="m", cache=cache)
+    first.embed_documents(["hola mundo", "adiós"])
+    # Fallo solo para el texto nuevo; los espacios no cambian la clave
+    second.embed_documents(["hola   mundo", "nuevo", "nuevo"])
+    assert backend.batches == [["hola mundo", "adiós"], ["nuevo"]], backend.batches
+    # Documentos y consultas no comparten vectores
+    second.embed_query("hola mundo")
+    assert backend.batches[-1] == ["hola mundo"] and len(backend.batches) == 3
+    print("✅ Test 1 exitoso")
+except Exception as e:
+    print(f"❌ Test 1 falló: {e}")
+
+# Test 2: La capa SQLite conserva los vectores entre procesos
+print("\nTest 2: Embeddings persistidos en SQLite")
+try:
+    db_path = os.path.join(workdir, "embeddings.db")
+    CachedEmbeddings(CountingEmbeddings(), model="m", cache=EmbeddingCache(db_path=db_path)).embed_documents(["texto"])
+    backend = CountingEmbeddings()
+    vectors = CachedEmbeddings(backend, model="m", cache=EmbeddingCache(db_path=db_path)).embed_documents(["texto"])
+    assert vectors == [[5.0, 1.0]] and backend.batches == []
+    print("✅ Test 2 exitoso")
+except Exception as e:
+    print(f"❌ Test 2 falló: {e}")
+
+# Test 3: Caché de respuestas del LLM (aciertos, fallos y parámetros del modelo)
+print("\nTest 3: Caché de respuestas del LLM")
+try:
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from src.llm_cache import LLMResponseCache
+
+    llm_cache = LLMResponseCache(max_size=8)
+    model = FakeListChatModel(responses=["primera", "segunda"], cache=llm_cache)
+    answers = [model.invoke("Documenta esto").content, model.invoke("Documenta esto").content,
+               model.invoke("Otra pregunta").content]
+    # Mismo prompt con otros parámetros del modelo: otro `llm_string`, otra entrada
+    other = FakeListChatModel(responses=["otro modelo"], cache=llm_cache)
+    assert answers == ["primera", "primera", "segunda"], answers
+    assert other.invoke("Documenta esto").content == "otro modelo"
+    assert llm_cache.stats() == {"hits": 1, "misses": 3}, llm_cache.stats()
+    print("✅ Test 3 exitoso")
+except Exception as e:
+    print(f"❌ Test 3 falló: {e}")
+
+# Test 4: Respuestas del LLM persistidas en SQLite
+print("\nTest 4: Respuestas del LLM en SQLite")
+try:
+    db_path = os.path.join(workdir, "llm.db")
+    FakeListChatModel(responses=["guardada"], cache=LLMResponseCache(db_path=db_path)).invoke("Hola")
+    reopened = LLMResponseCache(db_path=db_path)
+    answer = FakeListChatModel(responses=["guardada"], cache=reopened).invoke("Hola").content
+    assert answer == "guardada" and reopened.stats() == {"hits": 1, "misses": 0}, reopened.stats()
+    print("✅ Test 4 exitoso")
+except Exception as e:
+    print(f"❌ Test 4 falló: {e}")
@@ -0,0 +1,135 @@
+import os
+from src.code_analyzer import CodeAnalyzer, build_import_graph, diff_symbols, language_for_path, module_name
+
+analyzer = CodeAnalyzer()
+
+sample_code = '''
+import os
+from .utils import helper
+
+class Calculadora:
+    """Calculadora simple."""
+    class Config:
+        precision = 2
+
+    async def sumar(self, a: int, b: int = 0, *, redondear=False) -> int:
+        """Suma dos números."""
+        return a + b
+
+@decorador
+def restar(a, b, /, *args, **kwargs):
+    def interna():
+        pass
+    return a - b
+'''
+
+# Test 1: Estructura completa
+print("Test 1: Árbol de símbolos")
+structure = analyzer.analyze(sample_code)
+try:
+    cls = structure.classes[0]
+    method = cls.methods[0]
+    func = structure.functions[0]
+    assert cls.name == "Calculadora" and cls.docstring == "Calculadora simple."
+    assert cls.classes[0].qualname == "Calculadora.Config"
+    assert method.is_async and method.returns == "int"
+    assert method.signature() == "async def sumar(self, a: int, b: int = 0, *, redondear=False) -> int"
+    assert func.decorators == ["decorador"]
+    assert func.signature() == "def restar(a, b, /, *args, **kwargs)"
+    assert func.nested[0].qualname == "restar.<locals>.interna"
+    assert (func.lineno, func.end_lineno) == (15, 18)
+    assert structure.imports == ["os", ".utils"]
+    print("✅ Test 1 exitoso")
+except AssertionError as e:
+    print(f"❌ Test 1 falló: {e}")
+
+# Test 2: Serialización para el prompt
+print("\nTest 2: Serialización a dict")
+data = structure.to_dict()
+if data["classes"][0]["methods"][0]["name"] == "sumar" and data["functions"][0]["args"] == ["a", "b", "args", "kwargs"]:
+    print("✅ Test 2 exitoso")
+else:
+    print(f"❌ Test 2 falló: {data}")
+
+# Test 3: Errores de sintaxis
+print("\nTest 3: Código inválido")
+broken = analyzer.analyze("def roto(:\n    pass")
+if broken.error and broken.to_dict() == {"error": broken.error}:
+    print(f"✅ Test 3 exitoso: {broken.error}")
+else:
+    print("❌ Test 3 falló")
+
+# Test 4: Diferencias entre versiones
+print("\nTest 4: Símbolos modificados entre versiones")
+edited = analyzer.analyze(sample_code.replace("return a - b", "return b - a"))
+diff = diff_symbols(structure, edited)
+if diff["changed"] == ["restar"] and diff["unchanged"] == ["Calculadora"] and not diff["added"] + diff["removed"]:
+    print("✅ Test 4 exitoso")
+else:
+    print(f"❌ Test 4 falló: {diff}")
+
+# Test 5: Otros lenguajes con el mismo esquema
+print("\nTest 5: Análisis de JavaScript, Go y Java")
+js = analyzer.analyze('import x from "./x";\n/** Servicio. */\nclass Api extends Base {\n  async get(url, opts = {}) { return url }\n}\nconst f = (a) => a * 2;\n', "javascript")
+go = analyzer.analyze('package p\n\ntype T struct{}\n\n// Run ejecuta.\nfunc (t *T) Run(a, b int) error {\n\treturn nil\n}\n', "go")
+java = analyzer.analyze('class A {\n  public int suma(int a, int b) { return a + b; }\n}\n', "java")
+try:
+    assert js.imports == ["./x"] and js.classes[0].docstring == "Servicio." and js.classes[0].bases == ["Base"]
+    assert js.classes[0].methods[0].signature() == "async get(url, opts = {})"
+    assert [f.name for f in js.functions] == ["f"]
+    assert go.classes[0].methods[0].qualname == "T.Run" and go.classes[0].methods[0].docstring == "Run ejecuta."
+    assert [a.name for a in go.classes[0].methods[0].args] == ["a", "b"]
+    assert java.classes[0].methods[0].to_dict()["args"] == ["a", "b"]
+    print("✅ Test 5 exitoso")
+except AssertionError as e:
+    print(f"❌ Test 5 falló: {e}")
+
+# Test 6: Nombres de módulo únicos aunque solo cambie la extensión
+print("\nTest 6: Nombres de módulo")
+names = [module_name("proyecto", os.path.join("proyecto", "pkg", f)) for f in ("api.py", "api.js", "api.ts", "__init__.py")]
+if names == ["pkg.api", "pkg.api.js", "pkg.api.ts", "pkg"]:
+    print("✅ Test 6 exitoso")
+else:
+    print(f"❌ Test 6 falló: {names}")
+
+# Test 7: Llaves dentro de expresiones regulares de JavaScript
+print("\nTest 7: Literales regex en JavaScript")
+regex_js = analyzer.analyze('const re = /[{]/;\nfunction after() {}\nconst d = a / b / c;\nconst s = x.split(/[}]+/);\nfunction last() {}\n', "javascript")
+if [f.name for f in regex_js.functions] == ["after", "last"]:
+    print("✅ Test 7 exitoso")
+else:
+    print(f"❌ Test 7 falló: {[f.name for f in regex_js.functions]}")
+
+# Test 8: La caché no mezcla versiones con distintas líneas en blanco iniciales
+print("\nTest 8: Números de línea con la caché")
+first = analyzer.analyze("def f(): pass").functions[0]
+shifted = analyzer.analyze("\n\ndef f(): pass").functions[0]
+crlf = analyzer.analyze("\r\n\r\ndef f(): pass").functions[0]
+if (first.lineno, shifted.lineno) == (1, 3) and crlf is shifted:
+    print("✅ Test 8 exitoso")
+else:
+    print(f"❌ Test 8 falló: {first.lineno}, {shifted.lineno}")
+
+# Test 9: Imports internos de JavaScript/TypeScript, Go y Java
+print("\nTest 9: Grafo de imports en otros lenguajes")
+files = {
+    "web/api.ts": 'import { get } from "./util";\nimport x from "../shared/lib";\nimport React from "react";\n',
+    "web/util.ts": "export function get() {}\n",
+    "shared/lib/index.ts": "export const lib = 1;\n",
+    "cmd/main.go": 'package main\n\nimport (\n\t"fmt"\n\t"ejemplo.com/app/internal/store"\n)\n',
+    "internal/store/store.go": "package store\n",
+    "src/main/java/com/app/Main.java": "import com.app.util.*;\nimport java.util.List;\nclass Main {}\n",
+    "src/main/java/com/app/util/Texto.java": "package com.app.util;\nclass Texto {}\n",
+}
+paths = {module_name("proyecto", os.path.join("proyecto", *path.split("/"))): path for path in files}
+modules = {name: analyzer.analyze(files[path], language_for_path(path)) for name, path in paths.items()}
+graph = build_import_graph(modules, paths=paths)
+expected = {
+    "web.api.ts": ["shared.lib.index.ts", "web.util.ts"],
+    "cmd.main.go": ["internal.store.store.go"],
+    "src.main.java.com.app.Main.java": ["src.main.java.com.app.util.Texto.java"],
+}
+if all(graph[name] == targets for name, targets in expected.items()):
+    print("✅ Test 9 exitoso")
+else:
+    print(f"❌ Test 9 falló: {graph}")
@@ -0,0 +1,151 @@
+import time
+from src.conversation_pdf_tool import ConversationPDFGenerator
+from src.conversation_summary import ConversationSummaries
+
+# Actualización falsa: registra qué se resume sin llamar al LLM
+updates = []
+
+
+def fake_update(previous, messages):
+    updates.append((previous is None, len(messages)))
+    covered = (previous or {}).get("mensajes", 0) + len(messages)
+    return {"resumen_general": f"{covered} mensajes", "mensajes": covered}
+
+
+def gradio_round_trip(history):
+    """Como el Chatbot de Gradio 6: el contenido de los mensajes ya mostrados vuelve en bloques."""
+    return [{"role": m["role"], "content": m["content"] if isinstance(m["content"], list)
+             else [{"text": m["content"], "type": "text"}]} for m in history]
+
+
+gen = ConversationPDFGenerator()
+gen.summaries = ConversationSummaries(fake_update, batch_turns=1)
+
+# Test 1: El resumen incremental se acumula aunque Gradio cambie el formato del historial
+print("Test 1: Resumen incremental con historial de Gradio")
+try:
+    history = []
+    for turn in range(4):
+        history = gradio_round_trip(history) + [
+            {"role": "user", "content": f"Pregunta {turn}"},
+            {"role": "assistant", "content": f"Respuesta {turn}"},
+        ]
+        gen.observe_turn("sesion", history)
+        # Espera a la actualización en segundo plano, si se encoló
+        while gen.summaries._session("sesion").scheduled:
+            time.sleep(0.01)
+    analysis = gen._session_analysis("sesion", gradio_round_trip(history))
+    assert analysis["mensajes"] == 8, analysis
+    assert [fresh for fresh, _ in updates] == [True] + [False] * (len(updates) - 1), updates
+    assert sum(count for _, count in updates) == 8, updates
+    print("✅ Test 1 exitoso")
+except Exception as e:
+    print(f"❌ Test 1 falló: {e}")
+
+# Test 2: Si el historial cambia (chat limpiado) se vuelve a empezar
+print("\nTest 2: Historial reiniciado")
+try:
+    updates.clear()
+    analysis = gen._session_analysis("sesion", [{"role": "user", "content": "Otra conversación"}])
+    assert analysis["mensajes"] == 1 and updates == [(True, 1)], updates
+    print("✅ Test 2 exitoso")
+except Exception as e:
+    print(f"❌ Test 2 falló: {e}")
+
+# Test 3: Al pedir el PDF solo se resume lo pendiente y un fallo conserva el resumen anterior
+print("\nTest 3: Puesta al día del resumen")
+try:
+    updates.clear()
+    summaries = ConversationSummaries(fake_update, batch_turns=100)
+    history = [{"role": "user", "content": f"Mensaje {i}"} for i in range(5)]
+    summaries.observe("otra", history)  # Por debajo del lote: no se encola nada
+    assert updates == [] and summaries.summarize("otra", history)["mensajes"] == 5
+    assert summaries.summarize("otra", history + history[:2])["mensajes"] == 7
+    assert updates == [(True, 5), (False, 2)], updates
+
+    def failing_update(previous, messages):
+        raise ValueError("LLM caído")
+
+    summaries.update = failing_update
+    assert summaries.summarize("otra", history * 2)["mensajes"] == 7
+    print("✅ Test 3 exitoso")
+except Exception as e:
+    print(f"❌ Test 3 falló: {e}")
+
+# Test 4: Ventanas dentro del presupuesto sin partir los mensajes que caben
+print("\nTest 4: Reparto en ventanas")
+try:
+    from src.conversation_summary import split_windows
+    from src.prompt_builder import count_tokens
+
+    code = "\n".join(f"resultado_{i} = calcular({i})" for i in range(40))
+    messages = [{"role": "user", "content": f"Pregunta {i} " + "texto " * (i * 3)} for i in range(8)]
+    messages.insert(4, {"role": "assistant", "content": code})
+    windows = split_windows(messages, 50)
+    assert all(sum(count_tokens(m["content"]) for m in window) <= 50 for window in windows)
+    flat = [m for window in windows for m in window]
+    # Los mensajes que caben llegan enteros y en orden; el largo se parte por líneas
+    assert [m for m in flat if m["role"] == "user"] == [m for m in messages if m["role"] == "user"]
+    assert "\n".join(m["content"] for m in flat if m["role"] == "assistant") == code
+    assert len([m for m in flat if m["role"] == "assistant"]) > 1
+    print("✅ Test 4 exitoso")
+except Exception as e:
+    print(f"❌ Test 4 falló: {e}")
+
+# Test 5: Unión local de análisis parciales
+print("\nTest 5: Unión de análisis parciales")
+try:
+    from src.conversation_summary import merge_analyses
+
+    merged = merge_analyses([
+        {"resumen_general": "Parte 1.", "temas_discutidos": ["Docstrings", "Tests"],
+         "codigo_compartido": [{"descripcion": "a", "codigo": "def f():\n    pass"}],
+         "mejoras_sugeridas": ["Añadir type hints"], "conclusiones": "Primera"},
+        {"resumen_general": "Parte 2.", "temas_discutidos": ["tests", "  docstrings ", "Async"],
+         "codigo_compartido": [{"descripcion": "b", "codigo": "def f():   \n  pass"},
+                               {"descripcion": "c", "codigo": "x = 1"}],
+         "mejoras_sugeridas": ["añadir TYPE hints", "Usar logging"], "conclusiones": ""},
+    ])
+    assert merged["resumen_general"] == "Parte 1. Parte 2." and merged["conclusiones"] == "Primera"
+    assert merged["temas_discutidos"] == ["Docstrings", "Tests", "Async"], merged["temas_discutidos"]
+    assert [c["descripcion"] for c in merged["codigo_compartido"]] == ["a", "c"]
+    assert merged["mejoras_sugeridas"] == ["Añadir type hints", "Usar logging"]
+    print("✅ Test 5 exitoso")
+except Exception as e:
+    print(f"❌ Test 5 falló: {e}")
+
+# Test 6: La combinación por niveles acaba en un único resumen
+print("\nTest 6: Combinación recursiva de resúmenes")
+try:
+    import json
+    import re
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+    from src import registry
+
+    class CombiningLLM(BaseChatModel):
+        """LLM falso que combina los resúmenes numerados del prompt y anota cuántos recibió."""
+        counts: list = []
+
+        @property
+        def _llm_type(self):
+            return "fake-combine"
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            count = len(re.findall(r"^\d+\. ", messages[-1].content, re.M))
+            self.counts.append(count)
+            text = json.dumps({"resumen_general": f"Combinados {count}", "conclusiones": "Fin"})
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    llm = CombiningLLM()
+    registry._components.update(llm=llm, llm_cache=None)
+    combiner = ConversationPDFGenerator(window_tokens=40)
+    result = combiner._combine_summaries([f"Resumen parcial {i} " + "relleno " * 20 for i in range(20)])
+    # Varios niveles, cada llamada con los que caben en una ventana y una final sobre el resto
+    assert len(llm.counts) > 2 and all(count <= 4 for count in llm.counts), llm.counts
+    assert sum(llm.counts[:-1]) >= 20 and result == {"resumen_general": f"Combinados {llm.counts[-1]}",
+                                                     "conclusiones": "Fin"}, result
+    print("✅ Test 6 exitoso")
+except Exception as e:
+    print(f"❌ Test 6 falló: {e}")
@@ -0,0 +1,129 @@
+import json
+import re
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from src import registry
+from src.agent import DocumentationAgent
+
+
+class FakeDocLLM(BaseChatModel):
+    """LLM falso que documenta los IDENTIFICADORES del prompt y registra cada petición."""
+
+    requests: list = []
+    # Identificadores cuyo lote devuelve una respuesta inválida
+    failing: set = set()
+
+    @property
+    def _llm_type(self):
+        return "fake-doc"
+
+    def respond(self, prompt):
+        match = re.search(r"^IDENTIFICADORES:\n(.*)$", prompt, re.M)
+        ids = match.group(1).split(", ") if match else []
+        self.requests.append(ids)
+        symbols = [{"name": symbol_id, "sections": [
+            {"type": "heading", "level": 2, "content": f"Función: {symbol_id}"},
+            {"type": "paragraph", "content": f"Doc de {symbol_id}"}]} for symbol_id in ids]
+        overview = {"title": "Doc", "introduction": "Intro", "best_practices": "BP"}
+        if "SÍMBOLOS A DOCUMENTAR" in prompt:
+            if self.failing & set(ids):
+                return '{"symbols": "roto"}'
+            # Los lotes llegan en orden inverso: la fusión debe respetar el del código
+            return json.dumps({"symbols": symbols[::-1]})
+        if ids:
+            return json.dumps(dict(overview, symbols=symbols))
+        return json.dumps(overview)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        text = self.respond(messages[-1].content)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        text = self.respond(messages[-1].content)
+        for i in range(0, len(text), 16):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text[i:i + 16]))
+
+
+llm = FakeDocLLM()
+registry.reset()
+registry._components.update(llm=llm, llm_cache=None, rag_engine=None)
+agent = DocumentationAgent(batch_size=8)
+
+small = "def a(x):\n    return x\n\ndef b(y):\n    return y\n\nclass C:\n    def m(self):\n        pass\n"
+
+
+def headings(data):
+    return [s["content"] for s in data["sections"] if s["type"] == "heading"]
+
+
+# Test 1: Un módulo nuevo pequeño se documenta en una sola llamada
+print("Test 1: Módulo nuevo en una llamada")
+try:
+    llm.requests.clear()
+    data = agent._generate(agent._analyze(small), "bp")
+    assert llm.requests == [["a", "b", "C"]], llm.requests
+    assert headings(data) == ["Introducción", "Función: a", "Función: b", "Función: C",
+                              "Mejores Prácticas Aplicadas"], headings(data)
+    print("✅ Test 1 exitoso")
+except Exception as e:
+    print(f"❌ Test 1 falló: {e}")
+
+# Test 2: Tras editar una función solo esa vuelve al LLM
+print("\nTest 2: Edición de un símbolo")
+try:
+    llm.requests.clear()
+    data = agent._generate(agent._analyze(small.replace("return y", "return y * 2")), "bp")
+    assert llm.requests == [["b"]], llm.requests
+    assert headings(data)[1:4] == ["Función: a", "Función: b", "Función: C"], headings(data)
+    print("✅ Test 2 exitoso")
+except Exception as e:
+    print(f"❌ Test 2 falló: {e}")
+
+# Test 3: El streaming de un módulo nuevo también deja sus partes en caché
+print("\nTest 3: Streaming y edición posterior")
+try:
+    llm.requests.clear()
+    code = small.replace("def a(x)", "def nueva(x)")
+    events = list(agent.stream_run(code, persist=False))
+    assert events[-1]["pdf_bytes"] and llm.requests == [["nueva", "b", "C"]], llm.requests
+    streamed = [e["section"]["content"] for e in events if e["type"] == "section" and e["section"]["type"] == "heading"]
+    assert streamed[1:4] == ["Función: nueva", "Función: b", "Función: C"], streamed
+    # La edición siguiente se sirve sin stream y solo pide el símbolo cambiado
+    events = list(agent.stream_run(code.replace("pass", "return 1"), persist=False))
+    assert events[-1]["pdf_bytes"] and llm.requests[1:] == [["C"]], llm.requests
+    print("✅ Test 3 exitoso")
+except Exception as e:
+    print(f"❌ Test 3 falló: {e}")
+
+# Test 4: Un módulo grande se reparte en lotes y las secciones siguen el orden del código
+print("\nTest 4: Map-reduce por lotes")
+big = "\n".join(f'def f{i}(x):\n    """Docstring {i}."""\n    return {i}\n' for i in range(10))
+batched = DocumentationAgent(batch_size=4, max_concurrency=2)
+try:
+    llm.requests.clear()
+    llm.failing = {"f5"}
+    plan = batched._plan_parts(batched._analyze(big), "bp")
+    assert [schema.__name__ for schema, _ in plan["prompts"]] == ["OverviewOutput"] + ["SymbolBatchOutput"] * 3
+    assert [symbol_id for symbol_id, _ in plan["pending"]] == [f"f{i}" for i in range(10)]
+    data = batched._generate(batched._analyze(big), "bp", plan)
+    assert sorted(llm.requests) == sorted([[], ["f0", "f1", "f2", "f3"], ["f4", "f5", "f6", "f7"], ["f8", "f9"]])
+    # Orden del código aunque el lote responda al revés; el lote fallido usa las docstrings
+    assert headings(data)[1:11] == [f"Función: f{i}" for i in range(10)], headings(data)
+    assert {"type": "paragraph", "content": "Docstring 5."} in data["sections"]
+    assert {"type": "paragraph", "content": "Doc de f5"} not in data["sections"]
+    print("✅ Test 4 exitoso")
+except Exception as e:
+    print(f"❌ Test 4 falló: {e}")
+
+# Test 5: Las secciones de respaldo no se cachean: se reintenta solo el lote fallido
+print("\nTest 5: Reintento del lote fallido")
+try:
+    llm.requests.clear()
+    llm.failing = set()
+    data = batched._generate(batched._analyze(big), "bp")
+    assert llm.requests == [["f4", "f5", "f6", "f7"]], llm.requests
+    assert {"type": "paragraph", "content": "Doc de f5"} in data["sections"]
+    print("✅ Test 5 exitoso")
+except Exception as e:
+    print(f"❌ Test 5 falló: {e}")
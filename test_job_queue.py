@@ -0,0 +1,79 @@
+import threading
+import time
+from src.job_queue import JobQueue
+
+
+def staged_task(release, progress=None):
+    """Tarea falsa con dos etapas: espera a `release` entre ambas."""
+    progress("analysis")
+    release.wait(5)
+    progress("render", "último paso")
+    return "hecho"
+
+
+# Test 1: Progreso por etapas y resultado
+print("Test 1: Trabajo completo")
+queue = JobQueue(max_workers=1)
+try:
+    release = threading.Event()
+    release.set()
+    status = queue.wait(queue.submit(staged_task, release, kind="prueba").id, timeout=5)
+    assert status["status"] == "done" and status["result"] == "hecho", status
+    assert [stage for _, stage, _ in status["events"]] == ["analysis", "render"]
+    print("✅ Test 1 exitoso")
+except Exception as e:
+    print(f"❌ Test 1 falló: {e}")
+
+# Test 2: Cancelar un trabajo en curso (entre etapas) y otro que aún no empezó
+print("\nTest 2: Cancelación")
+try:
+    release = threading.Event()
+    running = queue.submit(staged_task, release)
+    waiting = queue.submit(staged_task, release)
+    while running.stage != "analysis":
+        time.sleep(0.01)
+    assert queue.cancel(waiting.id) and waiting.status == "cancelled"
+    assert queue.cancel(running.id)
+    release.set()
+    status = queue.wait(running.id, timeout=5)
+    assert status["status"] == "cancelled" and status["stage"] == "analysis", status
+    # Un trabajo terminado ya no se puede cancelar
+    assert not queue.cancel(running.id) and not queue.cancel("no-existe")
+    print("✅ Test 2 exitoso")
+except Exception as e:
+    print(f"❌ Test 2 falló: {e}")
+
+# Test 3: Los errores de la tarea quedan en el trabajo
+print("\nTest 3: Trabajo fallido")
+try:
+    def failing(progress=None):
+        raise ValueError("sin datos")
+
+    status = queue.wait(queue.submit(failing).id, timeout=5)
+    assert status["status"] == "failed" and status["error"] == "ValueError: sin datos", status
+    print("✅ Test 3 exitoso")
+except Exception as e:
+    print(f"❌ Test 3 falló: {e}")
+finally:
+    queue.shutdown()
+
+# Test 4: Los trabajos terminados se olvidan pasado `retention`
+print("\nTest 4: Limpieza de trabajos antiguos")
+queue = JobQueue(max_workers=1, retention=0.2)
+try:
+    release = threading.Event()
+    release.set()
+    old = queue.submit(staged_task, release)
+    queue.wait(old.id, timeout=5)
+    time.sleep(0.3)
+    pending = threading.Event()
+    recent = queue.submit(staged_task, pending)
+    # Al encolar se limpia: el antiguo desaparece y el que sigue en curso no
+    assert queue.status(old.id) is None and queue.status(recent.id) is not None
+    pending.set()
+    queue.wait(recent.id, timeout=5)
+    print("✅ Test 4 exitoso")
+except Exception as e:
+    print(f"❌ Test 4 falló: {e}")
+finally:
+    queue.shutdown()
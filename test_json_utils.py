@@ -0,0 +1,42 @@
+from src.json_utils import loads_lenient, StreamingJSONParser
+from src.schemas import DocumentationOutput, parse_output
+
+# Test 1: JSON dentro de texto y bloque de código
+print("Test 1: Extracción de JSON")
+data = loads_lenient('Aquí tienes:\n```json\n{"title": "Doc", "sections": []}\n```')
+if data == {"title": "Doc", "sections": []}:
+    print("✅ Test 1 exitoso")
+else:
+    print(f"❌ Test 1 falló: {data}")
+
+# Test 2: Reparación local de errores habituales
+print("\nTest 2: Reparación de JSON mal formado")
+broken = '{"title": "Doc", "sections": [{"type": "code", "content": "def f():\n    pass"},], "extra": True'
+try:
+    data = loads_lenient(broken)
+    assert data["sections"][0]["content"] == "def f():\n    pass" and data["extra"] is True
+    print("✅ Test 2 exitoso")
+except Exception as e:
+    print(f"❌ Test 2 falló: {e}")
+
+# Test 3: Respuesta truncada validada contra el schema
+print("\nTest 3: Respuesta truncada")
+try:
+    doc = parse_output(DocumentationOutput, '{"title": "Doc", "sections": [{"type": "heading", "level": 1, "content": "Intro"}, {"type": "paragraph", "content": "Texto cort')
+    assert [s.type for s in doc.sections] == ["heading", "paragraph"] and doc.sections[1].content == "Texto cort"
+    print("✅ Test 3 exitoso")
+except Exception as e:
+    print(f"❌ Test 3 falló: {e}")
+
+# Test 4: Secciones emitidas según llegan los fragmentos del stream
+print("\nTest 4: Parser incremental")
+try:
+    text = '{"title": "Doc", "sections": [{"type": "heading", "level": 1, "content": "Intro"}, {"type": "paragraph", "content": "a, b"}]}'
+    parser = StreamingJSONParser("sections")
+    first = parser.feed(text[:85])
+    rest = parser.feed(text[85:]) + parser.close()
+    assert first == [("title", "Doc"), ("sections", {"type": "heading", "level": 1, "content": "Intro"})]
+    assert rest == [("sections", {"type": "paragraph", "content": "a, b"})]
+    print("✅ Test 4 exitoso")
+except Exception as e:
+    print(f"❌ Test 4 falló: {e}")
@@ -0,0 +1,65 @@
+from pypdf import PdfReader
+from src import pdf_generator
+from src.pdf_generator import PDFGenerator
+from src.pdf_parallel import split_at_headings
+
+generator = PDFGenerator()
+
+# Documento con capítulos de tamaños distintos y subsecciones de nivel 2
+sections = []
+for chapter in range(6):
+    sections.append({"type": "heading", "level": 1, "content": f"Capítulo {chapter}"})
+    for sub in range(chapter + 1):
+        sections.append({"type": "heading", "level": 2, "content": f"Apartado {chapter}.{sub}"})
+        sections.append({"type": "paragraph", "content": f"Texto del apartado {chapter}.{sub}. " * 60})
+        sections.append({"type": "code", "content": "\n".join(f"linea_{i} = {i}" for i in range(30))})
+data = {"title": "Documento de prueba", "sections": sections}
+
+# El render por partes usa un pool de procesos: con `spawn` (Windows) el script
+# se vuelve a importar en cada proceso
+if __name__ == "__main__":
+    # Test 1: Reparto por capítulos sin romperlos ni cambiar su orden
+    print("Test 1: Reparto en partes")
+    parts = split_at_headings(sections, 3)
+    if [s for part in parts for s in part] == sections and all(part[0]["level"] == 1 for part in parts) and len(parts) <= 3:
+        print("✅ Test 1 exitoso")
+    else:
+        print(f"❌ Test 1 falló: {[len(part) for part in parts]}")
+
+    # Test 2: Las partes se unen en orden, con índice, marcadores y números de página
+    print("\nTest 2: PDF renderizado por partes")
+    # Varias partes aunque la máquina tenga un solo núcleo
+    pdf_generator.RENDER_WORKERS = 3
+    try:
+        reader = PdfReader(generator.generate(data, persist=False, parallel=True))
+        pages = [page.extract_text() for page in reader.pages]
+        total = len(pages)
+        assert all(f"Página {number} de {total}" in text for number, text in enumerate(pages, 1))
+
+        outline = reader.outline
+        chapters = [item for item in outline if not isinstance(item, list)]
+        assert [item.title for item in chapters] == [f"Capítulo {i}" for i in range(6)]
+        targets = [reader.get_destination_page_number(item) for item in chapters]
+        assert targets == sorted(targets)
+        # Cada marcador apunta a la página donde aparece su capítulo
+        for item, page in zip(chapters, targets):
+            assert item.title in pages[page], item.title
+        # El índice de la primera página lista los capítulos con esa misma página
+        for item, page in zip(chapters, targets):
+            assert f"{item.title} {page + 1}" in " ".join(pages[0].split()), item.title
+        print("✅ Test 2 exitoso")
+    except Exception as e:
+        print(f"❌ Test 2 falló: {type(e).__name__}: {e}")
+
+    # Test 3: Mismo contenido que el render secuencial
+    print("\nTest 3: Contenido equivalente al render secuencial")
+    try:
+        sequential = PdfReader(generator.generate(data, persist=False, parallel=False))
+        text = lambda pdf: " ".join(" ".join(page.extract_text() for page in pdf.pages).split())
+        expected = [f"Apartado {c}.{s}" for c in range(6) for s in range(c + 1)]
+        parallel_text = text(reader)
+        positions = [parallel_text.index(label) for label in expected]
+        assert positions == sorted(positions) and all(label in text(sequential) for label in expected)
+        print("✅ Test 3 exitoso")
+    except Exception as e:
+        print(f"❌ Test 3 falló: {type(e).__name__}: {e}")
@@ -0,0 +1,73 @@
+from src.code_analyzer import CodeAnalyzer
+from src.prompt_builder import (PromptBuilder, compact_structure, count_tokens, rank_context,
+                                truncate_to_tokens)
+
+# Módulo con docstrings largos para forzar la pérdida de detalle
+code = "\n".join(
+    f'def funcion_{i}(a: int, b: str = "x") -> bool:\n    """Resumen {i}.\n\n    {"Detalle largo. " * 40}"""\n    return True\n'
+    for i in range(30)
+)
+structure = CodeAnalyzer().analyze(code)
+
+# Test 1: Recorte por palabras dentro del presupuesto
+print("Test 1: truncate_to_tokens")
+text = "palabra " * 200
+short = truncate_to_tokens(text, 50)
+if count_tokens(short) <= 50 and short.endswith(" [...]") and truncate_to_tokens("corto", 50) == "corto":
+    print("✅ Test 1 exitoso")
+else:
+    print(f"❌ Test 1 falló: {count_tokens(short)} tokens")
+
+# Test 2: El esquema compacto pierde detalle antes que símbolos
+print("\nTest 2: compact_structure")
+try:
+    full = compact_structure(structure)
+    reduced = compact_structure(structure, 1000)
+    tiny = compact_structure(structure, 120)
+    assert "Detalle largo" in full and count_tokens(reduced) <= 1000 and count_tokens(tiny) <= 120
+    # Sin el detalle de las docstrings, pero con su primer párrafo y todas las firmas
+    assert "Detalle largo" not in reduced and "Resumen 29." in reduced
+    assert all(f"def funcion_{i}(" in reduced for i in range(30))
+    assert "símbolos más omitidos" in tiny
+    print("✅ Test 2 exitoso")
+except AssertionError as e:
+    print(f"❌ Test 2 falló: {e}")
+
+# Test 3: El prompt cabe en el presupuesto y conserva los bloques fijos
+print("\nTest 3: PromptBuilder")
+try:
+    for budget in (3000, 800, 300):
+        prompt = (PromptBuilder(budget)
+                  .add("Eres un experto técnico.")
+                  .add(lambda tokens: compact_structure(structure, tokens), "CÓDIGO ANALIZADO", priority=2)
+                  .add("buena práctica " * 500, "MEJORES PRÁCTICAS A SEGUIR", priority=1)
+                  .add("FORMATO: devuelve SOLO el JSON.")
+                  .build())
+        assert count_tokens(prompt) <= budget, (budget, count_tokens(prompt))
+        assert prompt.startswith("Eres un experto técnico.") and prompt.endswith("FORMATO: devuelve SOLO el JSON.")
+        # El bloque de mayor prioridad se sirve primero
+        assert "CÓDIGO ANALIZADO:\n" in prompt, budget
+        if "MEJORES PRÁCTICAS" in prompt:
+            assert prompt.index("CÓDIGO ANALIZADO") < prompt.index("MEJORES PRÁCTICAS")
+    print("✅ Test 3 exitoso")
+except AssertionError as e:
+    print(f"❌ Test 3 falló: {e}")
+
+# Test 4: Contexto ordenado por relevancia, sin duplicados y dentro del presupuesto
+print("\nTest 4: rank_context")
+try:
+    texts = [
+        "Guía de estilo para nombres de variables.",
+        "Las docstrings documentan funciones y clases en Python.",
+        "Guía de estilo para nombres de variables.",
+        "Los type hints de Python ayudan a documentar funciones.",
+    ]
+    ranked = rank_context(texts, "¿Cómo documento funciones en Python?", 1000)
+    assert ranked == [texts[1], texts[3], texts[0]], ranked
+    assert rank_context(texts, "documentar funciones", 1000, max_items=1) == [texts[3]]
+    long_texts = ["Python " * 300, "funciones " * 300]
+    limited = rank_context(long_texts, "python", 200)
+    assert sum(count_tokens(t) for t in limited) <= 200 and limited[0].startswith("Python")
+    print("✅ Test 4 exitoso")
+except AssertionError as e:
+    print(f"❌ Test 4 falló: {e}")
@@ -0,0 +1,122 @@
+import os
+import hashlib
+import tempfile
+
+# Los embeddings de Gemini se sustituyen por unos locales: la clave no se usa
+os.environ.setdefault("GOOGLE_API_KEY", "offline")
+
+from langchain_core.embeddings import Embeddings
+from src.embedding_cache import CachedEmbeddings, EmbeddingCache
+from src.rag_engine import RAGEngine
+
+
+class HashEmbeddings(Embeddings):
+    """Embeddings deterministas sin red que cuentan los textos que reciben."""
+
+    def __init__(self):
+        self.texts = 0
+
+    def embed_documents(self, texts):
+        self.texts += len(texts)
+        return [[b / 255 for b in hashlib.sha256(text.encode()).digest()[:16]] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def paragraphs(prefix, count):
+    return "\n\n".join(f"{prefix} párrafo {i}: " + "texto de ejemplo " * 8 for i in range(count))
+
+
+def make_engine(workdir, backend):
+    rag = RAGEngine(knowledge_base_path=os.path.join(workdir, "kb"), index_path=os.path.join(workdir, "index"),
+                    chunk_size=200, chunk_overlap=0)
+    # Caché de embeddings propia: los vectores de otras pruebas no cuentan
+    rag.embeddings = CachedEmbeddings(backend, model="hash", cache=EmbeddingCache(db_path=None))
+    return rag
+
+
+def write(workdir, name, text):
+    with open(os.path.join(workdir, "kb", name), "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+workdir = tempfile.mkdtemp()
+os.makedirs(os.path.join(workdir, "kb"))
+write(workdir, "python.txt", paragraphs("Python", 4))
+write(workdir, "general.txt", paragraphs("General", 3))
+
+# Test 1: Construcción inicial y carga del índice guardado sin embeddings
+print("Test 1: Índice persistido")
+try:
+    backend = HashEmbeddings()
+    rag = make_engine(workdir, backend)
+    rag.create_vector_store()
+    built = backend.texts
+    reloaded_backend = HashEmbeddings()
+    reloaded = make_engine(workdir, reloaded_backend)
+    assert built == 7 and reloaded.load_saved_index() and reloaded_backend.texts == 0
+    print("✅ Test 1 exitoso")
+except Exception as e:
+    print(f"❌ Test 1 falló: {e}")
+
+# Test 2: Solo los fragmentos nuevos de un archivo modificado generan embeddings
+print("\nTest 2: Actualización incremental")
+try:
+    write(workdir, "python.txt", paragraphs("Python", 4) + "\n\n" + paragraphs("Nuevo", 1))
+    backend.texts = 0
+    summary = rag.update_index()
+    assert summary["modified"] == ["python.txt"] and not summary["added"] + summary["deleted"], summary
+    assert summary["chunks_added"] == 1 and summary["chunks_deleted"] == 0 and backend.texts == 1, summary
+    assert rag.update_index() == {}
+    print("✅ Test 2 exitoso")
+except Exception as e:
+    print(f"❌ Test 2 falló: {e}")
+
+# Test 3: Un archivo eliminado saca sus fragmentos del índice
+print("\nTest 3: Archivo eliminado")
+try:
+    os.remove(os.path.join(workdir, "kb", "general.txt"))
+    summary = rag.update_index()
+    sources = {os.path.basename(doc.metadata["source"]) for doc in rag.query("texto de ejemplo", k=10)}
+    assert summary["deleted"] == ["general.txt"] and summary["chunks_deleted"] == 3, summary
+    assert sources == {"python.txt"}, sources
+    print("✅ Test 3 exitoso")
+except Exception as e:
+    print(f"❌ Test 3 falló: {e}")
+
+# Test 4: Caché de resultados por consulta, k y versión del índice
+print("\nTest 4: Caché de consultas")
+try:
+    def counts():
+        stats = rag._query_cache.stats()
+        return stats["hits"], stats["misses"]
+
+    start = counts()
+    first = rag.query("¿Cómo documento una función?", k=2)
+    # Los espacios no cambian la consulta: acierto
+    again = rag.query("¿Cómo   documento una función?", k=2)
+    rag.query("¿Cómo documento una función?", k=3)
+    hits, misses = counts()
+    assert again == first and (hits - start[0], misses - start[1]) == (1, 2), (hits, misses)
+    # Tras actualizar el índice cambia su versión: la misma consulta vuelve a buscarse
+    write(workdir, "nuevo.txt", paragraphs("Otro", 1))
+    rag.update_index()
+    rag.query("¿Cómo documento una función?", k=2)
+    assert counts() == (hits, misses + 1), counts()
+    print("✅ Test 4 exitoso")
+except Exception as e:
+    print(f"❌ Test 4 falló: {e}")
+
+# Test 5: La búsqueda por lotes coincide con las consultas una a una
+print("\nTest 5: Consultas por lotes")
+try:
+    queries = ["texto de ejemplo", "Python párrafo 2", "Otro párrafo", "sin relación alguna"]
+    for k in (1, 3, 50):
+        batch = rag.query_batch(queries, k=k)
+        assert [[doc for doc, _ in row] for row in batch] == [rag.query(q, k=k) for q in queries], k
+        assert all(scores == sorted(scores) for scores in ([s for _, s in row] for row in batch))
+    assert rag.query_batch([]) == []
+    print("✅ Test 5 exitoso")
+except Exception as e:
+    print(f"❌ Test 5 falló: {e}")